@@ -1,7 +1,11 @@
-from quart import Quart, Response
+from quart import Quart, Response, request, jsonify
 import asyncio
+import json
+import os
 import tiktoken
 
+from doc_index import DocumentIndex, load_meta
+
 app = Quart(__name__)
 
 # The long text to be streamed
@@ -20,6 +24,14 @@ encoding = tiktoken.get_encoding("cl100k_base")
 tokens = encoding.encode(TEXT)
 total_tokens = len(tokens)
 
+# Large documents are streamed from here (see /documents/<name>)
+DOCUMENTS_DIR = os.getenv('DOCUMENTS_DIR', 'documents')
+DEFAULT_CHUNK_BYTES = 4096
+
+# Delays in seconds (set both to 0 for benchmarking)
+STREAM_START_DELAY = float(os.getenv('STREAM_START_DELAY', '0.5'))
+STREAM_DELAY = float(os.getenv('STREAM_DELAY', '0.2'))
+
 # Split the text into words
 WORDS = TEXT.strip().split()
 TOTAL = len(WORDS)
@@ -29,16 +41,130 @@ async def generate_stream():
     # First, send the total word count
     yield f"data: totalWords: {TOTAL}\n\n"
     yield f"data: totalTokens: {total_tokens}\n\n"
-    await asyncio.sleep(0.5)
+    await asyncio.sleep(STREAM_START_DELAY)
 
     # Then stream the words
     for word in WORDS:
         yield f"data: {word}\n\n"
-        await asyncio.sleep(0.2)
+        await asyncio.sleep(STREAM_DELAY)
 
 @app.route('/stream')
 async def stream():
     return Response(generate_stream(), content_type='text/event-stream')
 
+
+# Open documents by name; their mmaps are shared by every stream of the document
+documents = {}
+document_locks = {}  # name -> asyncio.Lock, so indexing one document doesn't hold up the others
+document_streams = {}  # DocumentIndex -> requests still using it
+
+
+async def open_document(name):
+    """
+    The DocumentIndex for a file in DOCUMENTS_DIR (indexed on first use), or None if there is no such file
+
+    The caller holds the index until it calls release_document().
+    """
+    path = os.path.join(DOCUMENTS_DIR, name)
+    if os.path.basename(name) != name or name.startswith('.') or not os.path.isfile(path):
+        return None
+
+    async with document_locks.setdefault(name, asyncio.Lock()):
+        document = documents.get(name)
+        if document is None or load_meta(path, encoding) != document.meta:
+            # A replaced file gets a fresh index; streams still reading the old one keep their maps
+            previous = document
+            document = await asyncio.to_thread(DocumentIndex, path, encoding)
+            documents[name] = document
+            if previous is not None and not document_streams.get(previous):
+                previous.close()
+        document_streams[document] = document_streams.get(document, 0) + 1
+        return document
+
+
+def release_document(document):
+    """Let go of an index from open_document(), closing it if it was replaced and this was its last user"""
+    document_streams[document] -= 1
+    if not document_streams[document]:
+        del document_streams[document]
+        if all(current is not document for current in documents.values()):
+            document.close()
+
+
+async def generate_document_stream(document, by, position, chunk_bytes, resumed):
+    try:
+        # Totals first, read from the index rather than counted
+        totals = {
+            'totalWords': document.total_words,
+            'totalTokens': document.total_tokens,
+            'totalBytes': document.total_bytes,
+            'by': by,
+            'position': position,
+        }
+        yield f"event: totals\ndata: {json.dumps(totals)}\n\n"
+        if not resumed:
+            await asyncio.sleep(STREAM_START_DELAY)
+
+        if by == 'word':
+            chunks = document.iter_words(position)
+        else:
+            chunks = document.iter_tokens(position, budget=chunk_bytes if by == 'bytes' else None)
+
+        # Each event's id is the position after it, so a reconnecting EventSource resumes where it left off
+        for next_position, text in chunks:
+            yield f"id: {next_position}\ndata: {json.dumps(text)}\n\n"
+            await asyncio.sleep(STREAM_DELAY)
+
+        yield "event: done\ndata: {}\n\n"
+    finally:
+        # Drop the generator first: it holds slices of the maps, which can't close while exported
+        chunks = None
+        release_document(document)
+
+
+@app.route('/documents/<name>')
+async def stream_document(name):
+    """
+    Stream a document from DOCUMENTS_DIR as Server-Sent Events
+
+    Query parameters:
+        by: 'word' (default), 'token', or 'bytes' (whole tokens up to chunk_bytes per event)
+        position: Word or token index to start at (words for by=word, tokens otherwise)
+        offset: Byte offset to start at instead of position
+        chunk_bytes: Byte budget per event for by=bytes
+
+    Every event's data is a JSON string. A Last-Event-ID header (sent by
+    EventSource when it reconnects) takes precedence over position.
+    """
+    by = request.args.get('by', 'word')
+    if by not in ('word', 'token', 'bytes'):
+        return jsonify({"error": "by must be 'word', 'token' or 'bytes'"}), 400
+
+    document = await open_document(name)
+    if document is None:
+        return jsonify({"error": f"No document named {name}"}), 404
+
+    try:
+        resume_from = request.headers.get('Last-Event-ID')
+        if resume_from is not None:
+            position = int(resume_from)
+        elif 'offset' in request.args:
+            offset = max(0, int(request.args['offset']))
+            position = document.word_at(offset) if by == 'word' else document.token_at(offset)
+        else:
+            position = int(request.args.get('position', 0))
+        chunk_bytes = int(request.args.get('chunk_bytes', DEFAULT_CHUNK_BYTES))
+    except ValueError:
+        release_document(document)
+        return jsonify({"error": "position, offset, chunk_bytes and Last-Event-ID must be integers"}), 400
+
+    total = document.total_words if by == 'word' else document.total_tokens
+    if not 0 <= position <= total or chunk_bytes < 1:
+        release_document(document)
+        return jsonify({"error": f"position must be between 0 and {total}, chunk_bytes at least 1"}), 400
+
+    return Response(generate_document_stream(document, by, position, chunk_bytes, resume_from is not None),
+                    content_type='text/event-stream')
+
 if __name__ == '__main__':
     app.run()
@@ -0,0 +1,314 @@
+"""
+Token and word index for streaming large documents from disk
+
+A document is read through mmap and never loaded or re-tokenized per request.
+It is tokenized once and the boundaries are stored next to it in
+<document>.idx/:
+
+    meta.json                  totals, the encoding, the source size/mtime (a changed source is
+                               re-indexed) and which build-*/ directory holds the current index
+    build-*/tokens.bin         byte length of every token (uint16)
+    build-*/token_marks.bin    byte offset of every STRIDE-th token (uint64)
+    build-*/words.bin          distance from each word's start to the previous word's start (uint32)
+    build-*/word_marks.bin     byte offset of every STRIDE-th word (uint64)
+
+A rebuild writes a new build-*/ directory, switches meta.json to it and only
+then unlinks the previous one, so an index that is still mapped (a stream of
+the replaced document) keeps its files rather than having them truncated
+under it, and a reader never sees files from two different builds.
+
+Totals come straight from meta.json. The offset of token or word i is its
+mark plus at most STRIDE-1 deltas, so a seek costs the same anywhere in the
+file. The index takes about 2 bytes per token and 4 per word, roughly the
+size of the document itself for English text, where 8-byte offsets for
+every boundary would take about three times that.
+
+Words are runs of non-whitespace bytes, which for text matches str.split()
+except for non-ASCII whitespace.
+
+    python doc_index.py transcript.txt      # build (or check) the index ahead of time
+"""
+
+import codecs
+import json
+import mmap
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+from array import array
+from bisect import bisect_right
+
+INDEX_VERSION = 2
+STRIDE = 1024
+BUILD_BLOCK = 4 * 1024 * 1024  # bytes tokenized per block while building
+WORD = re.compile(rb'\S+')
+WHITESPACE = b' \t\n\r\x0b\x0c'
+
+
+def index_dir(path):
+    return f"{path}.idx"
+
+
+def split_point(data, start, end):
+    """
+    Where to cut the block data[start:end] so tokenizing the pieces separately gives
+    the same tokens as tokenizing the whole: just after a newline, or failing
+    that just before a space that starts a word
+    """
+    cut = data.rfind(b"\n", start, end)
+    while cut > start:
+        if data[cut + 1:cut + 2] not in WHITESPACE:
+            return cut + 1
+        cut = data.rfind(b"\n", start, cut)
+
+    cut = data.rfind(b" ", start, end)
+    while cut > start:
+        if data[cut - 1:cut] not in WHITESPACE and data[cut + 1:cut + 2] not in WHITESPACE:
+            return cut
+        cut = data.rfind(b" ", start, cut)
+
+    # No whitespace at all: cut on a character boundary; the one token at the cut may differ
+    while end > start + 1 and (data[end] & 0xC0) == 0x80:
+        end -= 1
+    return end
+
+
+def build_index(path, encoding, threads=None):
+    """Tokenize a document block by block and write its index; returns the meta dict"""
+    size = os.path.getsize(path)
+    token_lengths = array('H')
+    token_marks = array('Q')
+    word_gaps = array('I')
+    word_marks = array('Q')
+    token_offset = 0
+    previous_word = 0
+    started = time.time()
+
+    with open(path, 'rb') as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        try:
+            blocks = []
+            position = 0
+            while position < size:
+                end = size if size - position <= BUILD_BLOCK else split_point(data, position, position + BUILD_BLOCK)
+                blocks.append((position, end))
+                position = end
+
+            batch_size = threads or os.cpu_count() or 1
+            for first in range(0, len(blocks), batch_size):
+                batch = blocks[first:first + batch_size]
+                texts = [data[start:end].decode('utf-8') for start, end in batch]
+                encoded = encoding.encode_ordinary_batch(texts, num_threads=batch_size)
+
+                for (start, end), tokens in zip(batch, encoded):
+                    for token_bytes in encoding.decode_tokens_bytes(tokens):
+                        if len(token_lengths) % STRIDE == 0:
+                            token_marks.append(token_offset)
+                        token_lengths.append(len(token_bytes))
+                        token_offset += len(token_bytes)
+
+                    for match in WORD.finditer(data, start, end):
+                        if len(word_gaps) % STRIDE == 0:
+                            word_marks.append(match.start())
+                        word_gaps.append(match.start() - previous_word)
+                        previous_word = match.start()
+
+                print(f"[doc_index] {os.path.basename(path)}: {min(size, batch[-1][1]) / max(size, 1):.0%} indexed")
+        finally:
+            if size:
+                data.close()
+
+    if token_offset != size:
+        raise ValueError(f"Token lengths of {path} add up to {token_offset} bytes, not {size}")
+
+    directory = index_dir(path)
+    os.makedirs(directory, exist_ok=True)
+    build = tempfile.mkdtemp(prefix='build-', dir=directory)
+    for name, values in (('tokens.bin', token_lengths), ('token_marks.bin', token_marks),
+                         ('words.bin', word_gaps), ('word_marks.bin', word_marks)):
+        with open(os.path.join(build, name), 'wb') as f:
+            values.tofile(f)
+
+    stat = os.stat(path)
+    meta = {
+        'version': INDEX_VERSION,
+        'encoding': encoding.name,
+        'stride': STRIDE,
+        'source_size': stat.st_size,
+        'source_mtime_ns': stat.st_mtime_ns,
+        'total_bytes': size,
+        'total_tokens': len(token_lengths),
+        'total_words': len(word_gaps),
+        'build_seconds': round(time.time() - started, 2),
+        'build': os.path.basename(build),
+    }
+    previous = read_meta(path) or {}
+
+    # meta.json is written last, so an interrupted build is never mistaken for a finished one
+    descriptor, temporary = tempfile.mkstemp(prefix='meta-', suffix='.tmp', dir=directory)
+    with open(descriptor, 'w') as f:
+        json.dump(meta, f, indent=2)
+    os.replace(temporary, os.path.join(directory, 'meta.json'))
+
+    # Open maps of the previous build keep its (unlinked) files alive until they are closed
+    if previous.get('build') and previous['build'] != meta['build']:
+        shutil.rmtree(os.path.join(directory, previous['build']), ignore_errors=True)
+    for name in ('tokens.bin', 'token_marks.bin', 'words.bin', 'word_marks.bin'):
+        if os.path.exists(os.path.join(directory, name)):  # left by an index from before build directories
+            os.remove(os.path.join(directory, name))
+    return meta
+
+
+def read_meta(path):
+    """The stored index meta, or None if there is none"""
+    try:
+        with open(os.path.join(index_dir(path), 'meta.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def load_meta(path, encoding):
+    """The index meta if an index exists and matches the document and encoding, else None"""
+    meta = read_meta(path)
+    if meta is None:
+        return None
+
+    stat = os.stat(path)
+    if (meta.get('version') != INDEX_VERSION or meta.get('encoding') != encoding.name
+            or meta.get('stride') != STRIDE or meta.get('source_size') != stat.st_size
+            or meta.get('source_mtime_ns') != stat.st_mtime_ns):
+        return None
+    return meta
+
+
+class DocumentIndex:
+    def __init__(self, path, encoding):
+        """
+        Open a document and its index, building the index first if it is missing or stale
+
+        Args:
+            path: The document (UTF-8 text)
+            encoding: tiktoken encoding the token boundaries are for
+        """
+        self.path = path
+        self.meta = load_meta(path, encoding) or build_index(path, encoding)
+        self.total_bytes = self.meta['total_bytes']
+        self.total_tokens = self.meta['total_tokens']
+        self.total_words = self.meta['total_words']
+
+        self.files = []
+        self.maps = []
+        self.data = self._map(path, 'B')
+        self.text = self.data.obj  # the mmap itself, for regex searches
+        directory = os.path.join(index_dir(path), self.meta['build'])
+        self.token_lengths = self._map(os.path.join(directory, 'tokens.bin'), 'H')
+        self.token_marks = self._map(os.path.join(directory, 'token_marks.bin'), 'Q')
+        self.word_gaps = self._map(os.path.join(directory, 'words.bin'), 'I')
+        self.word_marks = self._map(os.path.join(directory, 'word_marks.bin'), 'Q')
+
+    def _map(self, path, typecode):
+        f = open(path, 'rb')
+        self.files.append(f)
+        if os.fstat(f.fileno()).st_size == 0:
+            return memoryview(b'').cast(typecode)
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.maps.append(mapped)
+        return memoryview(mapped).cast(typecode)
+
+    def token_offset(self, i):
+        """Byte offset where token i starts (total_bytes for i == total_tokens)"""
+        if i >= self.total_tokens:
+            return self.total_bytes
+        base = i - i % STRIDE
+        return self.token_marks[i // STRIDE] + sum(self.token_lengths[base:i])
+
+    def word_offset(self, i):
+        """Byte offset where word i starts"""
+        if i >= self.total_words:
+            return self.total_bytes
+        base = i - i % STRIDE
+        return self.word_marks[i // STRIDE] + sum(self.word_gaps[base + 1:i + 1])
+
+    def token_at(self, offset):
+        """Index of the token containing byte offset"""
+        if offset >= self.total_bytes:
+            return self.total_tokens
+        block = bisect_right(self.token_marks, offset) - 1
+        i = block * STRIDE
+        position = self.token_marks[block]
+        while position + self.token_lengths[i] <= offset:
+            position += self.token_lengths[i]
+            i += 1
+        return i
+
+    def word_at(self, offset):
+        """Index of the first word starting at or after byte offset"""
+        if offset >= self.total_bytes:
+            return self.total_words
+        block = max(0, bisect_right(self.word_marks, offset) - 1)
+        i = block * STRIDE
+        position = self.word_marks[block] if self.total_words else self.total_bytes
+        while i < self.total_words and position < offset:
+            i += 1
+            position += self.word_gaps[i] if i < self.total_words else 0
+        return i
+
+    def iter_tokens(self, start=0, budget=None):
+        """
+        Yield (next token index, text) from token start onwards
+
+        One token per item, or with a byte budget as many whole tokens as fit in
+        budget bytes (at least one). Text is decoded incrementally, so a
+        character split across tokens comes out whole with the token that ends it.
+        """
+        offset = self.token_offset(start)
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+
+        # Resuming inside a multi-byte character: feed its earlier bytes first
+        back = offset
+        while back > max(0, offset - 3) and (self.data[back] & 0xC0) == 0x80:
+            back -= 1
+        if back < offset:
+            decoder.decode(bytes(self.data[back:offset]))
+
+        i = start
+        while i < self.total_tokens:
+            end = offset + self.token_lengths[i]
+            i += 1
+            if budget:
+                while i < self.total_tokens and end + self.token_lengths[i] - offset <= budget:
+                    end += self.token_lengths[i]
+                    i += 1
+            yield i, decoder.decode(bytes(self.data[offset:end]), final=i == self.total_tokens)
+            offset = end
+
+    def iter_words(self, start=0):
+        """Yield (next word index, word) from word start onwards"""
+        position = self.word_offset(start)
+        i = start
+        while i < self.total_words:
+            match = WORD.search(self.text, position)
+            i += 1
+            yield i, match.group().decode('utf-8', errors='replace')
+            position = match.end()
+
+    def close(self):
+        for view in (self.data, self.token_lengths, self.token_marks, self.word_gaps, self.word_marks):
+            view.release()
+        for mapped in self.maps:
+            mapped.close()
+        for f in self.files:
+            f.close()
+
+
+if __name__ == '__main__':
+    import tiktoken
+
+    encoding = tiktoken.get_encoding(os.getenv('TOKEN_ENCODING', 'cl100k_base'))
+    for document in sys.argv[1:]:
+        meta = load_meta(document, encoding) or build_index(document, encoding)
+        print(f"{document}: {meta['total_tokens']} tokens, {meta['total_words']} words, {meta['total_bytes']} bytes")
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Production ASGI Server
+Serves any of the Quart apps in this repo with Hypercorn worker processes instead
+of the single-process development server behind app.run().
+
+- one worker per CPU by default, each with its own event loop
+- uvloop when it is installed, the standard asyncio loop otherwise
+- keep-alive and timeouts tuned for long-lived SSE responses
+- on SIGTERM/SIGINT the workers stop accepting and let in-flight streams finish
+  for up to --graceful-timeout seconds before closing them
+- with --instrument, event loop lag, stacks of calls that block the loop,
+  per-route stream gauges and an on-demand profiler under /_admin/
+  (needs ADMIN_TOKEN or --admin-localhost; see instrumentation.py)
+
+Usage:
+    python app.py simple_streaming --bind 0.0.0.0:5000
+    python app.py openai_reasoning_models_streaming --workers 8 --graceful-timeout 120
+    python app.py ../simple_quart_app/app.py:app
+    python app.py openai_streaming_chat_completions --instrument --stall-threshold 0.1
+"""
+
+import argparse
+import importlib.util
+import os
+import sys
+from pathlib import Path
+
+from hypercorn.config import Config
+from hypercorn.run import run
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def resolve_target(target):
+    """
+    Turn a target into (app directory, hypercorn application path)
+
+    Accepts an app directory name from this repo (serves <dir>/app.py:app) or an
+    explicit path/to/module.py:attribute.
+    """
+    module_path, _, attribute = target.partition(':')
+    path = Path(module_path)
+
+    if not path.suffix:
+        candidate = path if path.is_dir() else REPO_ROOT / module_path
+        path = candidate / 'app.py'
+
+    path = path.resolve()
+    if not path.is_file():
+        raise FileNotFoundError(f"No app module found for '{target}'")
+
+    return path.parent, f"{path.stem}:{attribute or 'app'}"
+
+
+def event_loop_worker_class():
+    """Use uvloop when it is available"""
+    return 'uvloop' if importlib.util.find_spec('uvloop') else 'asyncio'
+
+
+def build_config(args, application_path):
+    config = Config()
+    config.application_path = application_path
+    config.bind = args.bind
+    config.workers = args.workers
+    config.worker_class = args.worker_class or event_loop_worker_class()
+    config.backlog = args.backlog
+
+    # SSE clients hold one response open for a long time, then often reconnect;
+    # keep idle connections around longer than typical load balancer idle timeouts
+    config.keep_alive_timeout = args.keep_alive
+    config.keep_alive_max_requests = 10_000
+
+    # Time allowed for in-flight streams to finish after a shutdown signal
+    config.graceful_timeout = args.graceful_timeout
+
+    # Recycle workers now and then so slow leaks can't build up
+    config.max_requests = args.max_requests
+    config.max_requests_jitter = args.max_requests // 10 if args.max_requests else 0
+
+    config.accesslog = '-' if args.access_log else None
+    config.loglevel = args.log_level.upper()
+    return config
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a Quart app from this repo with multiple Hypercorn workers")
+    parser.add_argument('target', help="App directory (e.g. simple_streaming) or path/to/module.py:app")
+    parser.add_argument('-b', '--bind', action='append', help="Address to bind, host:port (repeatable)")
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count() or 1, help="Worker processes")
+    parser.add_argument('--worker-class', choices=['asyncio', 'uvloop'], help="Event loop (default: uvloop if installed)")
+    parser.add_argument('--keep-alive', type=float, default=75.0, help="Seconds to keep idle connections open")
+    parser.add_argument('--graceful-timeout', type=float, default=30.0,
+                        help="Seconds in-flight streams get to finish on shutdown")
+    parser.add_argument('--backlog', type=int, default=2048, help="Listen backlog for connection bursts")
+    parser.add_argument('--max-requests', type=int, help="Restart a worker after this many requests")
+    parser.add_argument('--access-log', action='store_true', help="Log every request to stdout")
+    parser.add_argument('--log-level', default='info', help="Log level")
+    parser.add_argument('--instrument', action='store_true',
+                        help="Monitor event loop lag and stalls, and serve /_admin/ status and profiling endpoints")
+    parser.add_argument('--stall-threshold', type=float, default=0.25,
+                        help="Seconds the event loop must be blocked before the blocking stack is recorded")
+    parser.add_argument('--admin-localhost', action='store_true',
+                        help="Without ADMIN_TOKEN, let local clients use /_admin/ (not behind a reverse proxy)")
+    args = parser.parse_args()
+    args.bind = args.bind or ['127.0.0.1:5000']
+
+    try:
+        app_dir, application_path = resolve_target(args.target)
+    except FileNotFoundError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    if args.instrument:
+        os.environ['INSTRUMENT_TARGET'] = application_path
+        os.environ['LOOP_STALL_THRESHOLD'] = str(args.stall_threshold)
+        if args.admin_localhost:
+            os.environ['ADMIN_TRUST_LOCALHOST'] = '1'
+        if not os.getenv('ADMIN_TOKEN') and os.getenv('ADMIN_TRUST_LOCALHOST', '').lower() not in ('1', 'true', 'yes'):
+            print("/_admin/ endpoints are off: set ADMIN_TOKEN (or pass --admin-localhost) to enable them")
+        application_path = 'instrumented:app'
+
+    # Workers are spawned processes; they inherit sys.path, the environment and the working directory
+    sys.path.insert(0, str(app_dir))
+    if args.instrument:
+        sys.path.insert(1, str(Path(__file__).resolve().parent))
+    os.chdir(app_dir)
+
+    config = build_config(args, application_path)
+    print(f"Serving {app_dir.name}/{application_path} on {', '.join(config.bind)} "
+          f"with {config.workers} {config.worker_class} worker(s)")
+    sys.exit(run(config))
+
+
+if __name__ == "__main__":
+    main()
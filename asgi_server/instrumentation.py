@@ -0,0 +1,308 @@
+"""
+Event-loop instrumentation for the Quart apps
+
+ASGI middleware that shows what a serving process is doing:
+
+- loop lag: a task sleeps lag_interval seconds over and over and records how
+  much later than asked it woke up; anything beyond a millisecond or so means
+  something held the event loop
+- stalls: a watchdog thread notices when that task has not woken up for
+  stall_threshold seconds and captures the event loop thread's stack at that
+  moment, i.e. the blocking call itself (a sync HTTP request, a heavy loop)
+- per-route gauges: requests in progress and streamed responses (no
+  content-length: SSE, chunked) open, per URL rule
+- a sampling profiler run on demand, returning collapsed stacks that
+  flamegraph.pl, speedscope or inferno read directly
+
+Admin endpoints, with Authorization: Bearer $ADMIN_TOKEN:
+
+    GET /_admin/status                     lag percentiles, recent stalls with stacks, route gauges (JSON)
+    GET /_admin/metrics                    the same as Prometheus text
+    GET /_admin/profile?seconds=10         collapsed stacks of every thread
+        &interval=0.005&thread=loop        sampling period; only the event loop thread
+
+Without ADMIN_TOKEN they are off (the paths go to the app like any other)
+unless ADMIN_TRUST_LOCALHOST=1 opts in to trusting clients on 127.0.0.1/::1.
+Only do that without a reverse proxy in front: behind one, every request
+arrives from localhost.
+
+Serve any app with it through asgi_server/app.py --instrument, or wrap one directly:
+
+    app.asgi_app = Instrumentation(app.asgi_app, url_map=app.url_map)
+
+Everything is per process; with several workers each request reaches one of them.
+"""
+
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from urllib.parse import parse_qs
+
+MAX_PROFILE_SECONDS = 60
+LAG_WINDOW = 600  # lag samples kept for percentiles
+MAX_STALLS = 20
+LOCAL_CLIENTS = ('127.0.0.1', '::1', 'localhost')
+
+
+class RouteStats:
+    def __init__(self):
+        self.active = 0
+        self.streaming = 0
+        self.requests = 0
+        self.streams = 0
+
+
+def frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def format_stack(frame):
+    """Innermost-last list of 'function (file:line)' for a frame"""
+    stack = []
+    while frame is not None:
+        stack.append(f"{frame.f_code.co_name} ({os.path.basename(frame.f_code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    return stack[::-1]
+
+
+def sample_stacks(seconds, interval, only_thread=None):
+    """
+    Sample the stacks of every other thread (or only one) for a while
+
+    Returns collapsed stacks, one 'thread;outer;...;inner count' line each,
+    most frequent first.
+    """
+    me = threading.get_ident()
+    names = {thread.ident: thread.name for thread in threading.enumerate()}
+    counts = Counter()
+    deadline = time.monotonic() + seconds
+
+    while time.monotonic() < deadline:
+        for ident, frame in sys._current_frames().items():
+            if ident == me or (only_thread is not None and ident != only_thread):
+                continue
+            labels = []
+            while frame is not None:
+                labels.append(frame_label(frame))
+                frame = frame.f_back
+            counts[';'.join([names.get(ident, str(ident)).replace(';', ':')] + labels[::-1])] += 1
+        time.sleep(interval)
+
+    return "".join(f"{stack} {count}\n" for stack, count in counts.most_common())
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))]
+
+
+class Instrumentation:
+    def __init__(self, app, url_map=None, lag_interval=0.1, stall_threshold=0.25, admin_prefix='/_admin',
+                 admin_token=None, trust_localhost=None):
+        """
+        Wrap an ASGI app
+
+        Args:
+            app: The ASGI app (a Quart app, or a Quart app's asgi_app)
+            url_map: Werkzeug URL map used to label routes (taken from app if it has one)
+            lag_interval: Seconds between loop lag samples
+            stall_threshold: Seconds the loop must be blocked before its stack is captured
+            admin_prefix: Path prefix of the admin endpoints
+            admin_token: Bearer token for the admin endpoints (ADMIN_TOKEN)
+            trust_localhost: Without a token, let local clients call the admin endpoints
+                             (ADMIN_TRUST_LOCALHOST); otherwise they are disabled
+        """
+        self.app = app
+        self.url_map = url_map if url_map is not None else getattr(app, 'url_map', None)
+        self.lag_interval = lag_interval
+        self.stall_threshold = stall_threshold
+        self.admin_prefix = admin_prefix
+        self.admin_token = admin_token if admin_token is not None else os.getenv('ADMIN_TOKEN')
+        if trust_localhost is None:
+            trust_localhost = os.getenv('ADMIN_TRUST_LOCALHOST', '').lower() in ('1', 'true', 'yes')
+        self.trust_localhost = trust_localhost
+
+        self.routes = defaultdict(RouteStats)
+        self.lags = deque(maxlen=LAG_WINDOW)
+        self.lag_samples = 0
+        self.max_lag = 0.0
+        self.stalls = deque(maxlen=MAX_STALLS)
+        self.stall_count = 0
+        self.heartbeat = time.monotonic()
+        self.loop_thread = None
+        self.lag_task = None
+        self.profile_lock = threading.Lock()
+
+    def start(self):
+        """Start the lag task and the watchdog; called on the event loop by the first request"""
+        if self.lag_task is not None:
+            return
+        self.loop_thread = threading.get_ident()
+        self.heartbeat = time.monotonic()
+        self.lag_task = asyncio.get_running_loop().create_task(self._sample_lag())
+        threading.Thread(target=self._watch, name='loop-watchdog', daemon=True).start()
+
+    async def _sample_lag(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.lag_interval)
+            lag = max(0.0, loop.time() - started - self.lag_interval)
+            self.heartbeat = time.monotonic()
+            self.lags.append(lag)
+            self.lag_samples += 1
+            self.max_lag = max(self.max_lag, lag)
+
+    def _watch(self):
+        """Runs in its own thread: catch the event loop thread while it is blocked"""
+        stall = None
+        while True:
+            time.sleep(self.stall_threshold / 4)
+            blocked_for = time.monotonic() - self.heartbeat - self.lag_interval
+
+            if blocked_for >= self.stall_threshold and stall is None:
+                frame = sys._current_frames().get(self.loop_thread)
+                stall = {
+                    'started_at': time.time() - blocked_for,
+                    'blocked_s': round(blocked_for, 3),
+                    'stack': format_stack(frame) if frame else [],
+                }
+                self.stall_count += 1
+                self.stalls.append(stall)
+                where = stall['stack'][-1] if stall['stack'] else 'unknown'
+                print(f"[instrumentation] event loop blocked for {blocked_for:.2f}s+ in {where}")
+            elif stall is not None:
+                if blocked_for < self.stall_threshold:
+                    stall = None
+                else:
+                    stall['blocked_s'] = round(blocked_for, 3)
+
+    def route_of(self, scope):
+        if self.url_map is None:
+            return scope['path']
+        try:
+            rule, _ = self.url_map.bind('instrumentation').match(scope['path'], method=scope['method'],
+                                                                  return_rule=True)
+            return rule.rule
+        except Exception:
+            return 'unmatched'
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        self.start()
+        if scope['path'].startswith(self.admin_prefix + '/') and (self.admin_token or self.trust_localhost):
+            return await self.admin(scope, send)
+
+        stats = self.routes[self.route_of(scope)]
+        stats.active += 1
+        stats.requests += 1
+        streaming = False
+
+        async def counting_send(message):
+            nonlocal streaming
+            # Buffered responses carry a content-length; streamed ones (SSE, chunked) don't
+            if message['type'] == 'http.response.start' and not any(
+                    name.lower() == b'content-length' for name, _ in message.get('headers', [])):
+                streaming = True
+                stats.streaming += 1
+                stats.streams += 1
+            await send(message)
+
+        try:
+            await self.app(scope, receive, counting_send)
+        finally:
+            stats.active -= 1
+            if streaming:
+                stats.streaming -= 1
+
+    def status(self):
+        lags = list(self.lags)
+        return {
+            'loop_lag_s': {
+                'p50': round(percentile(lags, 50), 4),
+                'p99': round(percentile(lags, 99), 4),
+                'max_recent': round(max(lags, default=0.0), 4),
+                'max': round(self.max_lag, 4),
+                'samples': self.lag_samples,
+            },
+            'stalls': self.stall_count,
+            'recent_stalls': list(self.stalls),
+            'routes': {route: {'active': stats.active, 'streaming': stats.streaming, 'requests': stats.requests,
+                               'streams': stats.streams}
+                       for route, stats in sorted(self.routes.items())},
+        }
+
+    def prometheus(self):
+        lags = list(self.lags)
+        lines = [
+            "# TYPE event_loop_lag_seconds summary",
+            f'event_loop_lag_seconds{{quantile="0.5"}} {percentile(lags, 50)}',
+            f'event_loop_lag_seconds{{quantile="0.99"}} {percentile(lags, 99)}',
+            "# TYPE event_loop_lag_max_seconds gauge",
+            f"event_loop_lag_max_seconds {self.max_lag}",
+            "# TYPE event_loop_stalls_total counter",
+            f"event_loop_stalls_total {self.stall_count}",
+        ]
+        for metric, kind, field in (('http_active_requests', 'gauge', 'active'),
+                                    ('http_active_streams', 'gauge', 'streaming'),
+                                    ('http_requests_total', 'counter', 'requests'),
+                                    ('http_streams_total', 'counter', 'streams')):
+            lines.append(f"# TYPE {metric} {kind}")
+            for route, stats in sorted(self.routes.items()):
+                lines.append(f'{metric}{{route="{route}"}} {getattr(stats, field)}')
+        return "\n".join(lines) + "\n"
+
+    def authorized(self, scope):
+        if self.admin_token:
+            headers = dict(scope.get('headers') or [])
+            return headers.get(b'authorization', b'').decode('latin-1') == f"Bearer {self.admin_token}"
+        client = scope.get('client')
+        return client is not None and client[0] in LOCAL_CLIENTS
+
+    async def admin(self, scope, send):
+        if not self.authorized(scope):
+            return await respond(send, 403, {'error': 'Admin endpoints need Authorization: Bearer $ADMIN_TOKEN'
+                                             if self.admin_token else 'Admin endpoints only answer local clients'})
+
+        action = scope['path'][len(self.admin_prefix) + 1:]
+        query = {key: values[-1] for key, values in parse_qs(scope.get('query_string', b'').decode()).items()}
+
+        if action == 'status':
+            return await respond(send, 200, self.status())
+        if action == 'metrics':
+            return await respond(send, 200, self.prometheus(), 'text/plain; version=0.0.4')
+        if action == 'profile':
+            try:
+                seconds = min(MAX_PROFILE_SECONDS, float(query.get('seconds', 10)))
+                interval = max(0.001, float(query.get('interval', 0.005)))
+            except ValueError:
+                return await respond(send, 400, {'error': 'seconds and interval must be numbers'})
+            only_thread = self.loop_thread if query.get('thread') == 'loop' else None
+
+            if not self.profile_lock.acquire(blocking=False):
+                return await respond(send, 409, {'error': 'A profile is already running'})
+            try:
+                stacks = await asyncio.to_thread(sample_stacks, seconds, interval, only_thread)
+            finally:
+                self.profile_lock.release()
+            return await respond(send, 200, stacks, 'text/plain')
+
+        return await respond(send, 404, {'error': f"Unknown admin endpoint {action!r}"})
+
+
+async def respond(send, status, body, content_type='application/json'):
+    if not isinstance(body, str):
+        body = json.dumps(body, indent=2)
+    payload = body.encode('utf-8')
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', content_type.encode()), (b'content-length', str(len(payload)).encode())]})
+    await send({'type': 'http.response.body', 'body': payload})
@@ -0,0 +1,15 @@
+"""
+The app named by INSTRUMENT_TARGET (module:attribute), wrapped in Instrumentation
+
+Hypercorn imports this in every worker when app.py is run with --instrument.
+"""
+
+import importlib
+import os
+
+from instrumentation import Instrumentation
+
+module_name, _, attribute = os.environ['INSTRUMENT_TARGET'].partition(':')
+target = getattr(importlib.import_module(module_name), attribute or 'app')
+
+app = Instrumentation(target, stall_threshold=float(os.getenv('LOOP_STALL_THRESHOLD', 0.25)))
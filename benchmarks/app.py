@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+"""
+Benchmark Suite
+Runs the apps in this repo against local stand-in services (see mock_services.py)
+and reports throughput, p50/p99 latency and memory for each scenario.
+
+Every scenario runs in its own subprocess so memory numbers are not mixed up,
+while the mock services run in this process. Nothing here calls a paid API.
+
+Usage:
+    python app.py                                  # all scenarios
+    python app.py zenrows_parallel simple_streaming --iterations 50 --concurrency 10
+    python app.py --zenrows-latency uniform:0.2,1.5 --page-bytes 200000 --output results.json
+"""
+
+import argparse
+import asyncio
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from mock_services import MockConfig, MockServices
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+REPORT_MARKER = 'BENCHMARK_REPORT '
+
+QUESTION = "compare gdp of thailand and vietnam"
+
+# name -> (kind, app directory, request); request is only used by ASGI scenarios
+SCENARIOS = {
+    'zenrows_parallel': ('sync', 'zenrows_parallel', None),
+    'simple_chatbot_v2': ('sync', 'simple_chatbot_v2', None),
+    'simple_streaming': ('asgi', 'simple_streaming', ('GET', '/stream', None)),
+    'additional_info_when_streaming': ('asgi', 'additional_info_when_streaming', ('GET', '/stream', None)),
+    'openai_streaming_chat_completions': ('asgi', 'openai_streaming_chat_completions',
+                                          ('POST', '/ask', {'question': QUESTION})),
+    'openai_reasoning_models_streaming': ('asgi', 'openai_reasoning_models_streaming',
+                                          ('POST', '/stream', {'prompt': QUESTION})),
+}
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def current_rss_mb():
+    """Resident set size of this process in MB (Linux), or None"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+def load_app(directory):
+    """Import <directory>/app.py as a fresh module"""
+    path = REPO_ROOT / directory / 'app.py'
+    sys.path.insert(0, str(path.parent))
+    spec = importlib.util.spec_from_file_location(f"{directory}_app", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+# ---------------------------------------------------------------------------
+# Scenario workers (run inside the subprocess)
+# ---------------------------------------------------------------------------
+
+def build_sync_operation(directory, module):
+    """A callable running one operation; it raises when the operation failed"""
+    if directory == 'zenrows_parallel':
+        urls = [f"https://site{i}.example.com/page" for i in range(3)]
+
+        def fetch():
+            # Fetch errors come back as text rather than exceptions
+            results = module.fetch_multiple_urls_parallel(urls, 'mock-key')
+            failed = [url for url, content in results.items() if content.startswith('Error')]
+            if failed:
+                raise RuntimeError(f"{len(failed)} of {len(urls)} fetches failed")
+        return fetch
+
+    if directory == 'simple_chatbot_v2':
+        # A fresh local index per run, so earlier runs don't turn searches into index hits
+        qa = module.QuestionAnsweringApp('mock-key', 'mock-key', 'mock-cse', 'mock-key',
+                                         index_dir=tempfile.mkdtemp(prefix='qa-index-'),
+                                         duplicate_domains_path=None,
+                                         page_store_dir=None)
+
+        def answer():
+            # answer_question reports failures instead of raising them
+            answer = qa.answer_question(QUESTION)
+            if answer is None or answer == module.ANSWER_FAILED:
+                raise RuntimeError("No answer was generated")
+        return answer
+
+    raise ValueError(f"No sync operation for {directory}")
+
+
+def run_sync_scenario(directory, iterations, concurrency, warmup):
+    module = load_app(directory)
+    operation = build_sync_operation(directory, module)
+
+    def timed():
+        start = time.perf_counter()
+        operation()
+        return time.perf_counter() - start
+
+    for _ in range(warmup):
+        with contextlib.suppress(Exception):
+            operation()
+
+    latencies = []
+    errors = 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [executor.submit(timed) for _ in range(iterations)]
+        for future in futures:
+            try:
+                latencies.append(future.result())
+            except Exception:
+                errors += 1
+    elapsed = time.perf_counter() - start
+
+    return {'latencies': latencies, 'errors': errors, 'elapsed': elapsed}
+
+
+class ASGIClient:
+    """Drives an ASGI app in-process, timing the first and last body chunk"""
+
+    def __init__(self, app):
+        self.app = app
+        self.lifespan_task = None
+        self.shutdown = None
+
+    async def startup(self):
+        started = asyncio.Event()
+        self.shutdown = asyncio.Event()
+        startup_sent = False
+
+        async def receive():
+            nonlocal startup_sent
+            if not startup_sent:
+                startup_sent = True
+                return {'type': 'lifespan.startup'}
+            await self.shutdown.wait()
+            return {'type': 'lifespan.shutdown'}
+
+        async def send(message):
+            if message['type'].startswith('lifespan.startup'):
+                started.set()
+
+        scope = {'type': 'lifespan', 'asgi': {'version': '3.0'}, 'state': {}}
+        self.lifespan_task = asyncio.create_task(self.app(scope, receive, send))
+        await asyncio.wait_for(started.wait(), timeout=10)
+
+    async def close(self):
+        self.shutdown.set()
+        with contextlib.suppress(Exception):
+            await asyncio.wait_for(self.lifespan_task, timeout=10)
+
+    async def request(self, method, path, payload=None):
+        body = json.dumps(payload).encode() if payload is not None else b''
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': method,
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': b'',
+            'root_path': '',
+            'headers': [
+                (b'host', b'benchmark'),
+                (b'content-type', b'application/json'),
+                (b'content-length', str(len(body)).encode()),
+            ],
+            'client': ('127.0.0.1', 0),
+            'server': ('benchmark', 80),
+            'extensions': {},
+        }
+        request_sent = False
+        finished = asyncio.Event()
+        result = {'status': None, 'first_byte': None, 'events': 0, 'bytes': 0, 'stream_error': False}
+
+        async def receive():
+            nonlocal request_sent
+            if not request_sent:
+                request_sent = True
+                return {'type': 'http.request', 'body': body, 'more_body': False}
+            await finished.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                result['status'] = message['status']
+            elif message['type'] == 'http.response.body':
+                chunk = message.get('body', b'')
+                if chunk:
+                    if result['first_byte'] is None:
+                        result['first_byte'] = time.perf_counter() - start
+                    result['events'] += chunk.count(b'\n\n')
+                    # The apps report upstream failures as an error event inside a 200 stream
+                    if b'data: {"error"' in chunk or b'"type": "error"' in chunk:
+                        result['stream_error'] = True
+                    result['bytes'] += len(chunk)
+                if not message.get('more_body', False):
+                    finished.set()
+
+        start = time.perf_counter()
+        await self.app(scope, receive, send)
+        finished.set()
+        result['latency'] = time.perf_counter() - start
+        return result
+
+
+def run_asgi_scenario(directory, request, iterations, concurrency, warmup):
+    module = load_app(directory)
+    method, path, payload = request
+
+    async def main():
+        client = ASGIClient(module.app)
+        await client.startup()
+
+        for _ in range(warmup):
+            await client.request(method, path, payload)
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one():
+            async with semaphore:
+                return await client.request(method, path, payload)
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(one() for _ in range(iterations)), return_exceptions=True)
+        elapsed = time.perf_counter() - start
+        await client.close()
+        return results, elapsed
+
+    results, elapsed = asyncio.run(main())
+    ok = [r for r in results if isinstance(r, dict) and r['status'] == 200 and not r['stream_error']]
+
+    return {
+        'latencies': [r['latency'] for r in ok],
+        'first_byte': [r['first_byte'] for r in ok if r['first_byte'] is not None],
+        'events': sum(r['events'] for r in ok),
+        'bytes': sum(r['bytes'] for r in ok),
+        'errors': len(results) - len(ok),
+        'elapsed': elapsed,
+    }
+
+
+def run_worker(scenario, iterations, concurrency, warmup):
+    """Run one scenario and print its JSON report on the real stdout"""
+    kind, directory, request = SCENARIOS[scenario]
+    rss_start = current_rss_mb()
+
+    # The apps print progress; keep it out of the report
+    with contextlib.redirect_stdout(io.StringIO()):
+        if kind == 'sync':
+            raw = run_sync_scenario(directory, iterations, concurrency, warmup)
+        else:
+            raw = run_asgi_scenario(directory, request, iterations, concurrency, warmup)
+
+    latencies = raw['latencies']
+    report = {
+        'scenario': scenario,
+        'iterations': iterations,
+        'concurrency': concurrency,
+        'errors': raw['errors'],
+        'elapsed_s': raw['elapsed'],
+        'throughput_per_s': len(latencies) / raw['elapsed'] if raw['elapsed'] else 0.0,
+        'latency_p50_s': percentile(latencies, 50),
+        'latency_p99_s': percentile(latencies, 99),
+        'rss_start_mb': rss_start,
+        'rss_end_mb': current_rss_mb(),
+        'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+    if 'first_byte' in raw:
+        report['first_byte_p50_s'] = percentile(raw['first_byte'], 50)
+        report['first_byte_p99_s'] = percentile(raw['first_byte'], 99)
+        report['events_per_s'] = raw['events'] / raw['elapsed'] if raw['elapsed'] else 0.0
+
+    # Background threads of the app may still print, so tag the report line
+    print(REPORT_MARKER + json.dumps(report), flush=True)
+
+
+# ---------------------------------------------------------------------------
+# Orchestration
+# ---------------------------------------------------------------------------
+
+def run_scenario_subprocess(scenario, args, services):
+    env = dict(os.environ)
+    env.update(services.env())
+    env['STREAM_DELAY'] = str(args.stream_delay)
+    env['STREAM_START_DELAY'] = str(args.stream_delay)
+
+    command = [sys.executable, str(Path(__file__).resolve()), '--worker', scenario,
+               '--iterations', str(args.iterations), '--concurrency', str(args.concurrency),
+               '--warmup', str(args.warmup)]
+    completed = subprocess.run(command, env=env, capture_output=True, text=True,
+                               cwd=str(Path(__file__).resolve().parent))
+
+    for line in completed.stdout.splitlines():
+        if line.startswith(REPORT_MARKER):
+            return json.loads(line[len(REPORT_MARKER):])
+    return {'scenario': scenario, 'failed': completed.stderr.strip().splitlines()[-1:] or ['unknown error']}
+
+
+def print_table(reports):
+    header = f"{'scenario':<36}{'ops/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'ttfb p50':>10}{'max rss':>10}{'errors':>8}"
+    print(header)
+    print("-" * len(header))
+    for report in reports:
+        if 'failed' in report:
+            print(f"{report['scenario']:<36}FAILED: {report['failed'][0]}")
+            continue
+        ttfb = report.get('first_byte_p50_s')
+        ttfb_text = f"{ttfb * 1000:.1f}" if ttfb is not None else "-"
+        print(f"{report['scenario']:<36}{report['throughput_per_s']:>10.2f}"
+              f"{report['latency_p50_s'] * 1000:>10.1f}{report['latency_p99_s'] * 1000:>10.1f}"
+              f"{ttfb_text:>10}{report['max_rss_mb']:>9.1f}M{report['errors']:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the apps against local stand-in services")
+    parser.add_argument('scenarios', nargs='*', help=f"Scenarios to run (default: all of {', '.join(SCENARIOS)})")
+    parser.add_argument('--iterations', type=int, default=20, help="Measured operations per scenario")
+    parser.add_argument('--concurrency', type=int, default=5, help="Operations in flight at once")
+    parser.add_argument('--warmup', type=int, default=1, help="Unmeasured operations before timing")
+    parser.add_argument('--zenrows-latency', default='lognormal:-1.5,0.6', help="Latency spec for ZenRows")
+    parser.add_argument('--google-latency', default='fixed:0.15', help="Latency spec for Google CSE")
+    parser.add_argument('--openai-latency', default='fixed:0.3', help="Latency spec for OpenAI first byte")
+    parser.add_argument('--page-bytes', type=int, default=60_000, help="Size of each crawled page")
+    parser.add_argument('--stream-tokens', type=int, default=200, help="Tokens per OpenAI answer")
+    parser.add_argument('--token-interval', type=float, default=0.01, help="Seconds between OpenAI tokens")
+    parser.add_argument('--stream-delay', type=float, default=0.0, help="STREAM_DELAY for the demo streaming apps")
+    parser.add_argument('--seed', type=int, default=1234, help="Seed for latencies and content")
+    parser.add_argument('--output', help="Write the full JSON report to this file")
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.iterations, args.concurrency, args.warmup)
+        return
+
+    unknown = [s for s in args.scenarios if s not in SCENARIOS]
+    if unknown:
+        print(f"Unknown scenario(s): {', '.join(unknown)}")
+        print(f"Available: {', '.join(SCENARIOS)}")
+        sys.exit(1)
+
+    config = MockConfig(
+        zenrows_latency=args.zenrows_latency,
+        google_latency=args.google_latency,
+        openai_latency=args.openai_latency,
+        page_bytes=args.page_bytes,
+        stream_tokens=args.stream_tokens,
+        token_interval=args.token_interval,
+        seed=args.seed,
+    )
+    services = MockServices(config).start()
+    print(f"Mock services on {services.base_url}\n")
+
+    reports = []
+    try:
+        for scenario in args.scenarios or list(SCENARIOS):
+            print(f"Running {scenario}...")
+            reports.append(run_scenario_subprocess(scenario, args, services))
+    finally:
+        services.stop()
+
+    print()
+    print_table(reports)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'config': vars(args), 'mock_requests': services.request_counts, 'results': reports}, f, indent=2)
+        print(f"\nFull report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Ingestion Benchmark
+Serves simple_quart_app through asgi_server/ and uploads the same records two
+ways: as one JSON document to /api/data (buffered, so capped by
+MAX_CONTENT_LENGTH) and as a streamed NDJSON body to /api/records. Reports
+records/s, MB/s and the server's peak RSS for each, plus the JSON codec speed
+on its own.
+
+Usage:
+    python ingest.py --records 2000000
+    python ingest.py --records 500000 --batch-size 5000 --output ingest.json
+"""
+
+import argparse
+import http.client
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+import orjson
+
+from app import REPO_ROOT
+from serving import free_port, load_generator_module, server_command, wait_for_port
+
+CHUNK_RECORDS = 500  # records per chunk of the streamed upload
+
+
+def make_record(i):
+    return {
+        'id': i,
+        'name': f"user-{i}",
+        'email': f"user-{i}@example.com",
+        'score': round(i * 0.37 % 100, 2),
+        'active': i % 3 != 0,
+        'tags': ['alpha', 'beta', 'gamma'][:i % 3 + 1],
+        'address': {'city': 'Springfield', 'zip': f"{10000 + i % 89999}"},
+    }
+
+
+def ndjson_chunks(count):
+    for start in range(0, count, CHUNK_RECORDS):
+        yield b''.join(orjson.dumps(make_record(i)) + b"\n" for i in range(start, min(count, start + CHUNK_RECORDS)))
+
+
+class RSSSampler:
+    """Samples a process tree's RSS in the background and keeps the peak"""
+
+    def __init__(self, pid, rss_function, interval=0.05):
+        self.pid = pid
+        self.rss_function = rss_function
+        self.interval = interval
+        self.peak = 0.0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self.stopped.is_set():
+            self.peak = max(self.peak, self.rss_function(self.pid) or 0.0)
+            self.stopped.wait(self.interval)
+
+    def __enter__(self):
+        self.peak = self.rss_function(self.pid) or 0.0
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopped.set()
+        self.thread.join()
+
+
+def post(port, path, body, content_type, chunked=False):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=600)
+    try:
+        headers = {'Content-Type': content_type}
+        connection.request('POST', path, body=body, headers=headers, encode_chunked=chunked)
+        response = connection.getresponse()
+        return response.status, response.read()
+    finally:
+        connection.close()
+
+
+def run_upload(name, port, server_pid, rss_function, records, upload):
+    idle_rss = rss_function(server_pid) or 0.0
+    start = time.perf_counter()
+    with RSSSampler(server_pid, rss_function) as sampler:
+        status, body = upload()
+    elapsed = time.perf_counter() - start
+
+    report = {'endpoint': name, 'records': records, 'status': status, 'seconds': elapsed,
+              'records_per_s': records / elapsed if status == 200 else 0.0,
+              'idle_rss_mb': idle_rss, 'peak_rss_mb': sampler.peak}
+    if status != 200:
+        report['error'] = body[:200].decode('utf-8', 'replace')
+    return report
+
+
+def codec_speed(records):
+    """Decode speed of the stdlib json module vs orjson on one JSON array"""
+    payload = orjson.dumps([make_record(i) for i in range(records)])
+    speeds = {}
+    for name, loads in (('json', json.loads), ('orjson', orjson.loads)):
+        start = time.perf_counter()
+        loads(payload)
+        speeds[name] = records / (time.perf_counter() - start)
+    return speeds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure JSON and NDJSON ingestion throughput")
+    parser.add_argument('--records', type=int, default=1_000_000, help="Records in the NDJSON upload")
+    parser.add_argument('--json-records', type=int, default=50_000,
+                        help="Records in the /api/data upload (must fit MAX_CONTENT_LENGTH)")
+    parser.add_argument('--batch-size', type=int, default=1000, help="RECORD_BATCH_SIZE for the server")
+    parser.add_argument('--output', help="Write the reports to this JSON file")
+    args = parser.parse_args()
+
+    rss_function = load_generator_module().process_tree_rss_mb
+    env = dict(os.environ)
+    env['RECORD_BATCH_SIZE'] = str(args.batch_size)
+
+    port = free_port()
+    directory = 'simple_quart_app'
+    server = subprocess.Popen(server_command('production', directory, port, 1), cwd=REPO_ROOT / directory,
+                              env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    reports = []
+    try:
+        if not wait_for_port(port):
+            print("Server did not start")
+            sys.exit(1)
+
+        array = orjson.dumps([make_record(i) for i in range(args.json_records)])
+        print(f"Uploading {args.json_records} records as one JSON document ({len(array) / 1e6:.1f} MB)...")
+        reports.append(run_upload('/api/data', port, server.pid, rss_function, args.json_records,
+                                  lambda: post(port, '/api/data', array, 'application/json')))
+        reports[-1]['mb_per_s'] = len(array) / 1e6 / reports[-1]['seconds']
+        del array
+
+        print(f"Streaming {args.records} records as NDJSON...")
+        reports.append(run_upload('/api/records', port, server.pid, rss_function, args.records,
+                                  lambda: post(port, '/api/records', ndjson_chunks(args.records),
+                                               'application/x-ndjson', chunked=True)))
+    finally:
+        server.send_signal(signal.SIGTERM)
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+    print()
+    print(f"{'endpoint':<14}{'records':>10}{'status':>8}{'seconds':>9}{'records/s':>12}{'idle rss':>10}{'peak rss':>10}")
+    for report in reports:
+        print(f"{report['endpoint']:<14}{report['records']:>10}{report['status']:>8}{report['seconds']:>9.2f}"
+              f"{report['records_per_s']:>12.0f}{report['idle_rss_mb']:>8.1f}MB{report['peak_rss_mb']:>8.1f}MB")
+        if 'error' in report:
+            print(f"  {report['error']}")
+
+    speeds = codec_speed(args.json_records)
+    print(f"\nDecoding alone: json {speeds['json']:.0f} records/s, orjson {speeds['orjson']:.0f} records/s "
+          f"({speeds['orjson'] / speeds['json']:.1f}x)")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'uploads': reports, 'codec_records_per_s': speeds}, f, indent=2)
+        print(f"\nReports written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
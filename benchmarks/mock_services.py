@@ -0,0 +1,317 @@
+"""
+Local stand-ins for the paid APIs used by the apps in this repo
+
+One threaded HTTP server answers for:
+- ZenRows            GET  /zenrows/v1/?url=...
+- Google CSE         GET  /customsearch/v1?q=...&num=...&start=...
+- OpenAI chat        POST /openai/v1/chat/completions   (plain or stream=true)
+- OpenAI responses   POST /openai/v1/responses          (plain or stream=true)
+
+Latency, payload size and streaming cadence come from a MockConfig. All random
+draws use a seeded generator, so the same config produces the same run.
+Only the standard library is used, so it runs wherever Python does.
+"""
+
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+FILLER_WORDS = (
+    "battery display chipset camera sensor economy growth inflation export market "
+    "report analysis quarter revenue forecast policy region industry capacity"
+).split()
+
+
+class LatencyDistribution:
+    """
+    Parse and sample a latency spec such as:
+
+    fixed:0.2  uniform:0.1,0.5  lognormal:-1.5,0.6  exponential:0.3
+    """
+
+    def __init__(self, spec):
+        self.spec = spec
+        kind, _, args = spec.partition(':')
+        self.kind = kind
+        self.args = [float(a) for a in args.split(',')] if args else []
+
+        if kind not in ('fixed', 'uniform', 'lognormal', 'exponential'):
+            raise ValueError(f"Unknown latency distribution: {spec}")
+
+    def sample(self, rng):
+        """Draw one latency in seconds"""
+        if self.kind == 'fixed':
+            return self.args[0] if self.args else 0.0
+        if self.kind == 'uniform':
+            return rng.uniform(self.args[0], self.args[1])
+        if self.kind == 'lognormal':
+            return rng.lognormvariate(self.args[0], self.args[1])
+        return rng.expovariate(1 / self.args[0])
+
+
+class MockConfig:
+    def __init__(self, zenrows_latency='lognormal:-1.5,0.6', google_latency='fixed:0.15',
+                 openai_latency='fixed:0.3', page_bytes=60_000, stream_tokens=200,
+                 token_interval=0.01, seed=1234):
+        """
+        Configure the stand-in services
+
+        Args:
+            zenrows_latency: Latency spec for each ZenRows fetch
+            google_latency: Latency spec for each Google CSE request
+            openai_latency: Latency spec before the first OpenAI byte
+            page_bytes: Approximate size of each fetched HTML page
+            stream_tokens: Number of tokens in each OpenAI answer
+            token_interval: Seconds between streamed tokens
+            seed: Random seed for latencies and content
+        """
+        self.zenrows_latency = LatencyDistribution(zenrows_latency)
+        self.google_latency = LatencyDistribution(google_latency)
+        self.openai_latency = LatencyDistribution(openai_latency)
+        self.page_bytes = page_bytes
+        self.stream_tokens = stream_tokens
+        self.token_interval = token_interval
+        self.seed = seed
+
+
+class MockServices:
+    def __init__(self, config=None, host='127.0.0.1', port=0):
+        """
+        Create the server (call start() to begin serving)
+
+        Args:
+            config: MockConfig; defaults are used when omitted
+            host: Interface to bind
+            port: Port to bind (0 picks a free one)
+        """
+        self.config = config or MockConfig()
+        self.rng = random.Random(self.config.seed)
+        self.rng_lock = threading.Lock()
+        self.request_counts = {}
+        self.server = ThreadingHTTPServer((host, port), _make_handler(self))
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def env(self):
+        """Environment variables that point the apps at this server"""
+        return {
+            'ZENROWS_API_URL': f"{self.base_url}/zenrows/v1/",
+            'GOOGLE_SEARCH_URL': f"{self.base_url}/customsearch/v1",
+            'OPENAI_BASE_URL': f"{self.base_url}/openai/v1",
+            'OPENAI_API_KEY': 'mock-key',
+        }
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def sample(self, distribution):
+        with self.rng_lock:
+            return distribution.sample(self.rng)
+
+    def count(self, endpoint):
+        with self.rng_lock:
+            self.request_counts[endpoint] = self.request_counts.get(endpoint, 0) + 1
+
+    def html_page(self, url):
+        """Deterministic HTML page of roughly config.page_bytes bytes"""
+        rng = random.Random(f"{self.config.seed}:{url}")
+        paragraphs = []
+        size = 0
+        while size < self.config.page_bytes:
+            paragraph = ' '.join(rng.choice(FILLER_WORDS) for _ in range(60))
+            paragraphs.append(f"<p>{paragraph}</p>")
+            size += len(paragraph) + 7
+        return (f"<html><head><title>{url}</title><script>var x = 1;</script></head>"
+                f"<body><h1>{url}</h1>{''.join(paragraphs)}</body></html>")
+
+    def answer_tokens(self):
+        rng = random.Random(self.config.seed)
+        return [rng.choice(FILLER_WORDS) + ' ' for _ in range(self.config.stream_tokens)]
+
+
+def _make_handler(services):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            parsed = urlparse(self.path)
+            query = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+
+            if parsed.path.startswith('/zenrows/'):
+                services.count('zenrows')
+                time.sleep(services.sample(services.config.zenrows_latency))
+                self.send_body(200, 'text/html; charset=utf-8', services.html_page(query.get('url', '')).encode())
+            elif parsed.path.startswith('/customsearch/'):
+                services.count('google')
+                time.sleep(services.sample(services.config.google_latency))
+                self.send_json(200, self.search_results(query))
+            else:
+                self.send_json(404, {'error': 'not found'})
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            body = json.loads(self.rfile.read(length) or b'{}')
+
+            if self.path.endswith('/chat/completions'):
+                services.count('chat_completions')
+                time.sleep(services.sample(services.config.openai_latency))
+                if body.get('stream'):
+                    self.stream_events(self.chat_chunks(body), done_marker=True)
+                else:
+                    self.send_json(200, self.chat_completion(body))
+            elif self.path.endswith('/responses'):
+                services.count('responses')
+                time.sleep(services.sample(services.config.openai_latency))
+                if body.get('stream'):
+                    self.stream_events(self.response_events(body), done_marker=False)
+                else:
+                    self.send_json(200, self.response_object(body, 'completed'))
+            else:
+                self.send_json(404, {'error': 'not found'})
+
+        def send_body(self, status, content_type, payload):
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def send_json(self, status, data):
+            self.send_body(status, 'application/json', json.dumps(data).encode())
+
+        def stream_events(self, events, done_marker):
+            # Chunked so the client sees each event as soon as it is written
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+
+            for event in events:
+                self.write_chunk(f"data: {json.dumps(event)}\n\n".encode())
+                time.sleep(services.config.token_interval)
+            if done_marker:
+                self.write_chunk(b"data: [DONE]\n\n")
+            self.wfile.write(b"0\r\n\r\n")
+
+        def write_chunk(self, payload):
+            self.wfile.write(f"{len(payload):x}\r\n".encode() + payload + b"\r\n")
+            self.wfile.flush()
+
+        def search_results(self, query):
+            num = int(query.get('num', 10))
+            start = int(query.get('start', 1))
+            items = []
+            for position in range(start, start + min(num, 10)):
+                items.append({
+                    'title': f"Result {position} for {query.get('q', '')}",
+                    'link': f"https://site{position % 7}.example.com/article/{position}",
+                    'snippet': ' '.join(FILLER_WORDS[:12]),
+                })
+            return {'items': items}
+
+        def chat_completion(self, body):
+            content = ''.join(services.answer_tokens())
+            return {
+                'id': 'chatcmpl-mock',
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': body.get('model', 'gpt-4o'),
+                'choices': [{
+                    'index': 0,
+                    'message': {'role': 'assistant', 'content': content},
+                    'finish_reason': 'stop',
+                }],
+                'usage': _usage(body, services.config.stream_tokens),
+            }
+
+        def chat_chunks(self, body):
+            base = {
+                'id': 'chatcmpl-mock',
+                'object': 'chat.completion.chunk',
+                'created': int(time.time()),
+                'model': body.get('model', 'gpt-4o'),
+            }
+            for token in services.answer_tokens():
+                yield dict(base, choices=[{'index': 0, 'delta': {'content': token}, 'finish_reason': None}])
+            yield dict(base, choices=[{'index': 0, 'delta': {}, 'finish_reason': 'stop'}])
+
+        def response_object(self, body, status):
+            response = {
+                'id': 'resp_mock',
+                'object': 'response',
+                'created_at': int(time.time()),
+                'model': body.get('model', 'o4-mini'),
+                'status': status,
+                'output': [],
+                'parallel_tool_calls': True,
+                'tool_choice': 'auto',
+                'tools': [],
+            }
+            if status == 'completed':
+                text = ''.join(services.answer_tokens())
+                response['output'] = [{
+                    'id': 'msg_mock',
+                    'type': 'message',
+                    'role': 'assistant',
+                    'status': 'completed',
+                    'content': [{'type': 'output_text', 'text': text, 'annotations': []}],
+                }]
+                response['usage'] = {
+                    'input_tokens': len(str(body.get('input', ''))) // 4,
+                    'output_tokens': services.config.stream_tokens,
+                    'total_tokens': len(str(body.get('input', ''))) // 4 + services.config.stream_tokens,
+                    'input_tokens_details': {'cached_tokens': 0},
+                    'output_tokens_details': {'reasoning_tokens': 0},
+                }
+            return response
+
+        def response_events(self, body):
+            sequence = 0
+            yield {'type': 'response.created', 'sequence_number': sequence,
+                   'response': self.response_object(body, 'in_progress')}
+            for token in services.answer_tokens():
+                sequence += 1
+                yield {'type': 'response.output_text.delta', 'sequence_number': sequence,
+                       'item_id': 'msg_mock', 'output_index': 0, 'content_index': 0, 'delta': token}
+            yield {'type': 'response.completed', 'sequence_number': sequence + 1,
+                   'response': self.response_object(body, 'completed')}
+
+    return Handler
+
+
+def _usage(body, completion_tokens):
+    prompt_tokens = sum(len(str(m.get('content', ''))) for m in body.get('messages', [])) // 4
+    return {
+        'prompt_tokens': prompt_tokens,
+        'completion_tokens': completion_tokens,
+        'total_tokens': prompt_tokens + completion_tokens,
+        'prompt_tokens_details': {'cached_tokens': 0},
+    }
+
+
+if __name__ == '__main__':
+    services = MockServices(port=8765).start()
+    print(f"Mock services listening on {services.base_url}")
+    for key, value in services.env().items():
+        print(f"export {key}={value}")
+    try:
+        services.thread.join()
+    except KeyboardInterrupt:
+        services.stop()
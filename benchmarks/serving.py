@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Serving Benchmark
+Starts a Quart streaming app twice, first with the development server (app.run(),
+as in each app's __main__ block) and then through asgi_server/, and drives both
+with the SSE load generator so the two can be compared side by side.
+
+Usage:
+    python serving.py simple_streaming --connections 1000 --ramp 5
+    python serving.py openai_streaming_chat_completions --workers 4 --output serving.json
+"""
+
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+from app import REPO_ROOT, SCENARIOS
+from mock_services import MockConfig, MockServices
+
+
+def load_generator_module():
+    path = REPO_ROOT / 'sse_load_generator' / 'app.py'
+    spec = importlib.util.spec_from_file_location('sse_load_generator_app', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def server_command(mode, directory, port, workers):
+    if mode == 'dev':
+        return [sys.executable, '-c', f"import app; app.app.run(host='127.0.0.1', port={port})"]
+    return [sys.executable, str(REPO_ROOT / 'asgi_server' / 'app.py'), directory,
+            '--bind', f"127.0.0.1:{port}", '--workers', str(workers)]
+
+
+def run_one(mode, scenario, args, env, generator_module):
+    _, directory, (method, path, payload) = SCENARIOS[scenario]
+    port = free_port()
+    server = subprocess.Popen(server_command(mode, directory, port, args.workers), cwd=REPO_ROOT / directory,
+                              env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not wait_for_port(port):
+            return {'server': mode, 'failed': 'server did not start'}
+
+        generator = generator_module.LoadGenerator(
+            f"http://127.0.0.1:{port}{path}", args.connections, ramp_seconds=args.ramp, method=method,
+            body=json.dumps(payload).encode() if payload else None, server_pid=server.pid,
+            sample_interval=0.5,
+        )
+        report = asyncio.run(generator.run())
+    finally:
+        shutdown_start = time.monotonic()
+        server.send_signal(signal.SIGTERM)
+        try:
+            server.wait(timeout=60)
+        except subprocess.TimeoutExpired:
+            server.kill()
+        shutdown_time = time.monotonic() - shutdown_start
+
+    report.pop('timeline')
+    report['server'] = mode
+    report['shutdown_s'] = shutdown_time
+    return report
+
+
+def main():
+    streaming = [name for name, (kind, _, _) in SCENARIOS.items() if kind == 'asgi']
+
+    parser = argparse.ArgumentParser(description="Compare the dev server with the production ASGI server")
+    parser.add_argument('scenario', choices=streaming, help="Streaming app to serve")
+    parser.add_argument('-c', '--connections', type=int, default=500, help="Concurrent SSE connections")
+    parser.add_argument('--ramp', type=float, default=5.0, help="Seconds over which connections are opened")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Production worker processes")
+    parser.add_argument('--stream-delay', type=float, default=0.05, help="STREAM_DELAY for the demo streaming apps")
+    parser.add_argument('--output', help="Write both reports to this JSON file")
+    args = parser.parse_args()
+
+    services = MockServices(MockConfig()).start()
+    env = dict(os.environ)
+    env.update(services.env())
+    env['STREAM_DELAY'] = str(args.stream_delay)
+    env['STREAM_START_DELAY'] = str(args.stream_delay)
+
+    generator_module = load_generator_module()
+    reports = []
+    try:
+        for mode in ('dev', 'production'):
+            print(f"Running {args.scenario} on the {mode} server...")
+            reports.append(run_one(mode, args.scenario, args, env, generator_module))
+    finally:
+        services.stop()
+
+    print()
+    print(f"{'server':<12}{'completed':>10}{'dropped':>9}{'ttfe p50':>10}{'ttfe p99':>10}"
+          f"{'gap p99':>10}{'peak rss':>10}{'shutdown':>10}")
+    for report in reports:
+        if 'failed' in report:
+            print(f"{report['server']:<12}FAILED: {report['failed']}")
+            continue
+        ttfe = report['time_to_first_event_s']
+        gaps = report['inter_event_gap_s']
+        rss = report['server_rss_mb']['peak']
+        print(f"{report['server']:<12}{report['streams_completed']:>10}{report['streams_dropped']:>9}"
+              f"{(ttfe['p50'] or 0) * 1000:>8.1f}ms{(ttfe['p99'] or 0) * 1000:>8.1f}ms"
+              f"{(gaps['p99'] or 0) * 1000:>8.1f}ms{(rss or 0):>8.1f}MB{report['shutdown_s']:>9.1f}s")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(reports, f, indent=2)
+        print(f"\nReports written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,10 +4,45 @@ Simple Google Search App
 A command-line application that searches Google and displays the first 5 URLs.
 """
 
+import asyncio
+import os
 import requests
 import json
 import sys
-from typing import Optional, List
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Optional, List
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+# Overridable so the app can be pointed at a local stand-in (see benchmarks/)
+GOOGLE_SEARCH_URL = os.getenv('GOOGLE_SEARCH_URL', 'https://www.googleapis.com/customsearch/v1')
+
+PAGE_SIZE = 10  # API max per request
+MAX_RESULTS = 100  # API never returns results past position 100
+
+TRACKING_PARAMS = ('gclid', 'fbclid', 'mc_cid', 'mc_eid')
+
+
+def canonical_url(url: str) -> str:
+    """
+    Normalize a URL so trivially different links to the same page compare equal
+
+    Drops the fragment, tracking parameters, a leading 'www.', default ports and
+    trailing slashes, lowercases the host, sorts the query and treats http and
+    https alike.
+    """
+    parts = urlsplit(url.strip())
+    host = (parts.hostname or '').lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    if parts.port and parts.port not in (80, 443):
+        host = f"{host}:{parts.port}"
+
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith('utm_') and key.lower() not in TRACKING_PARAMS
+    )
+    scheme = 'https' if parts.scheme in ('http', 'https') else parts.scheme
+    return urlunsplit((scheme, host, parts.path.rstrip('/') or '/', urlencode(query), ''))
 
 
 class GoogleSearchApp:
@@ -21,7 +56,11 @@ class GoogleSearchApp:
         """
         self.api_key = api_key
         self.search_engine_id = search_engine_id
-        self.base_url = "https://www.googleapis.com/customsearch/v1"
+        self.base_url = GOOGLE_SEARCH_URL
+        # Pooled so pages fetched in parallel and later searches reuse connections
+        self.session = requests.Session()
+        self.session.mount('https://', requests.adapters.HTTPAdapter(pool_maxsize=PAGE_SIZE))
+        self.session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=PAGE_SIZE))
 
     def search(self, query: str, num_results: int = 5) -> Optional[List[str]]:
         """
@@ -29,7 +68,76 @@ class GoogleSearchApp:
 
         Args:
             query: Search term
-            num_results: Number of results to return (max 10)
+            num_results: Number of results to return (up to 100; more than 10
+                         are fetched as several pages in parallel)
+
+        Returns:
+            List of URLs or None if error
+        """
+        print(f"Searching for: '{query}'...")
+
+        if num_results <= PAGE_SIZE:
+            return self.fetch_page(query, 1, num_results)
+
+        # Plain threads rather than an event loop, so this also works when called from one
+        pages = self._page_ranges(num_results)
+        with ThreadPoolExecutor(max_workers=len(pages)) as executor:
+            pages = list(executor.map(lambda page: self.fetch_page(query, *page), pages))
+        if all(page is None for page in pages):
+            return None
+
+        # Merge in rank order; the first occurrence of a page wins
+        return self._dedupe([url for page in pages if page for url in page], set())[:num_results]
+
+    async def iter_search(self, query: str, num_results: int = 30) -> AsyncIterator[str]:
+        """
+        Search for up to num_results URLs, yielding them in rank order as their pages arrive
+
+        All pages are requested concurrently and each page's URLs are yielded as
+        soon as it and the pages before it are in, so crawling can start on the
+        first page instead of waiting for the slowest. URLs are deduplicated by
+        canonical form across pages; pages that fail are skipped. Pages not yet
+        needed are cancelled when the caller stops early.
+
+        Args:
+            query: Search term
+            num_results: Number of results wanted (up to 100)
+        """
+        tasks = [asyncio.ensure_future(asyncio.to_thread(self.fetch_page, query, *page))
+                 for page in self._page_ranges(num_results)]
+        seen = set()
+        try:
+            for task in tasks:
+                for url in self._dedupe(await task or [], seen):
+                    yield url
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    @staticmethod
+    def _page_ranges(num_results):
+        """(start, num) of every page needed for num_results results"""
+        num_results = min(num_results, MAX_RESULTS)
+        return [(start, min(PAGE_SIZE, num_results - start + 1)) for start in range(1, num_results + 1, PAGE_SIZE)]
+
+    @staticmethod
+    def _dedupe(urls, seen):
+        unique = []
+        for url in urls:
+            key = canonical_url(url)
+            if key not in seen:
+                seen.add(key)
+                unique.append(url)
+        return unique
+
+    def fetch_page(self, query: str, start: int = 1, num: int = PAGE_SIZE) -> Optional[List[str]]:
+        """
+        Fetch one page of results
+
+        Args:
+            query: Search term
+            start: 1-based position of the first result
+            num: Results on this page (max 10)
 
         Returns:
             List of URLs or None if error
@@ -38,12 +146,12 @@ class GoogleSearchApp:
             'key': self.api_key,
             'cx': self.search_engine_id,
             'q': query,
-            'num': min(num_results, 10)  # API max is 10
+            'num': min(num, PAGE_SIZE),  # API max is 10
+            'start': start
         }
 
         try:
-            print(f"Searching for: '{query}'...")
-            response = requests.get(self.base_url, params=params, timeout=10)
+            response = self.session.get(self.base_url, params=params, timeout=10)
 
             if response.status_code == 200:
                 data = response.json()
@@ -53,7 +161,8 @@ class GoogleSearchApp:
                 items = data.get('items', [])
 
                 if not items:
-                    print("No results found.")
+                    if start == 1:
+                        print("No results found.")
                     return []
 
                 for item in items:
@@ -2,35 +2,63 @@ from quart import Quart, request, Response, jsonify
 from openai import OpenAI
 import json
 import asyncio
+import os
 from typing import AsyncGenerator
+from response_cache import ResponseCache
 
 app = Quart(__name__)
 
+# Identical prompts are answered from here instead of regenerating them
+cache = ResponseCache(
+    os.getenv('RESPONSE_CACHE_PATH', 'response_cache.sqlite3'),
+    ttl=float(os.getenv('RESPONSE_CACHE_TTL', str(24 * 3600))),
+    max_entries=int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', '1000')),
+    max_bytes=int(os.getenv('RESPONSE_CACHE_MAX_MB', '100')) * 1024 * 1024
+)
+
 # Initialize OpenAI client
 client = OpenAI(
-    api_key="")
+    api_key=os.getenv("OPENAI_API_KEY", ""))
+
+
+async def replay_cached_response(events: list) -> AsyncGenerator[str, None]:
+    """Replay a recorded event sequence at full speed"""
+    for event_data in events:
+        yield f"data: {json.dumps(event_data)}\n\n"
+
+    completion_data = {"type": "stream_complete"}
+    yield f"data: {json.dumps(completion_data)}\n\n"
 
 
-async def stream_openai_response(prompt: str, model: str = "o4-mini", effort: str = "medium") -> AsyncGenerator[
-    str, None]:
+async def stream_openai_response(prompt: str, model: str = "o4-mini", effort: str = "medium",
+                                 summary: str = "auto", cache_key: str = None) -> AsyncGenerator[str, None]:
     """Stream OpenAI response events as Server-Sent Events"""
+    recorded = []
+    completed = False
+
     try:
         # Create streaming response
         stream = client.responses.create(
             model=model,
             input=prompt,
-            reasoning={"effort": effort, "summary": "auto"},
+            reasoning={"effort": effort, "summary": summary},
             stream=True
         )
 
         # Process each event in the stream
         for event in stream:
             event_data = event.model_dump()
+            recorded.append(event_data)
+            completed = completed or event_data.get('type') == 'response.completed'
 
             # Format as Server-Sent Event
             sse_data = f"data: {json.dumps(event_data)}\n\n"
             yield sse_data
 
+        # Only complete answers are worth replaying
+        if cache_key and completed:
+            cache.put(cache_key, recorded)
+
     except Exception as e:
         error_data = {
             "type": "error",
@@ -56,11 +84,24 @@ async def stream_response():
         prompt = data['prompt']
         model = data.get('model', 'o4-mini')
         effort = data.get('effort', 'medium')
+        summary = data.get('summary', 'auto')
+
+        cache_key = None
+        cached_events = None
+        if data.get('cache', True):
+            cache_key = cache.make_key(prompt, model, effort, summary)
+            cached_events = cache.get(cache_key)
+
+        if cached_events is not None:
+            body = replay_cached_response(cached_events)
+        else:
+            body = stream_openai_response(prompt, model, effort, summary, cache_key)
 
         return Response(
-            stream_openai_response(prompt, model, effort),
+            body,
             mimetype='text/event-stream',
             headers={
+                'X-Cache': 'HIT' if cached_events is not None else 'MISS',
                 'Cache-Control': 'no-cache',
                 'Connection': 'keep-alive',
                 'Access-Control-Allow-Origin': '*',
@@ -72,4 +113,5 @@ async def stream_response():
         return jsonify({"error": str(e)}), 500
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    # Development server only; use asgi_server/ in production
+    app.run(host='0.0.0.0', port=5000, debug=os.getenv('QUART_DEBUG') == '1')
\ No newline at end of file
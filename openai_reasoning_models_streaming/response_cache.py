@@ -0,0 +1,108 @@
+"""
+Persistent cache of streamed reasoning responses
+
+Entries are keyed on a normalized (prompt, model, effort, summary) tuple and hold
+the full recorded event sequence, so a hit can be replayed as the same SSE stream.
+Entries expire after a TTL, and the least recently used ones are evicted once
+the cache grows past its entry or size limit.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+
+def normalize_prompt(prompt):
+    """Case and whitespace differences should not produce different cache entries"""
+    return ' '.join(prompt.split()).casefold()
+
+
+class ResponseCache:
+    def __init__(self, path, ttl=24 * 3600, max_entries=1000, max_bytes=100 * 1024 * 1024):
+        """
+        Open (or create) the cache
+
+        Args:
+            path: SQLite file
+            ttl: Seconds an entry stays valid
+            max_entries: Maximum number of cached responses
+            max_bytes: Maximum total size of the recorded events
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                events TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(prompt, model, effort, summary):
+        raw = json.dumps([normalize_prompt(prompt), model, effort, summary])
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Return the recorded events for a key, or None if missing or expired"""
+        now = time.time()
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT events, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    self.connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+
+            self.connection.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self.hits += 1
+
+        return json.loads(row[0])
+
+    def put(self, key, events):
+        """Store a completed event sequence and evict anything over the limits"""
+        payload = json.dumps(events)
+        now = time.time()
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO responses (key, events, size, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, payload, len(payload), now, now)
+            )
+            self._evict(now)
+
+    def _evict(self, now):
+        self.connection.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl,))
+
+        count, total = self.connection.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+
+        # Walk from least to most recently used, dropping entries until within limits
+        doomed = []
+        for key, size in self.connection.execute("SELECT key, size FROM responses ORDER BY last_access"):
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            doomed.append((key,))
+            count -= 1
+            total -= size
+        self.connection.executemany("DELETE FROM responses WHERE key = ?", doomed)
+
+    def stats(self):
+        with self.lock:
+            count, total = self.connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        return {'entries': count, 'bytes': total, 'hits': self.hits, 'misses': self.misses}
@@ -2,9 +2,14 @@ from quart import Quart, request, jsonify
 from openai import OpenAI
 import os
 
+from model_cascade import CascadePolicy
+
 app = Quart(__name__)
 
-client = OpenAI(api_key="")
+client = OpenAI(api_key=os.getenv("OPENAI_API_KEY", ""))
+
+# gpt-4o-mini first, gpt-4o when the question looks hard or the answer unsure ('cascade', 'small' or 'large')
+models = CascadePolicy("ask", os.getenv("ASK_MODELS", "cascade"))
 
 @app.route("/ask", methods=["POST"])
 async def ask():
@@ -16,17 +21,23 @@ async def ask():
 
     try:
         # Call OpenAI API
-        response = client.chat.completions.create(
-            model="gpt-4o",  # or gpt-4 if available
+        response = models.complete(
+            client,
+            question,
             messages=[
                 {"role": "user", "content": question}
             ]
         )
         answer = response.choices[0].message.content.strip()
-        return jsonify({"answer": answer})
+        return jsonify({"answer": answer, "model": response.model})
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route("/cascade", methods=["GET"])
+async def cascade_stats():
+    """Which model answered how many questions, and the escalation rate"""
+    return jsonify(models.status())
+
 if __name__ == "__main__":
     app.run()
@@ -1,11 +1,43 @@
 from quart import Quart, request, jsonify, Response
-from openai import OpenAI
+from openai import AsyncOpenAI
 import json
-import asyncio
 import os
 
+from stream_fanout import StreamFanout, stream_key
+from model_cascade import CascadePolicy
+
 app = Quart(__name__)
-client = OpenAI(api_key="")
+client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY", ""))
+
+# Identical questions asked at the same time share one upstream stream
+fanout = StreamFanout()
+
+# gpt-4o-mini first, gpt-4o when the question looks hard or the answer starts unsure ('cascade', 'small' or 'large')
+models = CascadePolicy("ask", os.getenv("ASK_MODELS", "cascade"))
+
+
+async def stream_answer(question, messages):
+    """Upstream OpenAI stream as Server-Sent Events"""
+    stream = None
+    try:
+        # Call OpenAI API with streaming enabled, through the model cascade
+        stream = models.astream(client, question, messages=messages)
+
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content is not None:
+                content = chunk.choices[0].delta.content
+                # Format as Server-Sent Events
+                yield f"data: {json.dumps({'content': content})}\n\n"
+
+        # Send end signal
+        yield f"data: {json.dumps({'done': True})}\n\n"
+
+    except Exception as e:
+        yield f"data: {json.dumps({'error': str(e)})}\n\n"
+    finally:
+        # Closes the upstream connection when every subscriber has left
+        if stream is not None:
+            await stream.aclose()
 
 
 @app.route("/ask", methods=["POST"])
@@ -16,40 +48,39 @@ async def ask():
     if not question:
         return jsonify({"error": "Question is required"}), 400
 
-    async def generate_stream():
-        try:
-            # Call OpenAI API with streaming enabled
-            stream = client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "user", "content": question}
-                ],
-                stream=True
-            )
-
-            for chunk in stream:
-                if chunk.choices[0].delta.content is not None:
-                    content = chunk.choices[0].delta.content
-                    # Format as Server-Sent Events
-                    yield f"data: {json.dumps({'content': content})}\n\n"
-
-            # Send end signal
-            yield f"data: {json.dumps({'done': True})}\n\n"
-
-        except Exception as e:
-            yield f"data: {json.dumps({'error': str(e)})}\n\n"
+    messages = [
+        {"role": "user", "content": question}
+    ]
+    events, joined = fanout.subscribe(stream_key(models.mode, messages), lambda: stream_answer(question, messages))
 
     return Response(
-        generate_stream(),
+        events,
         mimetype='text/event-stream',
         headers={
             'Cache-Control': 'no-cache',
             'Connection': 'keep-alive',
             'Access-Control-Allow-Origin': '*',
-            'Access-Control-Allow-Headers': 'Content-Type'
+            'Access-Control-Allow-Headers': 'Content-Type',
+            'X-Upstream': 'shared' if joined else 'new'
         }
     )
 
 
+@app.route("/fanout", methods=["GET"])
+async def fanout_stats():
+    """How many requests shared an upstream stream"""
+    return jsonify({
+        "upstream_calls": fanout.upstream_calls,
+        "shared_requests": fanout.shared_requests,
+        "streams_in_flight": len(fanout.streams),
+    })
+
+
+@app.route("/cascade", methods=["GET"])
+async def cascade_stats():
+    """Which model answered how many questions, and the escalation rate"""
+    return jsonify(models.status())
+
+
 if __name__ == "__main__":
-    app.run()
\ No newline at end of file
+    app.run()
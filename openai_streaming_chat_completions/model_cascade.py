@@ -0,0 +1,226 @@
+"""
+Model cascade
+
+Requests go to a small, fast model first and only move up to the large model
+when needed. Two checks decide:
+
+- before the call, a complexity score of the question itself (length, several
+  questions at once, words like "compare" or "step by step", code); complex
+  questions go straight to the large model instead of paying for both
+- after the call, a confidence score of the small model's answer: its mean
+  token probability (from logprobs) and whether it hedges ("I'm not sure",
+  "I don't know"); unsure answers are asked again of the large model. Saying
+  the sources don't cover something ("cannot be found in the reference
+  content", "does not mention") is not a hedge: answers are told to do exactly
+  that, and a larger model reading the same sources can't do better
+
+Streamed answers can't be taken back once sent, so the first probe_tokens
+tokens of the small model's stream are held back and scored; if they look
+unsure the stream switches to the large model before anything went out.
+
+Every endpoint gets its own CascadePolicy with a mode: 'cascade', 'small'
+(always the small model) or 'large' (always the large model). Each request's
+outcome is counted as 'small', 'escalated' or 'large'.
+"""
+
+import math
+import os
+import re
+import threading
+
+SMALL_MODEL = os.getenv('CASCADE_SMALL_MODEL', 'gpt-4o-mini')
+LARGE_MODEL = os.getenv('CASCADE_LARGE_MODEL', 'gpt-4o')
+MODES = ('cascade', 'small', 'large')
+
+COMPLEX_WORDS = re.compile(
+    r"\b(compare|comparison|versus|vs|differences?|analy[sz]e|analysis|why|trade-?offs?|pros and cons|"
+    r"step by step|prove|derive|calculate|evaluate|implications?|recommend|design|optimi[sz]e|plan)\b",
+    re.IGNORECASE)
+CODE = re.compile(r"```|\b(def|class|function|SELECT|import|return)\b|[{};]\s*$", re.MULTILINE)
+HEDGES = re.compile(r"\b(i'?m not (sure|certain)|i am not (sure|certain)|i don'?t know|i do not know)\b",
+                    re.IGNORECASE)
+
+
+def complexity(question):
+    """0 (trivial) to 1 (hard), from the question text alone"""
+    score = min(0.5, len(question.split()) / 120)
+    score += 0.3 * min(2, len(COMPLEX_WORDS.findall(question)))
+    score += 0.2 * min(2, max(0, question.count('?') - 1))
+    if CODE.search(question):
+        score += 0.4
+    return min(1.0, score)
+
+
+def confidence(text, logprobs=None):
+    """0 to 1: the answer's geometric mean token probability, pulled down by hedging"""
+    if not text or not text.strip():
+        return 0.0
+    score = math.exp(sum(logprobs) / len(logprobs)) if logprobs else 1.0
+    if HEDGES.search(text):
+        score = min(score, 0.3)
+    return score
+
+
+def _logprobs(choice):
+    content = getattr(getattr(choice, 'logprobs', None), 'content', None) or []
+    return [token.logprob for token in content]
+
+
+class CascadePolicy:
+    def __init__(self, name, mode='cascade', small_model=SMALL_MODEL, large_model=LARGE_MODEL,
+                 max_complexity=0.6, min_confidence=0.6, probe_tokens=24, on_outcome=None):
+        """
+        Decide which model answers one endpoint's requests
+
+        Args:
+            name: Endpoint name, for status output
+            mode: 'cascade', 'small' or 'large'
+            small_model: Model tried first
+            large_model: Model escalated to
+            max_complexity: Questions scoring above this go straight to the large model
+            min_confidence: Small-model answers scoring below this are escalated
+            probe_tokens: Tokens of a streamed answer scored before any are sent
+            on_outcome: Optional callback(outcome, model) for every request
+        """
+        if mode not in MODES:
+            raise ValueError(f"Cascade mode must be one of {', '.join(MODES)}, not {mode!r}")
+        self.name = name
+        self.mode = mode
+        self.small_model = small_model
+        self.large_model = large_model
+        self.max_complexity = max_complexity
+        self.min_confidence = min_confidence
+        self.probe_tokens = probe_tokens
+        self.on_outcome = on_outcome
+        self.lock = threading.Lock()
+        self.outcomes = {'small': 0, 'escalated': 0, 'large': 0}
+
+    def first_model(self, question):
+        """The model to try first for a question"""
+        if self.mode == 'large' or (self.mode == 'cascade' and complexity(question) > self.max_complexity):
+            return self.large_model
+        return self.small_model
+
+    def _record(self, outcome, model):
+        with self.lock:
+            self.outcomes[outcome] += 1
+        if self.on_outcome:
+            self.on_outcome(outcome, model)
+
+    def _scored(self, model):
+        # Only a cascade looks at the small model's confidence
+        return self.mode == 'cascade' and model == self.small_model
+
+    def _escalate(self, text, logprobs):
+        score = confidence(text, logprobs)
+        if score < self.min_confidence:
+            print(f"[cascade] {self.name}: {self.small_model} answer confidence {score:.2f}, "
+                  f"escalating to {self.large_model}")
+            return True
+        return False
+
+    def complete(self, client, question, **kwargs):
+        """client.chat.completions.create through the cascade (kwargs as for create, minus model)"""
+        model = self.first_model(question)
+        if not self._scored(model):
+            response = client.chat.completions.create(model=model, **kwargs)
+            self._record('small' if model == self.small_model else 'large', model)
+            return response
+
+        response = client.chat.completions.create(model=model, logprobs=True, **kwargs)
+        choice = response.choices[0]
+        if not self._escalate(choice.message.content, _logprobs(choice)):
+            self._record('small', model)
+            return response
+
+        response = client.chat.completions.create(model=self.large_model, **kwargs)
+        self._record('escalated', self.large_model)
+        return response
+
+    @staticmethod
+    def _probe_args(scored):
+        return {'logprobs': True} if scored else {}
+
+    def _probe_done(self, held, text):
+        return len(held) >= self.probe_tokens or len(text) >= self.probe_tokens * 8
+
+    def stream(self, client, question, **kwargs):
+        """Streaming create through the cascade; yields the chunks of whichever model answers"""
+        model = self.first_model(question)
+        scored = self._scored(model)
+        stream = client.chat.completions.create(model=model, stream=True, **kwargs, **self._probe_args(scored))
+        try:
+            held = []
+            if scored:
+                text, logprobs = '', []
+                for chunk in stream:
+                    held.append(chunk)
+                    if chunk.choices:
+                        text += chunk.choices[0].delta.content or ''
+                        logprobs += _logprobs(chunk.choices[0])
+                    if self._probe_done(held, text):
+                        break
+
+                if self._escalate(text, logprobs):
+                    stream.close()
+                    model, held = self.large_model, []
+                    stream = client.chat.completions.create(model=model, stream=True, **kwargs)
+                    self._record('escalated', model)
+                else:
+                    self._record('small', model)
+            else:
+                self._record('small' if model == self.small_model else 'large', model)
+
+            yield from held
+            yield from stream
+        finally:
+            stream.close()
+
+    async def astream(self, client, question, **kwargs):
+        """stream() for an AsyncOpenAI client"""
+        model = self.first_model(question)
+        scored = self._scored(model)
+        stream = await client.chat.completions.create(model=model, stream=True, **kwargs, **self._probe_args(scored))
+        try:
+            held = []
+            if scored:
+                text, logprobs = '', []
+                async for chunk in stream:
+                    held.append(chunk)
+                    if chunk.choices:
+                        text += chunk.choices[0].delta.content or ''
+                        logprobs += _logprobs(chunk.choices[0])
+                    if self._probe_done(held, text):
+                        break
+
+                if self._escalate(text, logprobs):
+                    await stream.close()
+                    model, held = self.large_model, []
+                    stream = await client.chat.completions.create(model=model, stream=True, **kwargs)
+                    self._record('escalated', model)
+                else:
+                    self._record('small', model)
+            else:
+                self._record('small' if model == self.small_model else 'large', model)
+
+            for chunk in held:
+                yield chunk
+            async for chunk in stream:
+                yield chunk
+        finally:
+            await stream.close()
+
+    def status(self):
+        with self.lock:
+            outcomes = dict(self.outcomes)
+        tried_small = outcomes['small'] + outcomes['escalated']
+        total = tried_small + outcomes['large']
+        return {
+            'endpoint': self.name,
+            'mode': self.mode,
+            'small_model': self.small_model,
+            'large_model': self.large_model,
+            **outcomes,
+            'escalation_rate': round(outcomes['escalated'] / tried_small, 3) if tried_small else None,
+            'large_share': round((outcomes['escalated'] + outcomes['large']) / total, 3) if total else None,
+        }
@@ -0,0 +1,117 @@
+"""
+In-flight stream deduplication
+
+Identical requests that arrive while an upstream stream for them is still
+running attach to that stream instead of opening their own. Every event is
+buffered, so a late joiner first replays what it missed and then follows
+live. A subscriber counts from the moment it joins, not from when its
+response body starts, and when the last one disconnects the upstream call is
+cancelled; anyone still reading a cancelled stream gets an error event
+instead of a silently truncated answer.
+Finished streams are forgotten; only requests that overlap in time share.
+"""
+
+import asyncio
+import json
+import re
+
+
+def stream_key(model, messages):
+    """Requests with the same key get the same stream; whitespace differences don't count"""
+    normalized = [
+        {**message, 'content': re.sub(r'\s+', ' ', message.get('content', '')).strip()}
+        for message in messages
+    ]
+    return json.dumps([model, normalized], sort_keys=True)
+
+
+class SharedStream:
+    def __init__(self, key, events, on_close):
+        """
+        Start pumping an upstream event generator
+
+        Args:
+            key: Registry key of this stream
+            events: Async generator of SSE strings from the upstream call
+            on_close: Called with the key once the stream is finished or cancelled
+        """
+        self.key = key
+        self.buffer = []
+        self.finished = False
+        self.cancelled = False
+        self.subscribers = 0
+        self.updated = asyncio.Event()
+        self.on_close = on_close
+        self.task = asyncio.create_task(self._pump(events))
+
+    async def _pump(self, events):
+        try:
+            async for event in events:
+                self.buffer.append(event)
+                self._notify()
+        except asyncio.CancelledError:
+            self.cancelled = True
+            self.buffer.append(f"data: {json.dumps({'error': 'Upstream stream was cancelled'})}\n\n")
+            raise
+        finally:
+            self.finished = True
+            self._notify()
+            self.on_close(self.key, self)
+
+    def _notify(self):
+        updated, self.updated = self.updated, asyncio.Event()
+        updated.set()
+
+    def subscribe(self):
+        """Count a subscriber now and return its event generator"""
+        self.subscribers += 1
+        return self._follow()
+
+    async def _follow(self):
+        """Yield every event so far, then live ones until the stream ends"""
+        position = 0
+        try:
+            while True:
+                while position < len(self.buffer):
+                    yield self.buffer[position]
+                    position += 1
+                if self.finished:
+                    return
+                await self.updated.wait()
+        finally:
+            self.subscribers -= 1
+            if self.subscribers == 0 and not self.finished:
+                self.on_close(self.key, self)
+                self.task.cancel()
+
+
+class StreamFanout:
+    def __init__(self):
+        self.streams = {}
+        self.upstream_calls = 0
+        self.shared_requests = 0
+
+    def subscribe(self, key, start_upstream):
+        """
+        Get an event stream for a key, starting the upstream only if none is running
+
+        Args:
+            key: See stream_key()
+            start_upstream: Zero-argument function returning the upstream async generator
+
+        Returns:
+            (async generator of SSE strings, True if it joined an existing stream)
+        """
+        stream = self.streams.get(key)
+        joined = stream is not None and not stream.cancelled
+        if joined:
+            self.shared_requests += 1
+        else:
+            self.upstream_calls += 1
+            stream = SharedStream(key, start_upstream(), self._forget)
+            self.streams[key] = stream
+        return stream.subscribe(), joined
+
+    def _forget(self, key, stream):
+        if self.streams.get(key) is stream:
+            del self.streams[key]
@@ -0,0 +1,323 @@
+from quart import Quart, request, Response, jsonify
+from openai import AsyncOpenAI, AsyncAzureOpenAI
+import openai
+import asyncio
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+app = Quart(__name__)
+
+DB_PATH = os.getenv('JOBS_DB_PATH', 'reasoning_jobs.sqlite3')
+WORKERS = int(os.getenv('JOBS_WORKERS', '4'))
+MAX_QUEUED = int(os.getenv('JOBS_MAX_QUEUED', '100'))
+POLL_INTERVAL = float(os.getenv('JOBS_POLL_INTERVAL', '2'))
+LEASE_SECONDS = float(os.getenv('JOBS_LEASE_SECONDS', '60'))  # a running job whose lease ran out is recovered
+
+# Several server processes (asgi_server workers) may share the database; each claims jobs under its own name
+OWNER = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+TERMINAL_STATUSES = ('completed', 'failed', 'cancelled', 'incomplete')
+
+# Azure when configured, OpenAI otherwise
+if os.getenv('AZURE_OPENAI_API_KEY'):
+    client = AsyncAzureOpenAI(
+        api_key=os.getenv('AZURE_OPENAI_API_KEY'),
+        azure_endpoint=os.getenv('AZURE_OPENAI_ENDPOINT', 'https://hfai-llm-test.openai.azure.com/'),
+        api_version="2025-04-01-preview"
+    )
+else:
+    client = AsyncOpenAI(api_key=os.getenv('OPENAI_API_KEY', ''))
+
+
+class JobStore:
+    """Jobs persisted in a local SQLite file so results survive restarts"""
+
+    COLUMNS = ('id', 'status', 'prompt', 'model', 'effort', 'summary', 'response_id', 'output_text',
+               'reasoning_summary', 'error', 'created_at', 'started_at', 'finished_at')
+
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.lock = threading.Lock()
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                prompt TEXT NOT NULL,
+                model TEXT NOT NULL,
+                effort TEXT NOT NULL,
+                summary TEXT NOT NULL,
+                response_id TEXT,
+                output_text TEXT,
+                reasoning_summary TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                owner TEXT,
+                lease_until REAL
+            )
+        """)
+        # Databases from before leases lack the owner columns
+        existing = {row[1] for row in self.connection.execute("PRAGMA table_info(jobs)")}
+        for column, kind in (('owner', 'TEXT'), ('lease_until', 'REAL')):
+            if column not in existing:
+                self.connection.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+
+    def create(self, prompt, model, effort, summary):
+        job_id = uuid.uuid4().hex
+        with self.lock:
+            self.connection.execute(
+                "INSERT INTO jobs (id, status, prompt, model, effort, summary, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, 'queued', prompt, model, effort, summary, time.time())
+            )
+        return job_id
+
+    def update(self, job_id, **fields):
+        assignments = ', '.join(f"{name} = ?" for name in fields)
+        with self.lock:
+            self.connection.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def claim(self, job_id, owner):
+        """Move a queued job to running under owner's lease; False if another process already took it"""
+        now = time.time()
+        with self.lock:
+            cursor = self.connection.execute(
+                "UPDATE jobs SET status = 'running', owner = ?, lease_until = ?, started_at = COALESCE(started_at, ?) "
+                "WHERE id = ? AND status = 'queued'",
+                (owner, now + LEASE_SECONDS, now, job_id)
+            )
+        return cursor.rowcount == 1
+
+    def renew(self, owner):
+        """Extend the lease on every job owner is running"""
+        with self.lock:
+            self.connection.execute("UPDATE jobs SET lease_until = ? WHERE owner = ? AND status = 'running'",
+                                    (time.time() + LEASE_SECONDS, owner))
+
+    def recover(self):
+        """Requeue running jobs whose owner stopped renewing its lease (a process that died)"""
+        with self.lock:
+            self.connection.execute(
+                "UPDATE jobs SET status = 'queued', owner = NULL "
+                "WHERE status = 'running' AND (lease_until IS NULL OR lease_until < ?)",
+                (time.time(),)
+            )
+
+    def release(self, owner):
+        """Requeue the jobs owner is running, for another process to resume"""
+        with self.lock:
+            self.connection.execute(
+                "UPDATE jobs SET status = 'queued', owner = NULL WHERE owner = ? AND status = 'running'", (owner,)
+            )
+
+    def get(self, job_id):
+        with self.lock:
+            row = self.connection.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return dict(zip(self.COLUMNS, row)) if row else None
+
+    def queued(self):
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at"
+            ).fetchall()
+        return [row[0] for row in rows]
+
+
+store = JobStore(DB_PATH)
+queue = asyncio.Queue(maxsize=MAX_QUEUED)
+job_updated = {}  # job id -> asyncio.Event set on every change
+worker_tasks = []
+local_jobs = set()  # ids in this process's queue or being run here
+
+
+def notify(job_id):
+    event = job_updated.pop(job_id, None)
+    if event:
+        event.set()
+
+
+def extract_reasoning_summary(response):
+    """Join the reasoning summary parts of a Responses API result"""
+    parts = []
+    for item in response.output or []:
+        if item.type == 'reasoning':
+            parts.extend(part.text for part in (item.summary or []))
+    return "\n\n".join(parts)
+
+
+async def run_job(job_id):
+    if not store.claim(job_id, OWNER):
+        return
+    job = store.get(job_id)
+    notify(job_id)
+
+    request_args = {
+        'model': job['model'],
+        'input': job['prompt'],
+        'reasoning': {"effort": job['effort'], "summary": job['summary']},
+    }
+
+    try:
+        if job['response_id']:
+            # Resuming after a restart; the background response kept running upstream
+            response = await client.responses.retrieve(job['response_id'])
+        else:
+            try:
+                response = await client.responses.create(background=True, **request_args)
+                store.update(job_id, response_id=response.id)
+            except (TypeError, openai.BadRequestError):
+                # Background mode not supported by this SDK / deployment; wait for the answer directly
+                response = await client.responses.create(**request_args)
+
+        while response.status not in TERMINAL_STATUSES:
+            await asyncio.sleep(POLL_INTERVAL)
+            response = await client.responses.retrieve(response.id)
+
+        store.update(
+            job_id,
+            status=response.status,
+            response_id=response.id,
+            output_text=response.output_text,
+            reasoning_summary=extract_reasoning_summary(response),
+            error=str(response.error.message) if getattr(response, 'error', None) else None,
+            finished_at=time.time()
+        )
+    except Exception as e:
+        store.update(job_id, status='failed', error=str(e), finished_at=time.time())
+
+    notify(job_id)
+
+
+async def worker():
+    while True:
+        job_id = await queue.get()
+        try:
+            await run_job(job_id)
+        finally:
+            local_jobs.discard(job_id)
+            queue.task_done()
+
+
+def enqueue(job_id):
+    local_jobs.add(job_id)
+    queue.put_nowait(job_id)
+
+
+async def maintain_leases():
+    """
+    Keep this process's leases alive and pick up jobs nobody is working on
+
+    That covers jobs running in a process that died (their lease runs out),
+    jobs a stopping or recycled process handed back, and jobs queued in a
+    process that stopped before running them. Claims are atomic, so when two
+    processes queue the same job only one runs it.
+    """
+    while True:
+        store.renew(OWNER)
+        store.recover()
+        for job_id in store.queued():
+            if queue.full():
+                break
+            if job_id not in local_jobs:
+                enqueue(job_id)
+        await asyncio.sleep(LEASE_SECONDS / 4)
+
+
+@app.before_serving
+async def start_workers():
+    for _ in range(WORKERS):
+        worker_tasks.append(asyncio.create_task(worker()))
+    worker_tasks.append(asyncio.create_task(maintain_leases()))
+
+
+@app.after_serving
+async def stop_workers():
+    for task in worker_tasks:
+        task.cancel()
+    await asyncio.gather(*worker_tasks, return_exceptions=True)
+    # Background responses keep running upstream; whoever claims these next resumes them by response_id
+    store.release(OWNER)
+
+
+@app.route('/jobs', methods=['POST'])
+async def submit_job():
+    """Queue a reasoning request and return its job ID straight away"""
+    data = await request.get_json()
+
+    if not data or 'prompt' not in data:
+        return jsonify({"error": "Missing 'prompt' in request body"}), 400
+
+    if queue.full():
+        return jsonify({"error": "Too many queued jobs, try again later"}), 503
+
+    job_id = store.create(
+        data['prompt'],
+        data.get('model', 'o4-mini'),
+        data.get('effort', 'medium'),
+        data.get('summary', 'detailed')
+    )
+    enqueue(job_id)
+
+    return jsonify({
+        "id": job_id,
+        "status": "queued",
+        "links": {"self": f"/jobs/{job_id}", "events": f"/jobs/{job_id}/events"}
+    }), 202
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+async def get_job(job_id):
+    """Poll a job"""
+    job = store.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+async def job_events(job_id):
+    """Subscribe to a job's status changes as Server-Sent Events"""
+    if not store.get(job_id):
+        return jsonify({"error": "Job not found"}), 404
+
+    async def generate_events():
+        last_status = None
+        while True:
+            changed = job_updated.setdefault(job_id, asyncio.Event())
+            job = store.get(job_id)
+
+            if job['status'] != last_status:
+                last_status = job['status']
+                yield f"data: {json.dumps(job)}\n\n"
+
+            if job['status'] in TERMINAL_STATUSES:
+                break
+
+            # Also re-check the database now and then, in case another worker process runs the job
+            try:
+                await asyncio.wait_for(changed.wait(), timeout=POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    return Response(
+        generate_events(),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'Connection': 'keep-alive',
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Allow-Headers': 'Content-Type',
+        }
+    )
+
+
+if __name__ == '__main__':
+    app.run()
@@ -0,0 +1,248 @@
+"""
+Reasoning Models Router
+Sends responses.create calls to whichever of several OpenAI / Azure OpenAI
+deployments is currently healthiest, instead of hard-wiring one backend.
+
+Each backend is scored on its live latency (EWMA), recent error rate (EWMA),
+remaining rate limit (x-ratelimit-* headers) and requests in flight. A 429 or
+5xx takes the backend out of rotation for a cooldown and the call fails over to
+the next one. With hedge_after set, a second backend is tried in parallel when
+the first is slow, and whichever answers first wins.
+"""
+
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import openai
+from openai import AzureOpenAI, OpenAI
+
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.InternalServerError, openai.APIConnectionError)
+
+
+class NoBackendAvailable(Exception):
+    """Raised when every backend failed or is cooling down"""
+
+
+def parse_reset(value):
+    """Parse rate-limit reset values like '1s', '6m0s' or '250ms' into seconds"""
+    if not value:
+        return None
+    total = 0.0
+    for amount, unit in re.findall(r'([\d.]+)(ms|s|m|h)', value):
+        total += float(amount) * {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}[unit]
+    return total
+
+
+class Backend:
+    def __init__(self, name, client, model, initial_latency=20.0):
+        """
+        A deployment the router can send requests to
+
+        Args:
+            name: Label used in logs and status output
+            client: OpenAI or AzureOpenAI client (max_retries=0 is recommended)
+            model: Model name, or deployment name for Azure
+            initial_latency: Latency guess in seconds until real samples arrive
+        """
+        self.name = name
+        self.client = client
+        self.model = model
+        self.latency = initial_latency
+        self.error_rate = 0.0
+        self.remaining_requests = None
+        self.remaining_tokens = None
+        self.cooldown_until = 0.0
+        self.in_flight = 0
+        self.calls = 0
+        self.failures = 0
+
+    def available(self, now):
+        return now >= self.cooldown_until and self.remaining_requests != 0
+
+
+class RoutingClient:
+    def __init__(self, backends, alpha=0.3, hedge_after=None, default_cooldown=10.0):
+        """
+        Initialize the router
+
+        Args:
+            backends: List of Backend objects
+            alpha: EWMA smoothing factor for latency and error rate
+            hedge_after: Seconds before a hedged request goes to a second backend (None disables hedging)
+            default_cooldown: Cooldown in seconds after a 429/5xx without a Retry-After header
+        """
+        self.backends = backends
+        self.alpha = alpha
+        self.hedge_after = hedge_after
+        self.default_cooldown = default_cooldown
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max(2, len(backends) * 2))
+
+    def score(self, backend):
+        """Lower is better: expected latency inflated by errors, load and a nearly spent quota"""
+        score = backend.latency * (1 + 4 * backend.error_rate) * (1 + 0.25 * backend.in_flight)
+        if backend.remaining_requests is not None and backend.remaining_requests < 5:
+            score *= 5
+        return score
+
+    def ranked_backends(self, exclude=()):
+        """Available backends, best first"""
+        now = time.monotonic()
+        with self.lock:
+            candidates = [b for b in self.backends if b not in exclude and b.available(now)]
+            return sorted(candidates, key=self.score)
+
+    def _record(self, backend, latency=None, error=False, headers=None, cooldown=None):
+        with self.lock:
+            backend.in_flight -= 1
+            backend.calls += 1
+            backend.error_rate = (1 - self.alpha) * backend.error_rate + self.alpha * (1.0 if error else 0.0)
+            if latency is not None:
+                backend.latency = (1 - self.alpha) * backend.latency + self.alpha * latency
+            if error:
+                backend.failures += 1
+            if cooldown:
+                backend.cooldown_until = max(backend.cooldown_until, time.monotonic() + cooldown)
+
+            if headers is not None:
+                remaining = headers.get('x-ratelimit-remaining-requests')
+                backend.remaining_requests = int(remaining) if remaining and remaining.isdigit() else None
+                remaining = headers.get('x-ratelimit-remaining-tokens')
+                backend.remaining_tokens = int(remaining) if remaining and remaining.isdigit() else None
+                if backend.remaining_requests == 0:
+                    reset = parse_reset(headers.get('x-ratelimit-reset-requests'))
+                    backend.cooldown_until = time.monotonic() + (reset or self.default_cooldown)
+                    backend.remaining_requests = None
+
+    def _cooldown_for(self, error):
+        response = getattr(error, 'response', None)
+        if response is None:
+            return self.default_cooldown
+        retry_after_ms = response.headers.get('retry-after-ms')
+        if retry_after_ms:
+            return float(retry_after_ms) / 1000
+        retry_after = response.headers.get('retry-after')
+        try:
+            return float(retry_after) if retry_after else self.default_cooldown
+        except ValueError:
+            return self.default_cooldown
+
+    def _call(self, backend, kwargs):
+        with self.lock:
+            backend.in_flight += 1
+
+        start = time.monotonic()
+        try:
+            raw = backend.client.responses.with_raw_response.create(model=backend.model, **kwargs)
+        except RETRYABLE_ERRORS as e:
+            response = getattr(e, 'response', None)
+            self._record(backend, error=True, cooldown=self._cooldown_for(e),
+                         headers=response.headers if response is not None else None)
+            raise
+        except Exception:
+            self._record(backend, error=True)
+            raise
+
+        self._record(backend, latency=time.monotonic() - start, headers=raw.headers)
+        return raw.parse()
+
+    def create_response(self, **kwargs):
+        """
+        Same arguments as client.responses.create, minus model
+
+        Tries backends best-first, failing over on 429/5xx/connection errors.
+        Other errors (bad request, auth) are raised straight away.
+        """
+        tried = []
+        last_error = None
+
+        while True:
+            candidates = self.ranked_backends(exclude=tried)
+            if not candidates:
+                raise NoBackendAvailable(f"All backends failed or are cooling down: {last_error}")
+
+            primary = candidates[0]
+            tried.append(primary)
+            futures = {self.executor.submit(self._call, primary, kwargs): primary}
+
+            if self.hedge_after is not None and len(candidates) > 1:
+                done, _ = wait(futures, timeout=self.hedge_after)
+                if not done:
+                    hedge = candidates[1]
+                    tried.append(hedge)
+                    print(f"[router] {primary.name} slow after {self.hedge_after:.1f}s, hedging on {hedge.name}")
+                    futures[self.executor.submit(self._call, hedge, kwargs)] = hedge
+
+            # Take the first success; the losing request finishes in the background
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        return future.result()
+                    except RETRYABLE_ERRORS as e:
+                        last_error = e
+                        print(f"[router] {futures[future].name} failed ({type(e).__name__}), failing over")
+
+    def status(self):
+        """Current view of every backend"""
+        now = time.monotonic()
+        with self.lock:
+            return [{
+                'name': b.name,
+                'model': b.model,
+                'latency_ewma_s': round(b.latency, 3),
+                'error_rate_ewma': round(b.error_rate, 3),
+                'remaining_requests': b.remaining_requests,
+                'remaining_tokens': b.remaining_tokens,
+                'cooling_down_s': round(max(0.0, b.cooldown_until - now), 1),
+                'in_flight': b.in_flight,
+                'calls': b.calls,
+                'failures': b.failures,
+            } for b in self.backends]
+
+
+def main():
+    backends = []
+
+    if os.getenv('AZURE_OPENAI_API_KEY'):
+        backends.append(Backend(
+            'azure',
+            AzureOpenAI(
+                api_key=os.getenv('AZURE_OPENAI_API_KEY'),
+                azure_endpoint=os.getenv('AZURE_OPENAI_ENDPOINT', 'https://hfai-llm-test.openai.azure.com/'),
+                api_version="2025-04-01-preview",
+                max_retries=0
+            ),
+            os.getenv('AZURE_OPENAI_DEPLOYMENT', 'o3-mini')
+        ))
+
+    if os.getenv('OPENAI_API_KEY'):
+        backends.append(Backend(
+            'openai',
+            OpenAI(api_key=os.getenv('OPENAI_API_KEY'), max_retries=0),
+            os.getenv('OPENAI_MODEL', 'o4-mini')
+        ))
+
+    if not backends:
+        print("Set AZURE_OPENAI_API_KEY and/or OPENAI_API_KEY to configure backends.")
+        return
+
+    hedge_after = os.getenv('ROUTER_HEDGE_AFTER')
+    router = RoutingClient(backends, hedge_after=float(hedge_after) if hedge_after else None)
+
+    response = router.create_response(
+        input="compare gdp of thailand and vietnam in 2023",
+        reasoning={"effort": "medium", "summary": "auto"}
+    )
+
+    print(response.model_dump_json(indent=2))
+    for backend in router.status():
+        print(backend)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,38 @@ from openai import OpenAI
 import json
 from urllib.parse import urlparse
 import time
+from validator_store import ValidatorStore
+from crawl_scheduler import CrawlScheduler, RobotsDisallowed
+
+# Pages bigger than this are abandoned mid-download
+MAX_PAGE_BYTES = int(os.getenv('MAX_PAGE_BYTES', str(2 * 1024 * 1024)))
+
+# Politeness limits for direct crawling
+CRAWL_WORKERS = int(os.getenv('CRAWL_WORKERS', '8'))
+CRAWL_HOST_CONCURRENCY = int(os.getenv('CRAWL_HOST_CONCURRENCY', '2'))
+CRAWL_HOST_DELAY = float(os.getenv('CRAWL_HOST_DELAY', '1.0'))
+CRAWL_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+
+def read_html_body(response, max_bytes=MAX_PAGE_BYTES):
+    """Read a streamed response body, refusing non-HTML content and oversized pages"""
+    content_type = response.headers.get('Content-Type', '')
+    if content_type and not any(t in content_type.lower() for t in ('text/html', 'application/xhtml+xml')):
+        raise ValueError(f"Skipping non-HTML content ({content_type})")
+
+    declared_length = response.headers.get('Content-Length', '')
+    if declared_length.isdigit() and int(declared_length) > max_bytes:
+        raise ValueError(f"Page is {declared_length} bytes, over the {max_bytes} byte limit")
+
+    chunks = []
+    size = 0
+    for chunk in response.iter_content(chunk_size=64 * 1024):
+        size += len(chunk)
+        if size > max_bytes:
+            raise ValueError(f"Page exceeded the {max_bytes} byte limit, download aborted")
+        chunks.append(chunk)
+
+    return b''.join(chunks)
 
 
 class QuestionAnsweringApp:
@@ -20,6 +52,11 @@ class QuestionAnsweringApp:
         self.openai_client = OpenAI(api_key=openai_api_key)
         self.google_api_key = google_api_key
         self.google_cse_id = google_cse_id
+        self.validators = ValidatorStore(os.getenv('VALIDATOR_STORE_PATH', 'validators.sqlite3'))
+        self.session = requests.Session()
+        self.scheduler = CrawlScheduler(self.session, max_workers=CRAWL_WORKERS,
+                                        per_host_concurrency=CRAWL_HOST_CONCURRENCY,
+                                        per_host_delay=CRAWL_HOST_DELAY, user_agent=CRAWL_USER_AGENT)
 
     def generate_search_term(self, question):
         """Generate an optimized search term from the user's question"""
@@ -72,16 +109,25 @@ class QuestionAnsweringApp:
             return []
 
     def crawl_content(self, url, max_length=9000):
-        """Crawl content from a URL"""
+        """Crawl content from a URL, reusing the stored text if the page hasn't changed"""
         try:
             headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+                'User-Agent': CRAWL_USER_AGENT
             }
+            stored = self.validators.get(url)
+            if stored:
+                headers.update(self.validators.conditional_headers(stored))
 
-            response = requests.get(url, headers=headers, timeout=10)
-            response.raise_for_status()
+            with self.session.get(url, headers=headers, timeout=10, stream=True) as response:
+                if response.status_code == 304 and stored:
+                    self.validators.mark_validated(url)
+                    print("  → Not modified, reusing stored text")
+                    return stored['content']
 
-            soup = BeautifulSoup(response.content, 'html.parser')
+                response.raise_for_status()
+                body = read_html_body(response)
+
+            soup = BeautifulSoup(body, 'html.parser')
 
             # Remove script and style elements
             for script in soup(["script", "style"]):
@@ -99,11 +145,37 @@ class QuestionAnsweringApp:
             if len(text) > max_length:
                 text = text[:max_length] + "..."
 
+            self.validators.save(url, response.headers, text)
             return text
         except Exception as e:
             print(f"Error crawling {url}: {e}")
             return ""
 
+    def crawl_results(self, search_results):
+        """Crawl search results through the scheduler, returning reference content in result order"""
+        def timed_crawl(url, i):
+            print(f"Crawling {i + 1}/{len(search_results)}: {search_results[i]['title']}")
+            start_time = time.time()
+            content = self.crawl_content(url)
+            print(f"  → [{i + 1}] Crawled in {time.time() - start_time:.2f} seconds")
+            return content
+
+        futures = [self.scheduler.submit(timed_crawl, result['link'], i) for i, result in enumerate(search_results)]
+
+        reference_content = []
+        for result, future in zip(search_results, futures):
+            try:
+                content = future.result()
+            except RobotsDisallowed as e:
+                print(f"Skipping {result['link']}: {e}")
+                content = ""
+            reference_content.append({
+                'title': result['title'],
+                'url': result['link'],
+                'text': content
+            })
+        return reference_content
+
     def get_answer_from_openai(self, question, reference_content):
         """Get answer from OpenAI using the question and reference content"""
         try:
@@ -163,22 +235,9 @@ class QuestionAnsweringApp:
                 print("No search results found.")
                 continue
 
-            # Crawl content from search results
+            # Crawl content from search results, politely: per-host limits and robots.txt
             print(f"\nCrawling content from top {len(search_results)} results...")
-            reference_content = []
-
-            for i, result in enumerate(search_results):
-                print(f"Crawling {i + 1}/{len(search_results)}: {result['title']}")
-                start_time = time.time()
-                content = self.crawl_content(result['link'])
-                crawl_time = time.time() - start_time
-                print(f"  → Crawled in {crawl_time:.2f} seconds")
-                reference_content.append({
-                    'title': result['title'],
-                    'url': result['link'],
-                    'text': content
-                })
-                time.sleep(1)  # Be respectful with crawling
+            reference_content = self.crawl_results(search_results)
 
             # Get answer from OpenAI
             print("\nGenerating answer...")
@@ -0,0 +1,287 @@
+"""
+Polite crawl scheduler for direct fetches
+
+URLs are queued per host and handed to a fixed set of worker threads in
+round-robin order across hosts, so a batch that is mostly one domain doesn't
+stall every other domain behind it, and no host sees more than
+per_host_concurrency requests at once or request starts closer together than
+its delay (the larger of per_host_delay and its robots.txt Crawl-delay).
+
+robots.txt is fetched once per host and cached; disallowed URLs fail with
+RobotsDisallowed without being requested. Host name lookups for requests made
+through the scheduler's session are cached for dns_ttl seconds by a transport
+adapter mounted on that session, since every new connection would otherwise
+resolve the host again; other sessions and sockets in the process resolve as
+usual.
+"""
+
+import ipaddress
+import socket
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from urllib.parse import urlsplit
+from urllib.robotparser import RobotFileParser
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+
+class DNSCache:
+    """Bounded LRU of host name lookups, each kept for ttl seconds"""
+
+    def __init__(self, ttl=300, max_hosts=1024):
+        self.ttl = ttl
+        self.max_hosts = max_hosts
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # (host, port) -> (expires at, address)
+
+    def resolve(self, host, port):
+        """Address to connect to for host (the host itself if it is already an IP address)"""
+        try:
+            ipaddress.ip_address(host.strip('[]'))
+            return host
+        except ValueError:
+            pass
+
+        key = (host.lower(), port)
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry[0] > now:
+                self.entries.move_to_end(key)
+                return entry[1]
+
+        address = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)[0][4][0]
+        with self.lock:
+            self.entries[key] = (now + self.ttl, address)
+            self.entries.move_to_end(key)
+            # Expired entries go first, then the least recently used ones over the limit
+            for stale in [k for k, (expires, _) in self.entries.items() if expires <= now]:
+                del self.entries[stale]
+            while len(self.entries) > self.max_hosts:
+                self.entries.popitem(last=False)
+        return address
+
+    def forget(self, host):
+        """Drop a host's cached addresses, e.g. after a connection to it failed"""
+        with self.lock:
+            for key in [k for k in self.entries if k[0] == host.lower()]:
+                del self.entries[key]
+
+
+class _ResolvingPool:
+    dns_cache = None
+
+    def _new_conn(self):
+        # Connect to the cached address; TLS still verifies and sends SNI for self.host
+        conn = super()._new_conn()
+        try:
+            conn._dns_host = self.dns_cache.resolve(conn._dns_host, self.port)
+        except OSError:
+            pass  # let the connection attempt fail with urllib3's usual resolution error
+        return conn
+
+
+class CachedDNSAdapter(HTTPAdapter):
+    """Transport adapter that resolves host names through a DNSCache"""
+
+    def __init__(self, dns_cache, **kwargs):
+        self.dns_cache = dns_cache
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        attributes = {'dns_cache': self.dns_cache}
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': type('CachedDNSHTTPConnectionPool', (_ResolvingPool, HTTPConnectionPool), attributes),
+            'https': type('CachedDNSHTTPSConnectionPool', (_ResolvingPool, HTTPSConnectionPool), attributes),
+        }
+
+    def send(self, request, **kwargs):
+        try:
+            return super().send(request, **kwargs)
+        except requests.exceptions.ConnectionError:
+            # The cached address may have gone away; look the host up again next time
+            self.dns_cache.forget(urlsplit(request.url).hostname or '')
+            raise
+
+
+class RobotsDisallowed(Exception):
+    """Raised for URLs that the site's robots.txt asks crawlers to skip"""
+
+
+class RobotsCache:
+    def __init__(self, session, user_agent, ttl=86400, timeout=5):
+        self.session = session
+        self.user_agent = user_agent
+        self.ttl = ttl
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.host_locks = {}
+        self.parsers = {}  # origin -> (expires at, RobotFileParser or None when there are no rules)
+
+    def parser(self, origin):
+        with self.lock:
+            host_lock = self.host_locks.setdefault(origin, threading.Lock())
+
+        # One fetch per host, even when several workers ask at once
+        with host_lock:
+            entry = self.parsers.get(origin)
+            if entry and entry[0] > time.monotonic():
+                return entry[1]
+
+            parser = None
+            try:
+                response = self.session.get(f"{origin}/robots.txt", timeout=self.timeout,
+                                            headers={'User-Agent': self.user_agent})
+                if response.status_code == 200:
+                    parser = RobotFileParser()
+                    parser.parse(response.text.splitlines())
+                elif response.status_code in (401, 403):
+                    parser = RobotFileParser()
+                    parser.disallow_all = True
+            except requests.exceptions.RequestException:
+                pass  # unreachable robots.txt: assume crawling is allowed
+
+            self.parsers[origin] = (time.monotonic() + self.ttl, parser)
+            return parser
+
+    def allowed(self, url):
+        parts = urlsplit(url)
+        parser = self.parser(f"{parts.scheme}://{parts.netloc}")
+        return parser is None or parser.can_fetch(self.user_agent, url)
+
+    def crawl_delay(self, url):
+        parts = urlsplit(url)
+        parser = self.parser(f"{parts.scheme}://{parts.netloc}")
+        delay = parser.crawl_delay(self.user_agent) if parser else None
+        return float(delay) if delay else 0.0
+
+
+class HostQueue:
+    def __init__(self, delay):
+        self.jobs = deque()
+        self.active = 0
+        self.next_start = 0.0
+        self.delay = delay
+        self.robots_checked = False
+
+
+class CrawlScheduler:
+    def __init__(self, session=None, max_workers=8, per_host_concurrency=2, per_host_delay=1.0,
+                 user_agent='*', respect_robots=True, dns_ttl=300,
+                 dns_max_hosts=1024):
+        """
+        Initialize the scheduler; worker threads start with the first submit()
+
+        Args:
+            session: requests.Session used for robots.txt and, by the caller, for the fetches
+                themselves (a new one if None); its host lookups are cached
+            max_workers: Fetches running at once across all hosts
+            per_host_concurrency: Fetches running at once against one host
+            per_host_delay: Minimum seconds between request starts to one host
+            user_agent: Name matched against robots.txt rules
+            respect_robots: Skip URLs that robots.txt disallows, and honour Crawl-delay
+            dns_ttl: Seconds to cache the session's host name lookups (0 disables the cache)
+            dns_max_hosts: Host names kept in the lookup cache
+        """
+        self.max_workers = max_workers
+        self.per_host_concurrency = per_host_concurrency
+        self.per_host_delay = per_host_delay
+        self.session = session or requests.Session()
+        self.dns_cache = DNSCache(dns_ttl, dns_max_hosts) if dns_ttl else None
+        if self.dns_cache:
+            for prefix in ('http://', 'https://'):
+                self.session.mount(prefix, CachedDNSAdapter(self.dns_cache))
+        self.robots = RobotsCache(self.session, user_agent) if respect_robots else None
+        self.condition = threading.Condition()
+        self.hosts = {}
+        self.ring = deque()  # hosts with queued work, in round-robin order
+        self.workers = []
+
+    def submit(self, fn, url, *args, **kwargs):
+        """Schedule fn(url, *args, **kwargs) under url's host limits; returns a Future"""
+        future = Future()
+        host = (urlsplit(url).hostname or '').lower()
+
+        with self.condition:
+            queue = self.hosts.setdefault(host, HostQueue(self.per_host_delay))
+            if not queue.jobs:
+                self.ring.append(host)
+            queue.jobs.append((future, fn, url, args, kwargs))
+            if len(self.workers) < self.max_workers:
+                worker = threading.Thread(target=self._work, daemon=True)
+                worker.start()
+                self.workers.append(worker)
+            self.condition.notify()
+        return future
+
+    def map(self, fn, urls, *args, **kwargs):
+        """Run fn for every URL under the host limits; results (or exceptions) in input order"""
+        futures = [self.submit(fn, url, *args, **kwargs) for url in urls]
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def _next_job(self, now):
+        """Pop the next job round-robin across hosts; (None, seconds until one may be ready) if none is"""
+        wait_for = None
+        for _ in range(len(self.ring)):
+            host = self.ring[0]
+            self.ring.rotate(-1)
+            queue = self.hosts[host]
+
+            if queue.active >= self.per_host_concurrency:
+                continue
+            if now < queue.next_start:
+                ready_in = queue.next_start - now
+                wait_for = ready_in if wait_for is None else min(wait_for, ready_in)
+                continue
+
+            job = queue.jobs.popleft()
+            if not queue.jobs:
+                self.ring.remove(host)
+            queue.active += 1
+            queue.next_start = now + queue.delay
+            return (host, queue, job), None
+        return None, wait_for
+
+    def _work(self):
+        while True:
+            with self.condition:
+                while True:
+                    picked, wait_for = self._next_job(time.monotonic())
+                    if picked:
+                        break
+                    self.condition.wait(timeout=wait_for)
+
+            host, queue, (future, fn, url, args, kwargs) = picked
+            try:
+                if future.set_running_or_notify_cancel():
+                    future.set_result(self._run(queue, fn, url, args, kwargs))
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                with self.condition:
+                    queue.active -= 1
+                    self.condition.notify_all()
+
+    def _run(self, queue, fn, url, args, kwargs):
+        if self.robots:
+            if not self.robots.allowed(url):
+                raise RobotsDisallowed(f"robots.txt disallows {url}")
+            if not queue.robots_checked:
+                queue.robots_checked = True
+                crawl_delay = self.robots.crawl_delay(url)
+                if crawl_delay > queue.delay:
+                    with self.condition:
+                        queue.delay = crawl_delay
+                        queue.next_start = max(queue.next_start, time.monotonic() + crawl_delay)
+        return fn(url, *args, **kwargs)
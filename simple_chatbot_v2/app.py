@@ -1,49 +1,206 @@
 import os
 import requests
 from bs4 import BeautifulSoup
+import openai
 from openai import OpenAI
 import json
-from urllib.parse import urlparse
+from urllib.parse import urlparse, urlsplit, urlunsplit, parse_qs, parse_qsl, urlencode
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import defaultdict, deque
+from itertools import islice
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
 import threading
+from telemetry import Telemetry
+from local_index import LocalIndex
+from dedupe import DuplicateDetector
+from key_pool import KeyPool, ROTATE_STATUSES
+from doc_store import DocStore
+from model_cascade import CascadePolicy
+from resilience import CircuitOpen, CrawlResult, Failure, RetryBudget, SpreadFailures, Upstream
+
+# Overridable so the app can be pointed at local stand-ins (see benchmarks/)
+GOOGLE_SEARCH_URL = os.getenv('GOOGLE_SEARCH_URL', 'https://www.googleapis.com/customsearch/v1')
+ZENROWS_API_URL = os.getenv('ZENROWS_API_URL', 'https://api.zenrows.com/v1/')
+
+GOOGLE_PAGE_SIZE = 10  # Custom Search API max per request
+
+# Per-key limits for the API key pools
+GOOGLE_DAILY_QUOTA = int(os.getenv('GOOGLE_DAILY_QUOTA', '0')) or None
+ZENROWS_KEY_CONCURRENCY = int(os.getenv('ZENROWS_KEY_CONCURRENCY', '5'))
+
+# A locally indexed page counts as a usable source when it matches most of the
+# question's terms with a reasonable BM25 score; with enough of them the web
+# search is skipped entirely
+LOCAL_MIN_SCORE = float(os.getenv('QA_LOCAL_MIN_SCORE', '3.0'))
+LOCAL_MIN_COVERAGE = float(os.getenv('QA_LOCAL_MIN_COVERAGE', '0.7'))
+LOCAL_ENOUGH_SOURCES = int(os.getenv('QA_LOCAL_ENOUGH_SOURCES', '3'))
+
+# Which model serves each call: 'cascade' (small model first, large one when it is
+# unsure or the question looks hard), 'small' or 'large'; see model_cascade.py
+SEARCH_TERM_MODELS = os.getenv('QA_SEARCH_TERM_MODELS', 'small')
+ANSWER_MODELS = os.getenv('QA_ANSWER_MODELS', 'cascade')
+
+# Crawled pages younger than this are served from the page store instead of ZenRows
+PAGE_CACHE_TTL = float(os.getenv('QA_PAGE_CACHE_TTL', '86400'))
+
+# Seconds before a Google or OpenAI call is given up on (crawls use the per-source deadline)
+GOOGLE_TIMEOUT = float(os.getenv('QA_GOOGLE_TIMEOUT', '10'))
+OPENAI_TIMEOUT = float(os.getenv('QA_OPENAI_TIMEOUT', '60'))
+ZENROWS_CONNECT_TIMEOUT = float(os.getenv('QA_ZENROWS_CONNECT_TIMEOUT', '5'))
+
+# ZenRows read timeouts trip its breaker once this many target domains time out within the window
+ZENROWS_TIMEOUT_DOMAINS = int(os.getenv('QA_ZENROWS_TIMEOUT_DOMAINS', '3'))
+ZENROWS_TIMEOUT_WINDOW = float(os.getenv('QA_ZENROWS_TIMEOUT_WINDOW', '60'))
+
+# Retries allowed per request across all upstreams; see resilience.py
+RETRY_BUDGET_RATIO = float(os.getenv('QA_RETRY_BUDGET_RATIO', '0.1'))
+
+
+class Cancelled(Exception):
+    """Raised between pipeline stages once the caller has given up on the question"""
+
+
+def is_http_outage(e):
+    """Timeouts, connection errors and 5xx answers: the upstream itself is failing"""
+    if isinstance(e, requests.HTTPError):
+        return e.response is not None and e.response.status_code >= 500
+    return isinstance(e, (requests.Timeout, requests.ConnectionError))
+
+
+def is_zenrows_outage(e, read_timeouts):
+    """
+    Connection errors and 5xx from ZenRows itself, and read timeouts from many sites at once
+
+    ZenRows renders the target page before answering, so a read timeout for one
+    site usually means that site is slow. read_timeouts (a SpreadFailures keyed
+    by target domain) decides when they are spread widely enough to blame ZenRows.
+    """
+    if isinstance(e, requests.HTTPError):
+        return e.response is not None and e.response.status_code >= 500
+    if isinstance(e, requests.ReadTimeout):
+        target = parse_qs(urlsplit(e.request.url).query).get('url', [''])[0] if e.request else ''
+        return read_timeouts.add(urlsplit(target).hostname or '')
+    return isinstance(e, requests.ConnectionError)
+
+
+def is_openai_outage(e):
+    return isinstance(e, (openai.APIConnectionError, openai.InternalServerError))
+
+
+def canonical_url(url):
+    """Normalize a URL so trivially different links to the same page compare equal"""
+    parts = urlsplit(url.strip())
+    host = (parts.hostname or '').lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    if parts.port and parts.port not in (80, 443):
+        host = f"{host}:{parts.port}"
+
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith('utm_') and key.lower() not in ('gclid', 'fbclid', 'mc_cid', 'mc_eid')
+    )
+    scheme = 'https' if parts.scheme in ('http', 'https') else parts.scheme
+    return urlunsplit((scheme, host, parts.path.rstrip('/') or '/', urlencode(query), ''))
+
+
+ANSWER_SYSTEM_PROMPT = "You are a helpful assistant that answers questions based on provided reference content. Always cite your sources when answering."
+ANSWER_INSTRUCTIONS = "Use the following reference content to answer the question. If the answer cannot be found in the reference content, say so."
+ANSWER_FAILED = "Sorry, I couldn't generate an answer due to an error."
 
 
 class QuestionAnsweringApp:
-    def __init__(self, openai_api_key, google_api_key, google_cse_id, zenrows_api_key):
+    def __init__(self, openai_api_key, google_api_key, google_cse_id, zenrows_api_key, prompt_layout='cache_friendly',
+                 index_dir='local_index', duplicate_domains_path='duplicate_domains.json',
+                 page_store_dir='page_store'):
         """
         Initialize the app with necessary API keys
 
         Args:
             openai_api_key: Your OpenAI API key
-            google_api_key: Your Google API key
+            google_api_key: Your Google API key (or several, comma-separated)
             google_cse_id: Your Google Custom Search Engine ID
-            zenrows_api_key: Your ZenRows API key
+            zenrows_api_key: Your ZenRows API key (or several, comma-separated)
+            prompt_layout: 'cache_friendly' (stable prefix, question last) or 'legacy'
+            index_dir: Directory of the local index of crawled pages
+            duplicate_domains_path: JSON file tracking domains that mostly serve copies of other results
+            page_store_dir: Directory of the compressed store of crawled pages (None disables it)
         """
-        self.openai_client = OpenAI(api_key=openai_api_key)
-        self.google_api_key = google_api_key
+        self.prompt_layout = prompt_layout
+        # Retries happen in self.openai, where they share the retry budget
+        self.openai_client = OpenAI(api_key=openai_api_key, timeout=OPENAI_TIMEOUT, max_retries=0)
+        self.google_keys = KeyPool(google_api_key, max_concurrency=GOOGLE_PAGE_SIZE, daily_quota=GOOGLE_DAILY_QUOTA)
         self.google_cse_id = google_cse_id
-        self.zenrows_api_key = zenrows_api_key
+        self.zenrows_keys = KeyPool(zenrows_api_key, max_concurrency=ZENROWS_KEY_CONCURRENCY)
         self.print_lock = threading.Lock()
+        self.latency_lock = threading.Lock()
+        self.domain_latencies = defaultdict(lambda: deque(maxlen=50))
+        self.recent_latencies = deque(maxlen=200)
+        self.telemetry = Telemetry('simple_chatbot_v2')
+        # Pooled so parallel crawls, hedges and later questions reuse connections
+        self.session = requests.Session()
+        self.session.mount('https://', requests.adapters.HTTPAdapter(pool_maxsize=20))
+        self.session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=20))
+        self.local_index = LocalIndex(index_dir)
+        self.duplicates = DuplicateDetector(duplicate_domains_path)
+        self.page_store = DocStore(page_store_dir) if page_store_dir else None
+        self.search_term_models = CascadePolicy('search_term', SEARCH_TERM_MODELS,
+                                                on_outcome=self.count_model_outcome('search_term'))
+        self.answer_models = CascadePolicy('answer', ANSWER_MODELS, on_outcome=self.count_model_outcome('answer'))
+        self.retry_budget = RetryBudget(RETRY_BUDGET_RATIO)
+        self.google = Upstream('google', self.retry_budget, is_http_outage,
+                               on_event=self.count_upstream_event('google'))
+        # Crawls already get hedged, so one retry at most
+        self.zenrows_timeouts = SpreadFailures(ZENROWS_TIMEOUT_DOMAINS, ZENROWS_TIMEOUT_WINDOW)
+        self.zenrows = Upstream('zenrows', self.retry_budget,
+                                lambda e: is_zenrows_outage(e, self.zenrows_timeouts), attempts=2,
+                                on_event=self.count_upstream_event('zenrows'))
+        self.openai = Upstream('openai', self.retry_budget, is_openai_outage,
+                               on_event=self.count_upstream_event('openai'))
+
+    def count_model_outcome(self, call):
+        """Telemetry counter callback for a cascade: which tier answered each request"""
+        return lambda outcome, model: self.telemetry.count(f"{call}_model_{outcome}")
+
+    def count_upstream_event(self, upstream):
+        """Telemetry counter callback for an Upstream: retries, rejected calls, circuit changes"""
+        return lambda event: self.telemetry.count(f"{upstream}_{event}")
 
     def thread_safe_print(self, message):
         """Print messages safely in multi-threaded environment"""
         with self.print_lock:
             print(message)
 
+    def record_token_usage(self, response):
+        """Add the token counts of an OpenAI response to the counters"""
+        usage = getattr(response, 'usage', None)
+        if not usage:
+            return 0
+
+        self.telemetry.count('tokens_in', usage.prompt_tokens)
+        self.telemetry.count('tokens_out', usage.completion_tokens)
+
+        details = getattr(usage, 'prompt_tokens_details', None)
+        cached_tokens = getattr(details, 'cached_tokens', None) or 0
+        self.telemetry.count('cached_tokens_in', cached_tokens)
+        return cached_tokens
+
     def generate_search_term(self, question):
         """Generate an optimized search term from the user's question"""
         try:
-            response = self.openai_client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system",
-                     "content": "You are a search query optimizer. Convert the user's question into an effective Google search query. Return only the search query, nothing else."},
-                    {"role": "user", "content": question}
-                ],
-                max_tokens=50,
-                temperature=0.3
-            )
+            with self.telemetry.span('generate_search_term'):
+                response = self.openai.call(lambda timeout: self.search_term_models.complete(
+                    self.openai_client,
+                    question,
+                    messages=[
+                        {"role": "system",
+                         "content": "You are a search query optimizer. Convert the user's question into an effective Google search query. Return only the search query, nothing else."},
+                        {"role": "user", "content": question}
+                    ],
+                    max_tokens=50,
+                    temperature=0.3
+                ))
+            self.record_token_usage(response)
             search_term = response.choices[0].message.content.strip()
             print(f"\nGenerated search term: {search_term}")
             return search_term
@@ -51,155 +208,668 @@ class QuestionAnsweringApp:
             print(f"Error generating search term: {e}")
             return question  # Fallback to original question
 
-    def google_search(self, search_term, num_results=5):
-        """Perform Google Custom Search and return top results"""
-        try:
-            url = "https://www.googleapis.com/customsearch/v1"
-            params = {
-                'key': self.google_api_key,
-                'cx': self.google_cse_id,
-                'q': search_term,
-                'num': num_results
-            }
+    def pooled_get(self, pool, key_param, url, params, **kwargs):
+        """GET with the best key from a pool, retrying on another key when one is rejected or rate limited"""
+        tried = []
+        while True:
+            key = pool.acquire(exclude=tried)
+            tried.append(key)
+            response = None
+            try:
+                response = self.session.get(url, params={**params, key_param: key}, **kwargs)
+            finally:
+                if response is None:
+                    pool.release(key)
+                else:
+                    pool.release(key, response.status_code, response.headers, response.text)
+
+            if response.status_code not in ROTATE_STATUSES or len(tried) == len(pool):
+                return response
+            self.telemetry.count('key_rotations')
+
+    def google_search_page(self, search_term, start=1, num=GOOGLE_PAGE_SIZE, parent_span=None):
+        """Fetch one page (at most 10 results) of Google Custom Search results"""
+        url = GOOGLE_SEARCH_URL
+        params = {
+            'cx': self.google_cse_id,
+            'q': search_term,
+            'num': min(num, GOOGLE_PAGE_SIZE),
+            'start': start
+        }
 
-            response = requests.get(url, params=params)
+        def fetch(timeout):
+            response = self.pooled_get(self.google_keys, 'key', url, params, timeout=timeout)
             response.raise_for_status()
+            return response
 
-            results = response.json()
-            search_results = []
+        with self.telemetry.span('google_search_page', parent=parent_span, start=start):
+            results = self.google.call(fetch, timeout=GOOGLE_TIMEOUT).json()
 
-            if 'items' in results:
-                for item in results['items']:
-                    search_results.append({
-                        'title': item.get('title', ''),
-                        'link': item.get('link', ''),
-                        'snippet': item.get('snippet', '')
-                    })
+        search_results = []
 
-            return search_results
-        except Exception as e:
-            print(f"Error performing Google search: {e}")
-            return []
+        if 'items' in results:
+            for item in results['items']:
+                search_results.append({
+                    'title': item.get('title', ''),
+                    'link': item.get('link', ''),
+                    'snippet': item.get('snippet', '')
+                })
+
+        return search_results
+
+    def iter_google_search(self, search_term, num_results=5):
+        """
+        Yield Google Custom Search results in rank order as their pages arrive
+
+        The API returns at most 10 results per request, so larger requests (up to
+        100) fetch all pages in parallel. Each page's results are yielded as soon
+        as it and the pages before it are in, dropping results that point at an
+        earlier result's page; closing the generator early cancels the pages not
+        yet needed.
+        """
+        num_results = min(num_results, 100)
+        starts = list(range(1, num_results + 1, GOOGLE_PAGE_SIZE))
+
+        with self.telemetry.span('google_search', num_results=num_results) as span:
+            if len(starts) == 1:
+                try:
+                    page = self.google_search_page(search_term, 1, num_results, parent_span=span)
+                except Exception as e:
+                    print(f"Error performing Google search: {e}")
+                    page = []
+                yield from page
+                return
+
+            executor = ThreadPoolExecutor(max_workers=len(starts))
+            try:
+                futures = [
+                    executor.submit(self.google_search_page, search_term, start,
+                                    min(GOOGLE_PAGE_SIZE, num_results - start + 1), span)
+                    for start in starts
+                ]
+
+                seen = set()
+                for start, future in zip(starts, futures):
+                    try:
+                        page = future.result()
+                    except Exception as e:
+                        print(f"Error performing Google search (results from {start}): {e}")
+                        continue
+
+                    for result in page:
+                        key = canonical_url(result['link'])
+                        if key not in seen:
+                            seen.add(key)
+                            yield result
+            finally:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+    def google_search(self, search_term, num_results=5):
+        """Perform Google Custom Search and return the top results (see iter_google_search)"""
+        return list(islice(self.iter_google_search(search_term, num_results), num_results))
 
-    def crawl_content_zenrows(self, url, max_length=9000):
-        """Crawl content from a URL using ZenRows for JS rendering"""
+    def crawl_content_zenrows(self, url, max_length=9000, timeout=30):
+        """Crawl content from a URL using ZenRows for JS rendering; returns a CrawlResult"""
         try:
-            zenrows_url = "https://api.zenrows.com/v1/"
+            zenrows_url = ZENROWS_API_URL
 
             params = {
                 'url': url,
-                'apikey': self.zenrows_api_key,
                 'js_render': 'true',  # Enable JavaScript rendering
                 'wait': '3000',  # Wait 3 seconds for JS to load
                 'premium_proxy': 'true',  # Use premium proxies for better success rate
                 'antibot': 'true'  # Enable anti-bot detection bypass
             }
 
-            response = requests.get(zenrows_url, params=params, timeout=30)
-            response.raise_for_status()
+            def fetch(remaining):
+                # Separate connect timeout: an unreachable ZenRows is an outage, a slow render may not be
+                timeout = (min(ZENROWS_CONNECT_TIMEOUT, remaining), remaining)
+                response = self.pooled_get(self.zenrows_keys, 'apikey', zenrows_url, params, timeout=timeout)
+                response.raise_for_status()
+                return response
+
+            with self.telemetry.span('fetch') as span:
+                response = self.zenrows.call(fetch, timeout=timeout)
+                span.set('bytes', len(response.content))
+            self.telemetry.count('bytes_fetched', len(response.content))
 
             # Check if we got HTML content
             if response.status_code == 200:
-                soup = BeautifulSoup(response.content, 'html.parser')
+                with self.telemetry.span('parse'):
+                    soup = BeautifulSoup(response.content, 'html.parser')
 
-                # Remove script and style elements
-                for script in soup(["script", "style"]):
-                    script.decompose()
+                    # Remove script and style elements
+                    for script in soup(["script", "style"]):
+                        script.decompose()
 
-                # Get text content
-                text = soup.get_text()
+                    # Get text content
+                    text = soup.get_text()
 
-                # Clean up text
-                lines = (line.strip() for line in text.splitlines())
-                chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-                text = ' '.join(chunk for chunk in chunks if chunk)
+                    # Clean up text
+                    lines = (line.strip() for line in text.splitlines())
+                    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+                    text = ' '.join(chunk for chunk in chunks if chunk)
 
                 # Limit text length
                 if len(text) > max_length:
                     text = text[:max_length] + "..."
 
-                return text
+                return CrawlResult(text)
             else:
-                return f"Failed to retrieve content: HTTP {response.status_code}"
+                return CrawlResult.failed('http_error', f"HTTP {response.status_code}", response.status_code)
 
+        except CircuitOpen as e:
+            return CrawlResult.failed('unavailable', str(e))
         except requests.exceptions.Timeout:
-            return "Timeout: Page took too long to load"
+            return CrawlResult.failed('timeout', f"Page took longer than {timeout}s to load")
+        except requests.HTTPError as e:
+            status = e.response.status_code
+            return CrawlResult.failed('unavailable' if status >= 500 else 'http_error', f"HTTP {status}", status)
+        except requests.ConnectionError as e:
+            return CrawlResult.failed('unavailable', f"Could not reach ZenRows: {e}")
         except Exception as e:
-            return f"Error crawling: {str(e)}"
+            return CrawlResult.failed('error', f"Error crawling: {e}")
+
+    def record_crawl_latency(self, url, crawl_time):
+        """Remember how long a successful crawl took, per domain and overall"""
+        with self.latency_lock:
+            self.domain_latencies[urlparse(url).netloc].append(crawl_time)
+            self.recent_latencies.append(crawl_time)
 
-    def crawl_single_url(self, index, result, total):
+    def hedge_delay(self, url, percentile=90, default=8.0, min_samples=5):
+        """
+        Seconds to wait before sending a duplicate request for a URL
+
+        Uses the given percentile of recent crawls of the same domain, falling back
+        to recent crawls of any domain, and finally to a fixed default.
+        """
+        with self.latency_lock:
+            samples = list(self.domain_latencies.get(urlparse(url).netloc, ()))
+            if len(samples) < min_samples:
+                samples = list(self.recent_latencies)
+
+        if len(samples) < min_samples:
+            return default
+
+        samples.sort()
+        rank = max(0, int(round(percentile / 100 * len(samples))) - 1)
+        return samples[rank]
+
+    def crawl_single_url(self, index, result, total, timeout=30, attempt='primary', parent_span=None):
         """Helper function to crawl a single URL with timing"""
-        self.thread_safe_print(f"Crawling {index + 1}/{total}: {result['title']}")
-        start_time = time.time()
-        content = self.crawl_content_zenrows(result['link'])
-        crawl_time = time.time() - start_time
-        self.thread_safe_print(f"  → [{index + 1}] Completed in {crawl_time:.2f} seconds")
+        label = '' if attempt == 'primary' else f' ({attempt})'
+        self.thread_safe_print(f"Crawling {index + 1}/{total}{label}: {result['title']}")
+
+        cached = self.page_store.get(result['link'], max_age=PAGE_CACHE_TTL) if self.page_store is not None else None
+        if cached is not None:
+            self.thread_safe_print(f"  → [{index + 1}]{label} Served from the page store")
+            self.telemetry.count('page_store_hits')
+            return {
+                'title': result['title'],
+                'url': result['link'],
+                'text': cached,
+                'error': None,
+                'crawl_time': 0.0,
+                'index': index,
+                'attempt': 'cache'
+            }
+
+        with self.telemetry.span('crawl_source', parent=parent_span, url=result['link'], attempt=attempt) as span:
+            crawled = self.crawl_content_zenrows(result['link'], timeout=timeout)
+            if not crawled.ok:
+                span.set('failure', crawled.failure.kind)
+        crawl_time = span.duration
+
+        if crawled.ok:
+            self.thread_safe_print(f"  → [{index + 1}]{label} Completed in {crawl_time:.2f} seconds")
+            self.record_crawl_latency(result['link'], crawl_time)
+            self.local_index.add(result['link'], result['title'], crawled.text)
+            if self.page_store is not None:
+                self.page_store.put(result['link'], crawled.text)
+        else:
+            self.thread_safe_print(f"  → [{index + 1}]{label} Failed after {crawl_time:.2f} seconds: {crawled.failure}")
+            self.telemetry.count(f"crawl_failed_{crawled.failure.kind}")
 
         return {
             'title': result['title'],
             'url': result['link'],
-            'text': content,
+            'text': crawled.text or '',
+            'error': crawled.failure,
             'crawl_time': crawl_time,
-            'index': index
+            'index': index,
+            'attempt': attempt
         }
 
-    def crawl_urls_parallel(self, search_results, max_workers=5):
-        """Crawl multiple URLs in parallel"""
-        reference_content = []
-        total_start_time = time.time()
+    def crawl_urls_parallel(self, search_results, max_workers=5, source_deadline=20, crawl_budget=25, progress=None,
+                            expected=None):
+        """
+        Crawl multiple URLs in parallel with hedged requests
+
+        search_results may be a generator still waiting for search pages: each
+        result's crawl starts as soon as it is yielded, so crawling page-1
+        results overlaps with fetching the later pages.
 
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            # Submit all crawling tasks
-            future_to_result = {
-                executor.submit(self.crawl_single_url, i, result, len(search_results)): i
-                for i, result in enumerate(search_results)
+        A source still running after its domain's p90 crawl latency gets a duplicate
+        request; whichever copy finishes first wins and the other is cancelled.
+        Sources that miss their deadline, or are still running when the overall
+        crawl budget runs out, come back as timeouts instead of holding up the answer.
+
+        Args:
+            search_results: Google results to crawl (any iterable, in rank order)
+            max_workers: Number of concurrent primary crawls
+            source_deadline: Seconds allowed for any single source
+            crawl_budget: Seconds allowed for the whole crawl, counted from the call
+            progress: Optional progress(event, data) callback, called with ('source', result) as each source is settled
+            expected: How many results a generator will yield at most, for progress output
+        """
+        if expected is None and hasattr(search_results, '__len__'):
+            expected = len(search_results)
+        with self.telemetry.span('crawl') as crawl_span:
+            reference_content = self._crawl_urls_hedged(iter(search_results), expected or '?', max_workers,
+                                                        source_deadline, crawl_budget, crawl_span, progress)
+            crawl_span.set('sources', len(reference_content))
+            return reference_content
+
+    def _crawl_urls_hedged(self, source_iterator, total, max_workers, source_deadline, crawl_budget, crawl_span,
+                           progress):
+        total_start_time = time.monotonic()
+        budget_end = total_start_time + crawl_budget
+
+        # Hedges get their own pool so they never queue behind primaries
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        hedge_executor = ThreadPoolExecutor(max_workers=max_workers)
+
+        search_results = []  # grows as results arrive; source i is search_results[i]
+        started = {}
+        hedged = set()
+        fallbacks = {}
+        results = {}
+        running = {}
+
+        # The caller's thread pulls results from the iterator (it may be a search
+        # generator with spans open on that thread) and hands them to the
+        # supervisor thread, which runs the crawls; the doorbell future wakes it
+        lock = threading.Lock()
+        arrivals = []
+        doorbell = [Future()]
+        feeding = [True]
+        stop = threading.Event()
+        supervisor_error = []
+
+        def ring():
+            if not doorbell[0].done():
+                doorbell[0].set_result(None)
+
+        def take_arrivals():
+            with lock:
+                new = list(arrivals)
+                arrivals.clear()
+                if doorbell[0].done():
+                    doorbell[0] = Future()
+                return new, feeding[0]
+
+        def run(index, attempt):
+            started.setdefault(index, time.monotonic())
+            return self.crawl_single_url(index, search_results[index], total, timeout=source_deadline,
+                                         attempt=attempt, parent_span=crawl_span)
+
+        def timed_out(index, reason, kind='timeout'):
+            result = search_results[index]
+            return {
+                'title': result['title'],
+                'url': result['link'],
+                'text': '',
+                'error': Failure(kind, reason),
+                'crawl_time': time.monotonic() - started.get(index, total_start_time),
+                'index': index,
+                'attempt': 'hedged' if index in hedged else 'primary'
             }
 
-            # Collect results as they complete
-            for future in as_completed(future_to_result):
-                try:
-                    crawl_result = future.result()
-                    reference_content.append(crawl_result)
-                except Exception as e:
-                    index = future_to_result[future]
-                    self.thread_safe_print(f"  → [{index + 1}] Failed: {str(e)}")
+        def finish(index, crawl_result):
+            results[index] = crawl_result
+            if progress:
+                progress('source', crawl_result)
+
+        def cancel_siblings(index):
+            for future, future_index in list(running.items()):
+                if future_index == index:
+                    future.cancel()
+                    del running[future]
+
+        def supervise():
+            while not stop.is_set():
+                new, still_feeding = take_arrivals()
+                for index in new:
+                    running[executor.submit(run, index, 'primary')] = index
+                if not running and not still_feeding:
+                    return
+
+                now = time.monotonic()
+                if now >= budget_end:
+                    return
+
+                # Wake up for the next arrival, completion, hedge point or deadline, whichever is first
+                wake_at = budget_end
+                for index in set(running.values()):
+                    if index in started:
+                        wake_at = min(wake_at, started[index] + source_deadline)
+                        if index not in hedged:
+                            wake_at = min(wake_at, started[index] + self.hedge_delay(search_results[index]['link']))
+
+                waiting = list(running) + ([doorbell[0]] if still_feeding else [])
+                done, _ = wait(waiting, timeout=max(0.0, wake_at - now), return_when=FIRST_COMPLETED)
+                for future in done:
+                    index = running.pop(future, None)
+                    if index is None or index in results:
+                        continue
+
+                    try:
+                        crawl_result = future.result()
+                    except Exception as e:
+                        self.thread_safe_print(f"  → [{index + 1}] Failed: {str(e)}")
+                        crawl_result = timed_out(index, f"Error crawling: {str(e)}", kind='error')
+
+                    # A failed copy only wins if there is no other copy still running
+                    if crawl_result['error'] is not None and index in running.values():
+                        fallbacks[index] = crawl_result
+                        continue
+
+                    finish(index, crawl_result)
+                    cancel_siblings(index)
+
+                now = time.monotonic()
+                for index in set(running.values()):
+                    if index in results or index not in started:
+                        continue
+
+                    if now >= started[index] + source_deadline:
+                        self.thread_safe_print(f"  → [{index + 1}] Missed its {source_deadline}s deadline")
+                        finish(index, fallbacks.get(index) or timed_out(index, f"no response within {source_deadline}s"))
+                        cancel_siblings(index)
+                    elif index not in hedged and now >= started[index] + self.hedge_delay(search_results[index]['link']):
+                        hedged.add(index)
+                        running[hedge_executor.submit(run, index, 'hedged')] = index
+
+        def supervise_safely():
+            try:
+                supervise()
+            except BaseException as e:
+                supervisor_error.append(e)
+            finally:
+                # Past the budget (or failed): tell the feeding loop to stop waiting for more results
+                stop.set()
+
+        supervisor = threading.Thread(target=supervise_safely, name='crawl-supervisor', daemon=True)
+        supervisor.start()
+        try:
+            for result in source_iterator:
+                with lock:
+                    search_results.append(result)
+                    arrivals.append(len(search_results) - 1)
+                    ring()
+                if stop.is_set():
+                    break
+        except BaseException:
+            stop.set()
+            raise
+        finally:
+            with lock:
+                feeding[0] = False
+                ring()
+            supervisor.join()
+
+            # Don't wait for losing or abandoned requests; their socket timeouts will reap them
+            executor.shutdown(wait=False, cancel_futures=True)
+            hedge_executor.shutdown(wait=False, cancel_futures=True)
+
+        if supervisor_error:
+            raise supervisor_error[0]
+
+        for index in range(len(search_results)):
+            if index not in results:
+                finish(index, fallbacks.get(index) or timed_out(index, f"crawl budget of {crawl_budget}s exhausted"))
 
         # Sort results by original index to maintain order
-        reference_content.sort(key=lambda x: x['index'])
+        reference_content = [results[index] for index in range(len(search_results))]
+
+        crawl_span.set('hedged', len(hedged))
+        self.telemetry.count('hedged_requests', len(hedged))
 
-        total_time = time.time() - total_start_time
-        print(f"\nTotal crawling time: {total_time:.2f} seconds (parallel execution)")
+        total_time = time.monotonic() - total_start_time
+        print(f"\nTotal crawling time: {total_time:.2f} seconds (parallel execution, {len(hedged)} hedged)")
 
         return reference_content
 
-    def get_answer_from_openai(self, question, reference_content):
-        """Get answer from OpenAI using the question and reference content"""
-        try:
+    def build_answer_messages(self, question, reference_content):
+        """
+        Build the chat messages for the answer call
+
+        OpenAI caches prompts by exact prefix, so the cache-friendly layout keeps
+        everything fixed (system prompt and instructions) first, lists sources in
+        URL order so the same sources always render the same way, and puts the
+        question last. The legacy layout lists sources in search order.
+        """
+        usable = [content for content in reference_content if content['error'] is None and content['text']]
+
+        if self.prompt_layout != 'cache_friendly':
             # Prepare the context
-            context = "Use the following reference content to answer the question. If the answer cannot be found in the reference content, say so.\n\n"
+            context = f"{ANSWER_INSTRUCTIONS}\n\n"
             context += "Reference Content:\n"
 
             for i, content in enumerate(reference_content):
-                if content['text'] and not content['text'].startswith(('Error', 'Failed', 'Timeout')):
+                if content in usable:
                     context += f"\n--- Source {i + 1}: {content['title']} ---\n"
                     context += f"URL: {content['url']}\n"
                     context += f"Content: {content['text'][:9000]}...\n"  # Limit each source
 
-            response = self.openai_client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system",
-                     "content": "You are a helpful assistant that answers questions based on provided reference content. Always cite your sources when answering."},
-                    {"role": "user", "content": f"{context}\n\nQuestion: {question}"}
-                ],
-                max_tokens=1000,
-                temperature=0.7
-            )
+            return [
+                {"role": "system", "content": ANSWER_SYSTEM_PROMPT},
+                {"role": "user", "content": f"{context}\n\nQuestion: {question}"}
+            ]
+
+        sources = ""
+        for i, content in enumerate(sorted(usable, key=lambda c: c['url'])):
+            sources += f"--- Source {i + 1}: {content['title']} ---\n"
+            sources += f"URL: {content['url']}\n"
+            sources += f"Content: {content['text'][:9000]}...\n\n"  # Limit each source
+
+        return [
+            {"role": "system", "content": f"{ANSWER_SYSTEM_PROMPT}\n\n{ANSWER_INSTRUCTIONS}"},
+            {"role": "user", "content": f"Reference Content:\n\n{sources}Question: {question}"}
+        ]
+
+    def get_answer_from_openai(self, question, reference_content):
+        """Get answer from OpenAI using the question and reference content"""
+        try:
+            with self.telemetry.span('answer', prompt_layout=self.prompt_layout) as span:
+                messages = self.build_answer_messages(question, reference_content)
+                response = self.openai.call(lambda timeout: self.answer_models.complete(
+                    self.openai_client,
+                    question,
+                    messages=messages,
+                    max_tokens=1000,
+                    temperature=0.7
+                ))
+            cached_tokens = self.record_token_usage(response)
+            span.set('cached_tokens', cached_tokens)
+            span.set('model', response.model)
+
+            if response.usage:
+                print(f"Prompt cache: {cached_tokens} of {response.usage.prompt_tokens} input tokens cached")
 
             return response.choices[0].message.content
         except Exception as e:
             print(f"Error getting answer from OpenAI: {e}")
-            return "Sorry, I couldn't generate an answer due to an error."
+            return ANSWER_FAILED
+
+    def stream_answer_from_openai(self, question, reference_content):
+        """
+        Like get_answer_from_openai, but yields the answer in pieces as they are generated
+
+        Goes through the OpenAI circuit breaker but is never retried, since part
+        of the answer may already have been sent. A stream the caller abandons
+        counts as neither a success nor a failure.
+        """
+        self.openai.allow()
+        error = None
+        finished = False
+        try:
+            with self.telemetry.span('answer', prompt_layout=self.prompt_layout, streamed=True) as span:
+                stream = self.answer_models.stream(
+                    self.openai_client,
+                    question,
+                    messages=self.build_answer_messages(question, reference_content),
+                    max_tokens=1000,
+                    temperature=0.7,
+                    stream_options={"include_usage": True}
+                )
+                for chunk in stream:
+                    span.set('model', chunk.model)
+                    if chunk.usage:
+                        span.set('cached_tokens', self.record_token_usage(chunk))
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+            finished = True
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            if finished or error is not None:
+                self.openai.record(error)
+            else:
+                self.openai.discard()
+
+    def search_local_index(self, question, max_sources=5):
+        """Pages crawled for earlier questions that cover this one well, as reference content"""
+        with self.telemetry.span('local_search') as span:
+            matches = self.local_index.search(question, k=max_sources)
+            span.set('matches', len(matches))
+
+        reference_content = []
+        for match in matches:
+            if match['score'] >= LOCAL_MIN_SCORE and match['coverage'] >= LOCAL_MIN_COVERAGE:
+                reference_content.append({
+                    'title': match['title'],
+                    'url': match['url'],
+                    'text': match['text'],
+                    'error': None,
+                    'crawl_time': 0.0,
+                    'index': len(reference_content),
+                    'attempt': 'local'
+                })
+        self.telemetry.count('local_index_hits', len(reference_content))
+        return reference_content
+
+    def collapse_duplicates(self, reference_content):
+        """Keep one copy of sources that are syndicated versions of the same article"""
+        with self.telemetry.span('dedupe', sources=len(reference_content)) as span:
+            kept, duplicates = self.duplicates.collapse(reference_content)
+            span.set('duplicates', len(duplicates))
+
+        for duplicate, original in duplicates:
+            print(f"Dropping near-duplicate source {duplicate['url']} (copy of {original['url']})")
+        self.telemetry.count('duplicate_sources', len(duplicates))
+        return kept
+
+    def gather_reference_content(self, question, num_sources=5, progress=None, cancelled=None):
+        """
+        Collect sources for a question: the local index first, then search and crawl for the rest
+
+        Args:
+            question: The user's question
+            num_sources: Sources wanted
+            progress: Optional progress(event, data) callback, called as each stage
+                      finishes ('local_sources', 'search_term', 'search_results', 'source');
+                      'source' events for early results can come before 'search_results'
+            cancelled: Optional threading.Event; once set, Cancelled is raised before the next stage
+                       (or the next search result)
+
+        Returns:
+            Reference content, or None if nothing was found
+        """
+        emit = progress or (lambda event, data: None)
+
+        def check_cancelled():
+            if cancelled is not None and cancelled.is_set():
+                raise Cancelled("Question was cancelled")
+
+        # Look in pages crawled for earlier questions first
+        local_content = self.search_local_index(question, max_sources=num_sources)
+        if local_content:
+            emit('local_sources', local_content)
+        if len(local_content) >= LOCAL_ENOUGH_SOURCES:
+            print(f"\nFound {len(local_content)} matching pages in the local index, skipping web search")
+            self.telemetry.count('web_searches_skipped')
+            return self.collapse_duplicates(local_content)
+
+        # Generate search term
+        check_cancelled()
+        search_term = self.generate_search_term(question)
+        emit('search_term', search_term)
+        check_cancelled()
+
+        # Search Google; a few spare results make up for ones skipped below.
+        # Only crawl what the local index doesn't already cover, and skip
+        # domains that mostly serve copies of other results. Results arrive in
+        # rank order and each one is crawled as soon as it is accepted, so
+        # crawling page-1 results overlaps with fetching later pages, and later
+        # pages aren't waited for once there are enough.
+        wanted = num_sources - len(local_content)
+        known = {canonical_url(content['url']) for content in local_content}
+        originals = []
+        duplicate_prone = []
+
+        def accepted_results():
+            results = self.iter_google_search(search_term, num_results=num_sources + 3)
+            try:
+                for result in results:
+                    check_cancelled()
+                    if canonical_url(result['link']) in known:
+                        continue
+                    if self.duplicates.is_duplicate_prone(result['link']):
+                        duplicate_prone.append(result)
+                        continue
+                    originals.append(result)
+                    yield result
+                    if len(originals) >= wanted:
+                        break
+            finally:
+                results.close()
+
+            if duplicate_prone:
+                print(f"Skipping {len(duplicate_prone)} results from duplicate-prone domains")
+                self.telemetry.count('duplicate_prone_skipped', len(duplicate_prone))
+            # Sent once searching is done; sources already crawled may have been reported before it
+            emit('search_results', (originals or duplicate_prone)[:wanted])
+
+        reference_content = list(local_content)
+        if local_content:
+            print(f"\nUsing {len(local_content)} matching pages from the local index")
+
+        if wanted > 0:
+            print(f"\nSearching Google and crawling up to {wanted} results as they arrive...")
+            reference_content += self.crawl_urls_parallel(accepted_results(), progress=progress, expected=wanted)
+            if not originals and duplicate_prone:
+                # Nothing else came up; duplicate-prone results are better than none
+                check_cancelled()
+                reference_content += self.crawl_urls_parallel(duplicate_prone[:wanted], progress=progress)
+
+        if not reference_content:
+            print("No search results found.")
+            return None
+
+        return self.collapse_duplicates(reference_content)
+
+    def answer_question(self, question, num_sources=5):
+        """Run search, crawling and answering for one question; returns None if nothing was found"""
+        with self.telemetry.span('question'):
+            reference_content = self.gather_reference_content(question, num_sources)
+            if reference_content is None:
+                return None
+
+            # Get answer from OpenAI
+            print("\nGenerating answer...")
+            return self.get_answer_from_openai(question, reference_content)
 
     def run(self):
         """Main application loop"""
@@ -208,37 +878,41 @@ class QuestionAnsweringApp:
 
         while True:
             # Get question from user
-            question = input("\nEnter your question (or 'quit' to exit): ").strip()
+            question = input("\nEnter your question (or 'metrics' / 'quit'): ").strip()
 
             if question.lower() == 'quit':
+                self.local_index.close()
+                if self.page_store is not None:
+                    self.page_store.close()
+                export_path = os.getenv('QA_OTEL_EXPORT')
+                if export_path:
+                    self.telemetry.write_otel_json(export_path)
+                    print(f"Telemetry written to {export_path}")
                 print("Thanks for using the app!")
                 break
 
+            if question.lower() == 'metrics':
+                print(self.telemetry.export_prometheus())
+                for name, pool in (('google', self.google_keys), ('zenrows', self.zenrows_keys)):
+                    for key in pool.status():
+                        print(f"# {name} key {key}")
+                for policy in (self.search_term_models, self.answer_models):
+                    print(f"# models {policy.status()}")
+                for upstream in (self.google, self.zenrows, self.openai):
+                    print(f"# upstream {upstream.status()}")
+                print(f"# retry budget {self.retry_budget.status()}")
+                continue
+
             if not question:
                 print("Please enter a valid question.")
                 continue
 
             print(f"\nProcessing question: {question}")
 
-            # Generate search term
-            search_term = self.generate_search_term(question)
-
-            # Search Google
-            print("\nSearching Google...")
-            search_results = self.google_search(search_term)
-
-            if not search_results:
-                print("No search results found.")
+            answer = self.answer_question(question)
+            if answer is None:
                 continue
 
-            # Crawl content from search results in parallel
-            print(f"\nCrawling content from top {len(search_results)} results in parallel...")
-            reference_content = self.crawl_urls_parallel(search_results)
-
-            # Get answer from OpenAI
-            print("\nGenerating answer...")
-            answer = self.get_answer_from_openai(question, reference_content)
-
             # Print the answer
             print("\n" + "=" * 70)
             print("ANSWER:")
@@ -268,7 +942,11 @@ def main():
         return
 
     # Create and run the app
-    app = QuestionAnsweringApp(OPENAI_API_KEY, GOOGLE_API_KEY, GOOGLE_CSE_ID, ZENROWS_API_KEY)
+    app = QuestionAnsweringApp(OPENAI_API_KEY, GOOGLE_API_KEY, GOOGLE_CSE_ID, ZENROWS_API_KEY,
+                               prompt_layout=os.getenv('QA_PROMPT_LAYOUT', 'cache_friendly'),
+                               index_dir=os.getenv('QA_INDEX_DIR', 'local_index'),
+                               duplicate_domains_path=os.getenv('QA_DUPLICATE_DOMAINS', 'duplicate_domains.json'),
+                               page_store_dir=os.getenv('QA_PAGE_STORE_DIR', 'page_store'))
     app.run()
 
 
@@ -0,0 +1,164 @@
+"""
+Near-duplicate detection for crawled sources
+
+Each page's text is reduced to a MinHash signature: the k smallest 64-bit
+hashes of its 5-word shingles (a bottom-k sketch, which needs one hash per
+shingle instead of k). Two pages whose estimated Jaccard similarity is above
+the threshold are the same article, and only the better-ranked copy is kept.
+
+Domains whose pages keep turning out to be copies are remembered in a small
+JSON file so their search results can be skipped before crawling. Only
+freshly crawled pages count (not ones served again from the local index or
+the page store), and the counts decay with a half-life: a skipped domain gets
+no new counts, so decay is what lets it back in once its record fades below
+min_pages and its pages can be judged again.
+"""
+
+import hashlib
+import heapq
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+WORD_PATTERN = re.compile(r"\w+")
+HALF_LIFE = float(os.getenv('QA_DUPLICATE_HALF_LIFE', str(7 * 86400)))  # seconds for domain counts to halve
+REUSED_ATTEMPTS = ('local', 'cache')  # sources not crawled just now, so already counted
+
+
+def signature(text, shingle_size=5, k=128):
+    """Bottom-k MinHash signature of a text, as a sorted tuple of hashes"""
+    words = WORD_PATTERN.findall(text.lower())
+    shingles = {' '.join(words[i:i + shingle_size]) for i in range(max(1, len(words) - shingle_size + 1))}
+    hashes = {int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size=8).digest(), 'big')
+              for s in shingles if s}
+    return tuple(heapq.nsmallest(k, hashes))
+
+
+def similarity(a, b, k=128):
+    """Estimated Jaccard similarity of the texts behind two signatures"""
+    if not a or not b:
+        return 0.0
+    union = heapq.nsmallest(k, set(a) | set(b))
+    both = set(a) & set(b)
+    return sum(1 for h in union if h in both) / len(union)
+
+
+def domain_of(url):
+    host = (urlsplit(url).hostname or '').lower()
+    return host[4:] if host.startswith('www.') else host
+
+
+class DuplicateDetector:
+    def __init__(self, path='duplicate_domains.json', threshold=0.8, min_pages=3, flag_ratio=0.5,
+                 half_life=HALF_LIFE):
+        """
+        Initialize the detector
+
+        Args:
+            path: JSON file with per-domain page and duplicate counts (None keeps them in memory)
+            threshold: Estimated Jaccard similarity above which two pages are duplicates
+            min_pages: Pages seen from a domain before it can be flagged
+            flag_ratio: Share of a domain's pages that were duplicates for it to be flagged
+            half_life: Seconds after which a domain's counts weigh half as much
+        """
+        self.path = path
+        self.threshold = threshold
+        self.min_pages = min_pages
+        self.flag_ratio = flag_ratio
+        self.half_life = half_life
+        self.lock = threading.Lock()
+        self.domains = {}  # domain -> [pages seen, pages that were duplicates, unix time of those counts]
+
+        if path and os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                loaded = json.load(f)
+            # Files from before decay hold just [seen, duplicated]
+            now = time.time()
+            self.domains = {domain: counts if len(counts) == 3 else [*counts, now] for domain, counts in loaded.items()}
+
+    def _counts(self, domain, now):
+        """A domain's (seen, duplicated), decayed to now"""
+        seen, duplicated, updated = self.domains.get(domain, (0, 0, now))
+        weight = 0.5 ** (max(0.0, now - updated) / self.half_life)
+        return seen * weight, duplicated * weight
+
+    def _flagged(self, seen, duplicated):
+        # Decay makes counts fractional; a domain stays flagged until it has decayed by half a page
+        return round(seen) >= max(1, self.min_pages) and duplicated / seen >= self.flag_ratio
+
+    def _count(self, url, duplicate, now):
+        domain = domain_of(url)
+        seen, duplicated = self._counts(domain, now)
+        self.domains[domain] = [round(seen + 1, 3), round(duplicated + duplicate, 3), now]
+
+    def collapse(self, sources):
+        """
+        Drop near-duplicate sources, keeping the first copy of each
+
+        Args:
+            sources: Reference content dicts (title, url, text, error, ...) in rank order
+
+        Returns:
+            (kept sources, list of (dropped source, source it duplicates))
+        """
+        kept = []
+        signatures = []
+        duplicates = []
+
+        for source in sources:
+            text = source['text']
+            if not text or source['error'] is not None:
+                kept.append(source)
+                continue
+
+            source_signature = signature(text)
+            original = next((other for other, other_signature in signatures
+                             if similarity(source_signature, other_signature) >= self.threshold), None)
+            if original is None:
+                kept.append(source)
+                signatures.append((source, source_signature))
+            else:
+                duplicates.append((source, original))
+
+        now = time.time()
+        with self.lock:
+            for source, _ in signatures:
+                if source.get('attempt') not in REUSED_ATTEMPTS:
+                    self._count(source['url'], False, now)
+            for source, _ in duplicates:
+                if source.get('attempt') not in REUSED_ATTEMPTS:
+                    self._count(source['url'], True, now)
+        if duplicates:
+            self.save()
+
+        return kept, duplicates
+
+    def is_duplicate_prone(self, url):
+        """True if pages from this URL's domain have mostly been copies of other results"""
+        with self.lock:
+            return self._flagged(*self._counts(domain_of(url), time.time()))
+
+    def flagged_domains(self):
+        now = time.time()
+        with self.lock:
+            return sorted(domain for domain in self.domains if self._flagged(*self._counts(domain, now)))
+
+    def save(self):
+        if not self.path:
+            return
+        with self.lock:
+            data = json.dumps(self.domains)
+        # A temporary file of its own, so concurrent saves (threads or processes) never replace each other's
+        descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)),
+                                                 prefix=os.path.basename(self.path), suffix='.tmp')
+        try:
+            with open(descriptor, 'w', encoding='utf-8') as f:
+                f.write(data)
+            os.replace(temporary, self.path)
+        except BaseException:
+            os.unlink(temporary)
+            raise
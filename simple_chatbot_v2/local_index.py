@@ -0,0 +1,344 @@
+"""
+Local full-text index over crawled pages
+
+Every crawled page is appended to docs.jsonl and tokenized into an in-memory
+buffer. Once the buffer holds enough documents it is written out as an
+immutable segment:
+
+    seg-NNNNNN.post   postings as uint32 (doc id, term frequency) pairs, grouped by term
+    seg-NNNNNN.terms  JSON {term: [first pair, pair count]}
+
+Segment postings are mmap'd rather than read, so a large index costs little
+RAM. Segments cover consecutive document ids; whenever merge_factor of them
+in a row are about the same size they are merged into one, dropping replaced
+documents, so the segment count only grows with the log of the index size.
+
+manifest.json lists the segments and lengths.bin holds the token count of
+every flushed document (uint32), so startup reads docs.jsonl only for offsets
+and URLs. Documents appended after the last flush are re-tokenized on
+startup, so nothing is lost if the process dies before flushing. Queries are
+ranked with BM25 over live documents only.
+"""
+
+import json
+import math
+import mmap
+import os
+import re
+import threading
+from array import array
+from collections import Counter
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset("""
+a about an and are as at be but by can do does for from has have how i if in is it its
+of on or so than that the their there these this to was what when where which who why
+will with you your
+""".split())
+
+
+def tokenize(text):
+    """Lowercase word tokens without stopwords"""
+    return [t for t in TOKEN_PATTERN.findall(text.lower()) if len(t) > 1 and t not in STOPWORDS]
+
+
+class Segment:
+    """A flushed, read-only part of the index"""
+
+    def __init__(self, directory, name, docs):
+        self.name = name
+        self.docs = docs
+        with open(os.path.join(directory, f"{name}.terms"), encoding='utf-8') as f:
+            self.terms = json.load(f)
+
+        self.file = open(os.path.join(directory, f"{name}.post"), 'rb')
+        size = os.fstat(self.file.fileno()).st_size
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        self.pairs = memoryview(self.map).cast('I') if self.map else memoryview(array('I'))
+
+    def postings(self, term):
+        """Yield (doc id, term frequency) for a term"""
+        entry = self.terms.get(term)
+        if not entry:
+            return
+        start, count = entry
+        pairs = self.pairs[start * 2:(start + count) * 2]
+        for i in range(0, len(pairs), 2):
+            yield pairs[i], pairs[i + 1]
+
+    def close(self):
+        self.pairs.release()
+        if self.map:
+            self.map.close()
+        self.file.close()
+
+
+def write_segment(directory, name, postings_by_term):
+    """
+    Write a segment from (term, postings) in term order; postings are (doc id, frequency) lists
+
+    Returns the number of distinct documents in it.
+    """
+    terms = {}
+    docs = set()
+    written = 0
+    with open(os.path.join(directory, f"{name}.post"), 'wb') as f:
+        for term, postings in postings_by_term:
+            if not postings:
+                continue
+            terms[term] = [written, len(postings)]
+            pairs = array('I')
+            for doc_id, frequency in postings:
+                pairs.append(doc_id)
+                pairs.append(frequency)
+                docs.add(doc_id)
+            pairs.tofile(f)
+            written += len(postings)
+    with open(os.path.join(directory, f"{name}.terms"), 'w', encoding='utf-8') as f:
+        json.dump(terms, f)
+    return len(docs)
+
+
+class LocalIndex:
+    def __init__(self, directory, flush_every=50, merge_factor=8, k1=1.2, b=0.75):
+        """
+        Open (or create) an index directory
+
+        Args:
+            directory: Where the index files live
+            flush_every: Documents buffered in memory before a segment is written
+            merge_factor: Segments of about the same size that are merged into one
+            k1: BM25 term frequency saturation
+            b: BM25 length normalization
+        """
+        self.directory = directory
+        self.flush_every = flush_every
+        self.merge_factor = merge_factor
+        self.k1 = k1
+        self.b = b
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+        self.docs_path = os.path.join(directory, 'docs.jsonl')
+        self.manifest_path = os.path.join(directory, 'manifest.json')
+        self.lengths_path = os.path.join(directory, 'lengths.bin')
+
+        self.doc_offsets = array('Q')
+        self.doc_lengths = array('I')
+        self.deleted = set()
+        self.live_length = 0  # tokens in all live documents
+        self.url_to_doc = {}
+        self.segments = []
+        self.buffer = {}
+        self.buffered_docs = 0
+
+        manifest = {'segments': [], 'flushed_docs': 0}
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, encoding='utf-8') as f:
+                manifest = json.load(f)
+        self.flushed_docs = manifest['flushed_docs']
+        # Older manifests list bare segment names without document counts
+        entries = [entry if isinstance(entry, list) else [entry, flush_every] for entry in manifest['segments']]
+        self.next_segment = manifest.get('next_segment', len(entries) + 1)
+        self.segments = [Segment(directory, name, docs) for name, docs in entries]
+
+        self._load_docs()
+        self.docs_file = open(self.docs_path, 'ab')
+
+    def _load_docs(self):
+        if not os.path.exists(self.docs_path):
+            return
+
+        lengths = array('I')
+        if os.path.exists(self.lengths_path):
+            with open(self.lengths_path, 'rb') as f:
+                lengths.frombytes(f.read())
+        # lengths.bin may run past the last recorded flush if the process died in between
+        del lengths[self.flushed_docs:]
+
+        with open(self.docs_path, 'rb') as f:
+            offset = 0
+            for line in f:
+                record = json.loads(line)
+                if 'deleted' in record:
+                    self.deleted.add(record['deleted'])
+                else:
+                    doc_id = len(self.doc_offsets)
+                    self.doc_offsets.append(offset)
+                    self.url_to_doc[record['url']] = doc_id
+                    if doc_id < len(lengths):
+                        self.doc_lengths.append(lengths[doc_id])
+                    else:
+                        tokens = tokenize(record['text'])
+                        self.doc_lengths.append(len(tokens))
+                        # Documents added after the last flush go back into the buffer
+                        if doc_id >= self.flushed_docs:
+                            self._buffer_tokens(doc_id, tokens)
+                offset += len(line)
+
+        self.live_length = sum(self.doc_lengths) - sum(self.doc_lengths[doc_id] for doc_id in self.deleted)
+        if len(lengths) < self.flushed_docs:
+            self._write_lengths(0)
+
+    def _buffer_tokens(self, doc_id, tokens):
+        for term, frequency in Counter(tokens).items():
+            self.buffer.setdefault(term, []).append((doc_id, frequency))
+        self.buffered_docs += 1
+
+    @property
+    def live_docs(self):
+        return len(self.doc_offsets) - len(self.deleted)
+
+    def add(self, url, title, text):
+        """Index a crawled page; a re-crawl of the same URL replaces the old copy"""
+        tokens = tokenize(text)
+        if not tokens:
+            return
+
+        with self.lock:
+            old_doc = self.url_to_doc.get(url)
+            if old_doc is not None:
+                if self.get(old_doc)['text'] == text:
+                    return
+                self.docs_file.write(json.dumps({'deleted': old_doc}).encode('utf-8') + b"\n")
+                self.deleted.add(old_doc)
+                self.live_length -= self.doc_lengths[old_doc]
+
+            doc_id = len(self.doc_offsets)
+            self.doc_offsets.append(self.docs_file.tell())
+            self.doc_lengths.append(len(tokens))
+            self.live_length += len(tokens)
+            self.url_to_doc[url] = doc_id
+            self.docs_file.write(json.dumps({'url': url, 'title': title, 'text': text}).encode('utf-8') + b"\n")
+            self.docs_file.flush()
+
+            self._buffer_tokens(doc_id, tokens)
+            if self.buffered_docs >= self.flush_every:
+                self._flush()
+
+    def get(self, doc_id):
+        """Load a stored document"""
+        with open(self.docs_path, 'rb') as f:
+            f.seek(self.doc_offsets[doc_id])
+            return json.loads(f.readline())
+
+    def flush(self):
+        """Write buffered documents out as a new segment"""
+        with self.lock:
+            self._flush()
+
+    def _new_segment_name(self):
+        name = f"seg-{self.next_segment:06d}"
+        self.next_segment += 1
+        return name
+
+    def _flush(self):
+        if not self.buffer:
+            return
+
+        name = self._new_segment_name()
+        docs = write_segment(self.directory, name, ((term, self.buffer[term]) for term in sorted(self.buffer)))
+
+        self.segments.append(Segment(self.directory, name, docs))
+        self.buffer = {}
+        self.buffered_docs = 0
+        self._write_lengths(self.flushed_docs)
+        self.flushed_docs = len(self.doc_offsets)
+        self._write_manifest()
+        self._merge_segments()
+
+    def _write_lengths(self, start):
+        """Append the lengths of documents start..len-1 to lengths.bin (rewriting it when start is 0)"""
+        with open(self.lengths_path, 'ab' if start else 'wb') as f:
+            if start:
+                f.truncate(start * self.doc_lengths.itemsize)
+            self.doc_lengths[start:].tofile(f)
+
+    def _tier(self, segment):
+        """Size class of a segment: 0 up to merge_factor flushes' worth of documents, then 1, ..."""
+        tier, size = 0, self.flush_every * self.merge_factor
+        while segment.docs >= size:
+            tier, size = tier + 1, size * self.merge_factor
+        return tier
+
+    def _merge_segments(self):
+        """Merge the newest merge_factor segments while they are all in the same size tier"""
+        while len(self.segments) >= self.merge_factor:
+            merging = self.segments[-self.merge_factor:]
+            if len({self._tier(segment) for segment in merging}) > 1:
+                return
+
+            terms = sorted(set().union(*(segment.terms for segment in merging)))
+            # Segments hold consecutive doc ids, so concatenating keeps postings in doc order
+            postings = ((term, [(doc_id, frequency) for segment in merging for doc_id, frequency in
+                                segment.postings(term) if doc_id not in self.deleted])
+                        for term in terms)
+            name = self._new_segment_name()
+            docs = write_segment(self.directory, name, postings)
+
+            self.segments[-self.merge_factor:] = [Segment(self.directory, name, docs)]
+            self._write_manifest()
+            for segment in merging:
+                segment.close()
+                for extension in ('post', 'terms'):
+                    os.remove(os.path.join(self.directory, f"{segment.name}.{extension}"))
+            print(f"[local_index] merged {len(merging)} segments into {name} ({docs} documents)")
+
+    def _write_manifest(self):
+        temporary = self.manifest_path + '.tmp'
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump({'segments': [[s.name, s.docs] for s in self.segments], 'flushed_docs': self.flushed_docs,
+                       'next_segment': self.next_segment}, f)
+        os.replace(temporary, self.manifest_path)
+
+    def search(self, query, k=5):
+        """
+        Rank documents for a query with BM25
+
+        Returns up to k dicts with url, title, text, score and coverage (the
+        share of distinct query terms the document contains).
+        """
+        query_terms = set(tokenize(query))
+        if not query_terms:
+            return []
+
+        with self.lock:
+            total_docs = self.live_docs
+            if total_docs <= 0:
+                return []
+            average_length = (self.live_length / total_docs) or 1.0
+
+            scores = Counter()
+            matched = {}
+            for term in query_terms:
+                sources = [s.postings(term) for s in self.segments] + [iter(self.buffer.get(term, ()))]
+                live = [(doc_id, frequency) for postings in sources for doc_id, frequency in postings
+                        if doc_id not in self.deleted]
+                if not live:
+                    continue
+                idf = math.log(1 + (total_docs - len(live) + 0.5) / (len(live) + 0.5))
+
+                for doc_id, frequency in live:
+                    length_norm = 1 - self.b + self.b * self.doc_lengths[doc_id] / average_length
+                    scores[doc_id] += idf * frequency * (self.k1 + 1) / (frequency + self.k1 * length_norm)
+                    matched[doc_id] = matched.get(doc_id, 0) + 1
+
+            results = []
+            for doc_id, score in scores.most_common(k):
+                document = self.get(doc_id)
+                results.append({
+                    'url': document['url'],
+                    'title': document['title'],
+                    'text': document['text'],
+                    'score': score,
+                    'coverage': matched[doc_id] / len(query_terms),
+                })
+            return results
+
+    def close(self):
+        self.flush()
+        with self.lock:
+            self.docs_file.close()
+            for segment in self.segments:
+                segment.close()
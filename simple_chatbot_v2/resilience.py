@@ -0,0 +1,311 @@
+"""
+Circuit breakers, retry budgets and typed crawl results for upstream calls
+
+Each upstream (Google, ZenRows, OpenAI) gets an Upstream: a circuit breaker
+plus retries with jittered exponential backoff.
+
+- The breaker watches the last `window` calls. Once at least min_calls of them
+  ran and failure_ratio of them failed (timeouts, connection errors, 5xx), it
+  opens: calls fail at once with CircuitOpen instead of tying up a thread and
+  a socket for the full timeout. After reset_timeout seconds a single probe
+  call goes through (half-open); if it succeeds the breaker closes, otherwise
+  it stays open for another reset_timeout.
+- Retries wait a random time between 0 and base_delay * 2**attempt (full
+  jitter, so clients that failed together don't retry together) and each one
+  has to be paid for from a RetryBudget shared by every upstream. Every first
+  attempt adds `ratio` of a token, every retry takes one, so retries stay
+  around ratio of all traffic no matter how many calls fail, instead of
+  multiplying load on an upstream that is already struggling.
+
+Only failures of the upstream itself count. A 404 for one page or a rejected
+API key is an answer, not an outage; it neither trips the breaker nor is retried.
+A single ZenRows read timeout usually means the target site is slow, so it
+only counts once read timeouts span several different sites in a short window
+(SpreadFailures): then ZenRows itself is the slow part.
+"""
+
+import random
+import threading
+import time
+from collections import deque
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+
+class CircuitOpen(Exception):
+    """Raised instead of calling an upstream whose breaker is open"""
+
+
+class Failure:
+    """
+    Why a call produced no result
+
+    kind is 'timeout', 'unavailable' (connection error, 5xx or an open breaker),
+    'http_error' (an answer other than 200) or 'error' (anything else).
+    """
+
+    def __init__(self, kind, message, status=None):
+        self.kind = kind
+        self.message = message
+        self.status = status
+
+    def __str__(self):
+        return self.message
+
+    def __repr__(self):
+        return f"Failure({self.kind!r}, {self.message!r})"
+
+
+class CrawlResult:
+    """The text of a crawled page, or the Failure that kept it from being crawled"""
+
+    def __init__(self, text=None, failure=None):
+        self.text = text
+        self.failure = failure
+
+    @property
+    def ok(self):
+        return self.failure is None
+
+    @classmethod
+    def failed(cls, kind, message, status=None):
+        return cls(failure=Failure(kind, message, status))
+
+
+class RetryBudget:
+    def __init__(self, ratio=0.1, min_per_second=1.0, max_tokens=50.0):
+        """
+        Retries allowed across all upstreams
+
+        Args:
+            ratio: Retries allowed per first attempt
+            min_per_second: Retries always allowed per second, so quiet periods can still retry
+            max_tokens: Most retries that can be saved up
+        """
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+        self.spent = 0
+        self.denied = 0
+
+    def _refill(self, amount):
+        now = time.monotonic()
+        self.tokens = min(self.max_tokens, self.tokens + amount + (now - self.updated) * self.min_per_second)
+        self.updated = now
+
+    def deposit(self):
+        """Count a first attempt"""
+        with self.lock:
+            self._refill(self.ratio)
+
+    def withdraw(self):
+        """Take one retry from the budget; False if it is spent"""
+        with self.lock:
+            self._refill(0.0)
+            if self.tokens < 1:
+                self.denied += 1
+                return False
+            self.tokens -= 1
+            self.spent += 1
+            return True
+
+    def status(self):
+        with self.lock:
+            self._refill(0.0)
+            return {'tokens': round(self.tokens, 1), 'retries': self.spent, 'denied': self.denied}
+
+
+class CircuitBreaker:
+    def __init__(self, name, window=20, min_calls=5, failure_ratio=0.5, reset_timeout=30.0, on_change=None):
+        """
+        Initialize the breaker
+
+        Args:
+            name: Upstream name, for messages
+            window: Recent calls the failure ratio is computed over
+            min_calls: Calls in the window before the breaker can open
+            failure_ratio: Share of failed calls that opens the breaker
+            reset_timeout: Seconds open before a probe call is let through
+            on_change: Optional callback(state) when the breaker opens or closes
+        """
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_ratio = failure_ratio
+        self.reset_timeout = reset_timeout
+        self.on_change = on_change
+        self.lock = threading.Lock()
+        self.state = CLOSED
+        self.outcomes = deque(maxlen=window)  # True for a failed call
+        self.opened_at = 0.0
+        self.probing = False
+        self.rejected = 0
+
+    def allow(self):
+        """Raise CircuitOpen unless a call may go out now; pair every allowed call with record() or discard()"""
+        with self.lock:
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+            if self.state == CLOSED:
+                return
+            if self.state == HALF_OPEN and not self.probing:
+                self.probing = True
+                return
+            self.rejected += 1
+            retry_in = max(0.0, self.opened_at + self.reset_timeout - time.monotonic())
+            raise CircuitOpen(f"{self.name} is unavailable (circuit open, next probe in {retry_in:.0f}s)")
+
+    def record(self, failed):
+        """Report the outcome of an allowed call"""
+        changed = None
+        with self.lock:
+            if self.state == HALF_OPEN:
+                self.probing = False
+                if failed:
+                    self.state, self.opened_at, changed = OPEN, time.monotonic(), OPEN
+                else:
+                    self.state, changed = CLOSED, CLOSED
+                    self.outcomes.clear()
+            elif self.state == CLOSED:
+                self.outcomes.append(failed)
+                failures = sum(self.outcomes)
+                if len(self.outcomes) >= self.min_calls and failures / len(self.outcomes) >= self.failure_ratio:
+                    self.state, self.opened_at, changed = OPEN, time.monotonic(), OPEN
+
+        if changed:
+            print(f"[breaker] {self.name} circuit {changed}")
+            if self.on_change:
+                self.on_change(changed)
+
+    def discard(self):
+        """Give back an allowed call that ended without an outcome (e.g. an abandoned stream)"""
+        with self.lock:
+            if self.state == HALF_OPEN:
+                self.probing = False
+
+    def status(self):
+        with self.lock:
+            return {
+                'upstream': self.name,
+                'state': self.state,
+                'recent_calls': len(self.outcomes),
+                'recent_failures': sum(self.outcomes),
+                'rejected': self.rejected,
+            }
+
+
+class SpreadFailures:
+    def __init__(self, min_keys=3, window=60.0):
+        """
+        Failures that only count as an outage once they repeat across several keys
+
+        Args:
+            min_keys: Distinct keys (e.g. target domains) that must have failed
+            window: Seconds a key's last failure is remembered
+        """
+        self.min_keys = min_keys
+        self.window = window
+        self.lock = threading.Lock()
+        self.last_failed = {}  # key -> monotonic time of its latest failure
+
+    def add(self, key):
+        """Record a failure for key; True if min_keys distinct keys have failed within the window"""
+        now = time.monotonic()
+        with self.lock:
+            self.last_failed[key] = now
+            for stale in [k for k, at in self.last_failed.items() if at <= now - self.window]:
+                del self.last_failed[stale]
+            return len(self.last_failed) >= self.min_keys
+
+
+def backoff_delay(attempt, base_delay, max_delay):
+    """Full-jitter exponential backoff: uniform between 0 and base_delay * 2**attempt"""
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+
+class Upstream:
+    def __init__(self, name, budget, is_failure, attempts=3, base_delay=0.25, max_delay=4.0, on_event=None,
+                 **breaker_options):
+        """
+        A dependency called through a circuit breaker, with budgeted retries
+
+        Args:
+            name: Upstream name, for messages and counters
+            budget: RetryBudget shared with the other upstreams
+            is_failure: is_failure(exception) -> True if the exception means the upstream
+                        itself failed (tripping the breaker and worth a retry)
+            attempts: Most attempts per call, the first included
+            base_delay: Backoff before the first retry (the upper bound of its jitter)
+            max_delay: Longest backoff
+            on_event: Optional callback(event) for 'retry', 'retry_denied', 'circuit_rejected',
+                      'circuit_open' and 'circuit_closed'
+            **breaker_options: Passed to CircuitBreaker
+        """
+        self.name = name
+        self.budget = budget
+        self.is_failure = is_failure
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.on_event = on_event or (lambda event: None)
+        self.breaker = CircuitBreaker(name, on_change=lambda state: self.on_event(f"circuit_{state}"),
+                                      **breaker_options)
+
+    def allow(self):
+        """Check the breaker for a call made outside call() (e.g. a stream); pair with record() or discard()"""
+        try:
+            self.breaker.allow()
+        except CircuitOpen:
+            self.on_event('circuit_rejected')
+            raise
+
+    def record(self, exception=None):
+        self.breaker.record(exception is not None and self.is_failure(exception))
+
+    def discard(self):
+        self.breaker.discard()
+
+    def call(self, function, timeout=None):
+        """
+        Call function(remaining seconds or None) through the breaker, retrying upstream failures
+
+        Retries stop when the attempts, the retry budget or the timeout run out,
+        or when the breaker opens in between; the last exception is then raised.
+        Raises CircuitOpen without calling anything while the breaker is open.
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        self.budget.deposit()
+        attempt = 0
+        last_error = None
+        while True:
+            try:
+                self.allow()
+            except CircuitOpen:
+                if last_error is None:
+                    raise
+                raise last_error
+            try:
+                result = function(None if deadline is None else max(0.01, deadline - time.monotonic()))
+            except Exception as e:
+                self.record(e)
+                if not self.is_failure(e) or attempt + 1 >= self.attempts:
+                    raise
+                delay = backoff_delay(attempt, self.base_delay, self.max_delay)
+                if deadline is not None and time.monotonic() + delay >= deadline:
+                    raise
+                if not self.budget.withdraw():
+                    self.on_event('retry_denied')
+                    raise
+                self.on_event('retry')
+                last_error = e
+                time.sleep(delay)
+                attempt += 1
+                continue
+            self.record()
+            return result
+
+    def status(self):
+        return self.breaker.status()
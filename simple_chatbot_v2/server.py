@@ -0,0 +1,178 @@
+"""
+HTTP service for the QA pipeline
+
+POST /ask {"question": "...", "num_sources": 5} streams the pipeline's
+progress as Server-Sent Events, so a frontend can show something within a
+second instead of waiting for the whole answer (num_sources is optional and
+capped at QA_MAX_SOURCES):
+
+    {"type": "local_sources", "sources": [...]}    pages found in the local index
+    {"type": "search_term", "search_term": "..."}
+    {"type": "search_results", "results": [...]}
+    {"type": "source", ...}                         each crawled source as it completes (crawls start
+                                                    while searching, so some may come before search_results)
+    {"type": "token", "content": "..."}             answer text as it is generated
+    {"type": "done"} or {"type": "error", "error": "..."}
+
+GET /metrics returns the pipeline's Prometheus metrics, including which upstream circuits are open.
+
+All requests share one QuestionAnsweringApp (HTTP session pools, OpenAI
+client, key pools, local index, page store) and one worker pool for running pipelines.
+The local index and page store belong to one process, so serve with a single worker:
+
+    python ../asgi_server/app.py server.py:app --workers 1
+"""
+
+from quart import Quart, request, Response, jsonify
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import json
+import os
+import threading
+
+from app import Cancelled, QuestionAnsweringApp
+
+app = Quart(__name__)
+
+PIPELINE_WORKERS = int(os.getenv('QA_SERVER_WORKERS', '16'))
+MAX_SOURCES = int(os.getenv('QA_MAX_SOURCES', '10'))  # most num_sources a request may ask for
+EXCERPT_LENGTH = 300
+
+qa = QuestionAnsweringApp(
+    os.getenv('OPENAI_API_KEY', ''),
+    os.getenv('GOOGLE_API_KEY', ''),
+    os.getenv('GOOGLE_CSE_ID', ''),
+    os.getenv('ZENROWS_API_KEY', ''),
+    prompt_layout=os.getenv('QA_PROMPT_LAYOUT', 'cache_friendly'),
+    index_dir=os.getenv('QA_INDEX_DIR', 'local_index'),
+    duplicate_domains_path=os.getenv('QA_DUPLICATE_DOMAINS', 'duplicate_domains.json'),
+    page_store_dir=os.getenv('QA_PAGE_STORE_DIR', 'page_store')
+)
+pipelines = ThreadPoolExecutor(max_workers=PIPELINE_WORKERS, thread_name_prefix='qa-pipeline')
+
+
+def describe_source(source):
+    """A crawled or indexed source without its full text"""
+    text = source['text'] or ''
+    failure = source['error']
+    ok = failure is None and bool(text)
+    return {
+        'index': source['index'],
+        'title': source['title'],
+        'url': source['url'],
+        'attempt': source['attempt'],
+        'crawl_time': round(source['crawl_time'], 3),
+        'ok': ok,
+        'excerpt': text[:EXCERPT_LENGTH] if ok else None,
+        'error': None if ok else str(failure or "Page has no text"),
+        'error_kind': failure.kind if failure else None,
+    }
+
+
+def to_event(event, data):
+    if event == 'local_sources':
+        return {'type': event, 'sources': [describe_source(source) for source in data]}
+    if event == 'search_term':
+        return {'type': event, 'search_term': data}
+    if event == 'search_results':
+        return {'type': event, 'results': [{'title': r['title'], 'url': r['link']} for r in data]}
+    if event == 'source':
+        return {'type': event, **describe_source(data)}
+    if event == 'token':
+        return {'type': event, 'content': data}
+    if event == 'error':
+        return {'type': event, 'error': data}
+    return {'type': event}
+
+
+def run_pipeline(question, num_sources, emit, cancelled):
+    """Runs on the worker pool; every stage is reported through emit"""
+    try:
+        with qa.telemetry.span('question'):
+            reference_content = qa.gather_reference_content(question, num_sources, progress=emit,
+                                                            cancelled=cancelled)
+            if reference_content is None:
+                emit('error', "No search results found")
+                return
+            if cancelled.is_set():
+                return
+
+            for content in qa.stream_answer_from_openai(question, reference_content):
+                if cancelled.is_set():
+                    return
+                emit('token', content)
+        emit('done', None)
+    except Cancelled:
+        pass
+    except Exception as e:
+        emit('error', str(e))
+    finally:
+        emit(None, None)
+
+
+@app.after_serving
+async def shutdown():
+    pipelines.shutdown(wait=False, cancel_futures=True)
+    qa.local_index.close()
+    if qa.page_store is not None:
+        qa.page_store.close()
+
+
+@app.route('/ask', methods=['POST'])
+async def ask():
+    data = await request.get_json()
+    question = (data or {}).get('question', '').strip()
+
+    if not question:
+        return jsonify({"error": "Question is required"}), 400
+
+    try:
+        num_sources = int(data.get('num_sources', 5))
+    except (TypeError, ValueError):
+        num_sources = 0
+    if num_sources < 1:
+        return jsonify({"error": "num_sources must be a positive integer"}), 400
+    num_sources = min(num_sources, MAX_SOURCES)
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue()
+    cancelled = threading.Event()
+
+    def emit(event, payload):
+        loop.call_soon_threadsafe(events.put_nowait, (event, payload))
+
+    pipelines.submit(run_pipeline, question, num_sources, emit, cancelled)
+
+    async def generate_events():
+        try:
+            while True:
+                event, payload = await events.get()
+                if event is None:
+                    break
+                yield f"data: {json.dumps(to_event(event, payload))}\n\n"
+        finally:
+            # Client went away (or the stream ended); stop generating the answer
+            cancelled.set()
+
+    return Response(
+        generate_events(),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'Connection': 'keep-alive',
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Allow-Headers': 'Content-Type'
+        }
+    )
+
+
+@app.route('/metrics', methods=['GET'])
+async def metrics():
+    circuits = ["# TYPE qa_upstream_circuit_open gauge"] + [
+        f'qa_upstream_circuit_open{{upstream="{upstream.name}"}} {int(upstream.status()["state"] != "closed")}'
+        for upstream in (qa.google, qa.zenrows, qa.openai)
+    ]
+    return Response(qa.telemetry.export_prometheus() + "\n".join(circuits) + "\n", mimetype='text/plain')
+
+
+if __name__ == "__main__":
+    app.run()
@@ -0,0 +1,287 @@
+"""
+Lightweight tracing and metrics for the question answering pipeline
+
+Spans are timed with the monotonic clock and nest per thread; work handed to
+another thread can name its parent span explicitly. Every finished span also
+feeds a latency histogram for its name, so stage timings are collected even
+when the spans themselves have rotated out of the buffer.
+
+Everything can be exported as Prometheus text or as OpenTelemetry (OTLP/JSON)
+compatible documents. Recording is a few integer operations under a lock, so
+it is cheap enough to leave on all the time.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Upper bounds (seconds) reported for Prometheus / OTLP histograms
+EXPORT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class LatencyHistogram:
+    """
+    HDR-style latency histogram
+
+    Values are recorded in microseconds into power-of-two ranges, each split
+    into 2**sub_bucket_bits linear sub-buckets, which keeps the relative error
+    bounded (about 12% with the default 3 bits) across any range of values.
+    """
+
+    def __init__(self, sub_bucket_bits=3):
+        self.sub_bucket_bits = sub_bucket_bits
+        self.sub_bucket_count = 1 << sub_bucket_bits
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def _bucket_index(self, value):
+        exponent = value.bit_length() - 1
+        if exponent < self.sub_bucket_bits:
+            return value
+        sub_bucket = (value >> (exponent - self.sub_bucket_bits)) & (self.sub_bucket_count - 1)
+        return (exponent - self.sub_bucket_bits + 1) * self.sub_bucket_count + sub_bucket
+
+    def _bucket_upper_bound(self, index):
+        if index < self.sub_bucket_count:
+            return index
+        exponent = index // self.sub_bucket_count + self.sub_bucket_bits - 1
+        sub_bucket = index % self.sub_bucket_count
+        width = 1 << (exponent - self.sub_bucket_bits)
+        return (self.sub_bucket_count + sub_bucket + 1) * width - 1
+
+    def record(self, seconds):
+        """Record one latency given in seconds"""
+        value = max(0, int(seconds * 1_000_000))
+        index = self._bucket_index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, percentile):
+        """Return the given percentile in seconds (0 if nothing was recorded)"""
+        if not self.count:
+            return 0.0
+
+        target = max(1, round(percentile / 100 * self.count))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                return min(self._bucket_upper_bound(index), self.max) / 1_000_000
+        return self.max / 1_000_000
+
+    def cumulative_counts(self, bounds=EXPORT_BUCKETS):
+        """Cumulative counts at each upper bound (seconds), as used by Prometheus"""
+        cumulative = []
+        for bound in bounds:
+            limit = bound * 1_000_000
+            cumulative.append(sum(c for i, c in self.counts.items() if self._bucket_upper_bound(i) <= limit))
+        return cumulative
+
+
+class Span:
+    """A timed pipeline stage"""
+
+    def __init__(self, name, trace_id, parent=None, attributes=None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent = parent
+        self.attributes = dict(attributes or {})
+        self.start_ns = time.perf_counter_ns()
+        self.end_ns = None
+        self.error = None
+
+    @property
+    def duration(self):
+        """Duration in seconds (up to now if the span is still open)"""
+        end_ns = self.end_ns if self.end_ns is not None else time.perf_counter_ns()
+        return (end_ns - self.start_ns) / 1_000_000_000
+
+    def set(self, key, value):
+        """Attach an attribute to the span"""
+        self.attributes[key] = value
+
+
+class Telemetry:
+    def __init__(self, service_name, max_spans=2000):
+        """
+        Initialize the collector
+
+        Args:
+            service_name: Reported as the OpenTelemetry service.name resource attribute
+            max_spans: Number of finished spans kept for export
+        """
+        self.service_name = service_name
+        self.spans = deque(maxlen=max_spans)
+        self.histograms = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        # Maps the monotonic clock onto wall-clock time for exported timestamps
+        self.wall_offset_ns = time.time_ns() - time.perf_counter_ns()
+
+    def current_span(self):
+        """Return the innermost open span on this thread, if any"""
+        stack = getattr(self.local, 'stack', None)
+        return stack[-1] if stack else None
+
+    @contextmanager
+    def span(self, name, parent=None, **attributes):
+        """
+        Time a block of code as a span
+
+        Args:
+            name: Stage name; also used as the histogram label
+            parent: Parent span when the work runs on another thread
+            **attributes: Initial span attributes
+        """
+        parent = parent or self.current_span()
+        trace_id = parent.trace_id if parent else os.urandom(16).hex()
+        span = Span(name, trace_id, parent, attributes)
+
+        if not hasattr(self.local, 'stack'):
+            self.local.stack = []
+        self.local.stack.append(span)
+
+        try:
+            yield span
+        except Exception as e:
+            span.error = str(e)
+            raise
+        finally:
+            span.end_ns = time.perf_counter_ns()
+            self.local.stack.remove(span)
+            with self.lock:
+                self.spans.append(span)
+                histogram = self.histograms.get(name)
+                if histogram is None:
+                    histogram = self.histograms[name] = LatencyHistogram()
+                histogram.record(span.duration)
+
+    def count(self, name, value=1):
+        """Increment a counter"""
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def summary(self):
+        """Return p50/p90/p99 per stage and all counters"""
+        with self.lock:
+            stages = {
+                name: {
+                    'count': histogram.count,
+                    'p50': histogram.percentile(50),
+                    'p90': histogram.percentile(90),
+                    'p99': histogram.percentile(99),
+                }
+                for name, histogram in self.histograms.items()
+            }
+            return {'stages': stages, 'counters': dict(self.counters)}
+
+    def export_prometheus(self, prefix='qa'):
+        """Render histograms and counters in the Prometheus text exposition format"""
+        lines = []
+        with self.lock:
+            metric = f"{prefix}_stage_duration_seconds"
+            lines.append(f"# HELP {metric} Duration of pipeline stages")
+            lines.append(f"# TYPE {metric} histogram")
+            for name, histogram in sorted(self.histograms.items()):
+                for bound, cumulative in zip(EXPORT_BUCKETS, histogram.cumulative_counts()):
+                    lines.append(f'{metric}_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'{metric}_bucket{{stage="{name}",le="+Inf"}} {histogram.count}')
+                lines.append(f'{metric}_sum{{stage="{name}"}} {histogram.total / 1_000_000}')
+                lines.append(f'{metric}_count{{stage="{name}"}} {histogram.count}')
+
+            for name, value in sorted(self.counters.items()):
+                metric = f"{prefix}_{name}_total"
+                lines.append(f"# TYPE {metric} counter")
+                lines.append(f"{metric} {value}")
+
+        return "\n".join(lines) + "\n"
+
+    def export_otel_json(self):
+        """Build OTLP/JSON compatible span and metric documents"""
+        resource = {'attributes': [_otel_attribute('service.name', self.service_name)]}
+        scope = {'name': f"{self.service_name}.telemetry"}
+        now_ns = str(time.time_ns())
+
+        with self.lock:
+            spans = []
+            for span in self.spans:
+                otel_span = {
+                    'traceId': span.trace_id,
+                    'spanId': span.span_id,
+                    'name': span.name,
+                    'kind': 1,
+                    'startTimeUnixNano': str(span.start_ns + self.wall_offset_ns),
+                    'endTimeUnixNano': str(span.end_ns + self.wall_offset_ns),
+                    'attributes': [_otel_attribute(k, v) for k, v in span.attributes.items()],
+                    'status': {'code': 2, 'message': span.error} if span.error else {'code': 1},
+                }
+                if span.parent:
+                    otel_span['parentSpanId'] = span.parent.span_id
+                spans.append(otel_span)
+
+            metrics = [{
+                'name': 'qa.stage.duration',
+                'unit': 's',
+                'histogram': {
+                    'aggregationTemporality': 2,
+                    'dataPoints': [
+                        {
+                            'attributes': [_otel_attribute('stage', name)],
+                            'timeUnixNano': now_ns,
+                            'count': str(histogram.count),
+                            'sum': histogram.total / 1_000_000,
+                            'explicitBounds': list(EXPORT_BUCKETS),
+                            'bucketCounts': [str(c) for c in _bucket_counts(histogram)],
+                        }
+                        for name, histogram in sorted(self.histograms.items())
+                    ],
+                },
+            }]
+            for name, value in sorted(self.counters.items()):
+                metrics.append({
+                    'name': f"qa.{name}",
+                    'sum': {
+                        'aggregationTemporality': 2,
+                        'isMonotonic': True,
+                        'dataPoints': [{'timeUnixNano': now_ns, 'asInt': str(value)}],
+                    },
+                })
+
+        return {
+            'resourceSpans': [{'resource': resource, 'scopeSpans': [{'scope': scope, 'spans': spans}]}],
+            'resourceMetrics': [{'resource': resource, 'scopeMetrics': [{'scope': scope, 'metrics': metrics}]}],
+        }
+
+    def write_otel_json(self, path):
+        """Write the OTLP/JSON export to a file"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.export_otel_json(), f)
+
+
+def _otel_attribute(key, value):
+    if isinstance(value, bool):
+        return {'key': key, 'value': {'boolValue': value}}
+    if isinstance(value, int):
+        return {'key': key, 'value': {'intValue': str(value)}}
+    if isinstance(value, float):
+        return {'key': key, 'value': {'doubleValue': value}}
+    return {'key': key, 'value': {'stringValue': str(value)}}
+
+
+def _bucket_counts(histogram):
+    # OTLP wants per-bucket (not cumulative) counts, plus one for the overflow bucket
+    cumulative = histogram.cumulative_counts()
+    counts = [cumulative[0]] + [b - a for a, b in zip(cumulative, cumulative[1:])]
+    counts.append(histogram.count - cumulative[-1])
+    return counts
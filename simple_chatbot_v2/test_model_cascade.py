@@ -0,0 +1,58 @@
+"""Tests for the model cascade's confidence check (run with: python -m pytest simple_chatbot_v2)"""
+
+from types import SimpleNamespace
+
+import pytest
+
+from model_cascade import CascadePolicy, confidence
+
+# What ANSWER_INSTRUCTIONS asks for when the sources don't have the answer
+GROUNDED_ANSWERS = [
+    "The answer cannot be found in the reference content.",
+    "The provided sources do not contain information about the 2031 budget.",
+    "The reference content does not mention when the bridge was built [2].",
+    "Source 1 gives the population, but there is no information on its growth rate.",
+    "There is not enough information in the sources to say who won.",
+]
+
+HEDGED_ANSWERS = [
+    "I'm not sure, but it might be around 1900.",
+    "I don't know who invented it.",
+    "I am not certain which of these is correct.",
+]
+
+
+class FakeClient:
+    """Answers every create() with a fixed text and records the models asked"""
+
+    def __init__(self, text):
+        self.text = text
+        self.models = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model, **kwargs):
+        self.models.append(model)
+        message = SimpleNamespace(content=self.text)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message, logprobs=None)])
+
+
+@pytest.mark.parametrize('answer', GROUNDED_ANSWERS)
+def test_grounded_answers_are_not_hedges(answer):
+    assert confidence(answer) == 1.0
+
+    client = FakeClient(answer)
+    policy = CascadePolicy('test', small_model='small', large_model='large')
+    policy.complete(client, "When was it built?", messages=[])
+    assert client.models == ['small']
+    assert policy.outcomes['escalated'] == 0
+
+
+@pytest.mark.parametrize('answer', HEDGED_ANSWERS)
+def test_hedged_answers_escalate(answer):
+    assert confidence(answer) <= 0.3
+
+    client = FakeClient(answer)
+    policy = CascadePolicy('test', small_model='small', large_model='large')
+    policy.complete(client, "When was it built?", messages=[])
+    assert client.models == ['small', 'large']
+    assert policy.outcomes['escalated'] == 1
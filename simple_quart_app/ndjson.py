@@ -0,0 +1,146 @@
+"""
+Streaming NDJSON request bodies
+
+Quart reads a request body from the server as fast as it arrives and keeps
+whatever the handler hasn't consumed yet, so an upload that comes in faster
+than it is processed piles up in memory. For NDJSON uploads the request body
+is replaced with one that stops reading from the client while more than
+BODY_HIGH_WATER bytes are waiting, which pushes back through the server to
+the TCP connection. Records are then parsed line by line as the body arrives
+and handed out in batches, so memory stays flat whatever the upload size.
+
+Wire it into an app with:
+
+    app.request_class = StreamingRequest
+    app.asgi_http_class = BackpressureHTTPConnection
+"""
+
+import asyncio
+
+import orjson
+from quart.asgi import ASGIHTTPConnection
+from quart.wrappers import Request
+from quart.wrappers.request import Body
+from werkzeug.exceptions import BadRequest, RequestEntityTooLarge
+
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/jsonl', 'application/json-seq')
+BODY_HIGH_WATER = 1024 * 1024  # unread bytes at which reading from the client pauses
+MAX_INVALID_EXAMPLES = 10
+
+
+class StreamingBody(Body):
+    """A request body that tells the connection when to pause reading"""
+
+    def __init__(self, expected_content_length, max_content_length):
+        super().__init__(expected_content_length, max_content_length)
+        self.drained = asyncio.Event()
+        self.drained.set()
+
+    def append(self, data):
+        super().append(data)
+        if len(self._data) >= BODY_HIGH_WATER:
+            self.drained.clear()
+
+    def set_complete(self):
+        super().set_complete()
+        self.drained.set()
+
+    async def __anext__(self):
+        try:
+            return await super().__anext__()
+        finally:
+            self.drained.set()
+
+
+class StreamingRequest(Request):
+    """
+    Gives NDJSON requests a StreamingBody
+
+    MAX_CONTENT_LENGTH still limits every other request; NDJSON uploads are
+    never held in memory whole, so their total size is checked by NDJSONReader.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.mimetype in NDJSON_MIMETYPES:
+            self.body = StreamingBody(None, None)
+
+
+class BackpressureHTTPConnection(ASGIHTTPConnection):
+    async def handle_messages(self, request, receive):
+        body = request.body
+        while True:
+            if isinstance(body, StreamingBody):
+                await body.drained.wait()
+            message = await receive()
+            if message["type"] == "http.request":
+                body.append(message.get("body", b""))
+                if not message.get("more_body", False):
+                    body.set_complete()
+            elif message["type"] == "http.disconnect":
+                return
+
+
+class NDJSONReader:
+    def __init__(self, body, batch_size=1000, max_bytes=None, max_line_bytes=1024 * 1024):
+        """
+        Parse an NDJSON request body incrementally
+
+        Iterate with `async for batch in reader`; every batch is a list of up to
+        batch_size parsed records. Blank lines are skipped and invalid lines are
+        counted (with the first few kept as examples) instead of failing the upload.
+
+        Args:
+            body: The request body (request.body)
+            batch_size: Records per batch
+            max_bytes: Largest accepted upload (None for no limit)
+            max_line_bytes: Largest accepted single record
+        """
+        self.body = body
+        self.batch_size = batch_size
+        self.max_bytes = max_bytes
+        self.max_line_bytes = max_line_bytes
+        self.bytes_read = 0
+        self.lines = 0
+        self.records = 0
+        self.invalid = 0
+        self.invalid_examples = []
+
+    def _parse(self, line, batch):
+        self.lines += 1
+        if line.startswith(b"\x1e"):
+            line = line[1:]  # application/json-seq (RFC 7464) starts every record with RS
+        if not line or line.isspace():
+            return
+        try:
+            batch.append(orjson.loads(line))
+            self.records += 1
+        except orjson.JSONDecodeError as e:
+            self.invalid += 1
+            if len(self.invalid_examples) < MAX_INVALID_EXAMPLES:
+                self.invalid_examples.append({'line': self.lines, 'error': str(e)})
+
+    async def __aiter__(self):
+        pending = b''
+        batch = []
+
+        async for chunk in self.body:
+            self.bytes_read += len(chunk)
+            if self.max_bytes is not None and self.bytes_read > self.max_bytes:
+                raise RequestEntityTooLarge(f"Upload is larger than {self.max_bytes} bytes")
+
+            lines = (pending + chunk).split(b"\n")
+            pending = lines.pop()
+            if len(pending) > self.max_line_bytes:
+                raise BadRequest(f"Line {self.lines + 1} is longer than {self.max_line_bytes} bytes")
+
+            for line in lines:
+                self._parse(line, batch)
+                if len(batch) >= self.batch_size:
+                    yield batch
+                    batch = []
+
+        if pending:
+            self._parse(pending, batch)
+        if batch:
+            yield batch
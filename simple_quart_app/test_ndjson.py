@@ -0,0 +1,45 @@
+"""Tests for the streaming NDJSON reader (run with: python -m pytest simple_quart_app)"""
+
+import asyncio
+
+from ndjson import NDJSONReader
+
+
+class ChunkedBody:
+    """Stands in for request.body, handing out the upload in fixed-size chunks"""
+
+    def __init__(self, data, chunk_size=7):
+        self.chunks = [data[i:i + chunk_size] for i in range(0, len(data), chunk_size)]
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            yield chunk
+
+
+def read_all(data, **kwargs):
+    """(reader, batches) after reading the whole upload"""
+    async def collect():
+        reader = NDJSONReader(ChunkedBody(data), **kwargs)
+        return reader, [batch async for batch in reader]
+
+    return asyncio.run(collect())
+
+
+def test_ndjson_records_and_invalid_lines():
+    reader, batches = read_all(b'{"a": 1}\n\n{"a": 2}\nnot json\n{"a": 3}')
+    assert batches[0] == [{'a': 1}, {'a': 2}, {'a': 3}]
+    assert reader.invalid == 1
+    assert reader.invalid_examples[0]['line'] == 4
+
+
+def test_json_seq_record_separators_are_stripped():
+    reader, batches = read_all(b'\x1e{"a": 1}\n\x1e{"a": 2}\n\x1e[3]\n')
+    assert batches[0] == [{'a': 1}, {'a': 2}, [3]]
+    assert reader.invalid == 0
+
+
+def test_batches():
+    data = b"".join(b'{"n": %d}\n' % n for n in range(25))
+    reader, batches = read_all(data, batch_size=10)
+    assert [len(batch) for batch in batches] == [10, 10, 5]
+    assert reader.records == 25
@@ -1,5 +1,6 @@
 from quart import Quart, Response
 import asyncio
+import os
 
 app = Quart(__name__)
 
@@ -14,6 +15,9 @@ This would be a huge jump in battery capacity from the Xiaomi 15's 5,240 mAh cel
 The Xiaomi 16 has also been rumored to sport a flat OLED display, the Snapdragon 8 Elite 2 chipset at the helm, and three 50 MP rear cameras (including a main one with a 1/1.3" type sensor and possibly a periscope telephoto).
 """
 
+# Delay between words in seconds (STREAM_DELAY=0 for benchmarking)
+STREAM_DELAY = float(os.getenv('STREAM_DELAY', '0.2'))
+
 # Split the text into words
 WORDS = TEXT.strip().split()
 
@@ -21,7 +25,7 @@ WORDS = TEXT.strip().split()
 async def generate_stream():
     for word in WORDS:
         yield f"data: {word} \n\n"
-        await asyncio.sleep(0.2)  # control the speed of streaming
+        await asyncio.sleep(STREAM_DELAY)  # control the speed of streaming
 
 @app.route('/stream')
 async def stream():
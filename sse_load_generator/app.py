@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+"""
+SSE Load Generator
+Opens many concurrent Server-Sent Events connections against one of the Quart
+streaming apps and measures how well the server keeps up:
+
+- time to first event
+- inter-event gaps and jitter
+- dropped connections (errors, non-200s, streams cut off mid-way)
+- server RSS over time (pass --server-pid)
+
+Only the standard library is used. The report is JSON, so runs can be compared.
+
+Usage:
+    python app.py http://127.0.0.1:5000/stream --connections 2000 --ramp 20
+    python app.py http://127.0.0.1:5000/stream --method POST --json '{"prompt": "hi"}'
+    python app.py http://127.0.0.1:5000/stream -c 500 --duration 600 --reconnect --server-pid 1234 -o soak.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import ssl
+import statistics
+import sys
+import time
+from urllib.parse import urlparse
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def process_tree_rss_mb(pid):
+    """RSS in MB of a process plus all its descendants (Linux only), or None"""
+    total_kb = 0
+    pending = [pid]
+    seen = set()
+
+    while pending:
+        current = pending.pop()
+        if current in seen:
+            continue
+        seen.add(current)
+        try:
+            with open(f"/proc/{current}/status") as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total_kb += int(line.split()[1])
+                        break
+            for task in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{task}/children") as f:
+                    pending.extend(int(child) for child in f.read().split())
+        except (OSError, ValueError):
+            if current == pid:
+                return None
+
+    return total_kb / 1024
+
+
+def raise_file_limit():
+    """Allow as many open sockets as the hard limit permits"""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    return resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+
+
+class StreamStats:
+    """Measurements for one SSE connection"""
+
+    __slots__ = ('started', 'first_event', 'events', 'gaps', 'status', 'error', 'completed', 'ended')
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.first_event = None
+        self.events = 0
+        self.gaps = []
+        self.status = None
+        self.error = None
+        self.completed = False
+        self.ended = None
+
+
+class LoadGenerator:
+    def __init__(self, url, connections, ramp_seconds=10.0, duration=None, method='GET', body=None,
+                 headers=None, reconnect=False, timeout=30.0, server_pid=None, sample_interval=1.0):
+        """
+        Configure a load run
+
+        Args:
+            url: SSE endpoint (http or https)
+            connections: Number of concurrent connections to hold
+            ramp_seconds: Connections are opened evenly over this many seconds
+            duration: Stop after this many seconds (default: when all streams finish)
+            method: HTTP method
+            body: Request body bytes (for POST endpoints)
+            headers: Extra request headers
+            reconnect: Reopen streams that finish normally until the duration is up
+            timeout: Seconds to wait for the response headers or between events
+            server_pid: Sample RSS of this process tree over time
+            sample_interval: Seconds between timeline samples
+        """
+        parsed = urlparse(url)
+        self.url = url
+        self.scheme = parsed.scheme
+        self.host = parsed.hostname
+        self.port = parsed.port or (443 if parsed.scheme == 'https' else 80)
+        self.path = (parsed.path or '/') + (f"?{parsed.query}" if parsed.query else '')
+        self.connections = connections
+        self.ramp_seconds = ramp_seconds
+        self.duration = duration
+        self.method = method
+        self.body = body or b''
+        self.headers = headers or {}
+        self.reconnect = reconnect
+        self.timeout = timeout
+        self.server_pid = server_pid
+        self.sample_interval = sample_interval
+
+        self.streams = []
+        self.active = 0
+        self.events_since_sample = 0
+        self.stopping = False
+
+    def _request_bytes(self):
+        lines = [
+            f"{self.method} {self.path} HTTP/1.1",
+            f"Host: {self.host}:{self.port}",
+            "Accept: text/event-stream",
+            "Cache-Control: no-cache",
+            f"Content-Length: {len(self.body)}",
+        ]
+        if self.body:
+            lines.append("Content-Type: application/json")
+        lines.extend(f"{name}: {value}" for name, value in self.headers.items())
+        return ("\r\n".join(lines) + "\r\n\r\n").encode() + self.body
+
+    async def _read_body(self, reader, chunked):
+        """Yield body bytes, decoding chunked transfer encoding; the last item is a bool for a clean end"""
+        if not chunked:
+            while True:
+                data = await asyncio.wait_for(reader.read(65536), self.timeout)
+                if not data:
+                    yield True
+                    return
+                yield data
+
+        while True:
+            size_line = await asyncio.wait_for(reader.readline(), self.timeout)
+            if not size_line:
+                yield False
+                return
+            size = int(size_line.split(b';')[0].strip() or b'0', 16)
+            if size == 0:
+                yield True
+                return
+            data = await asyncio.wait_for(reader.readexactly(size + 2), self.timeout)
+            yield data[:-2]
+
+    async def _open_stream(self, stats):
+        ssl_context = ssl.create_default_context() if self.scheme == 'https' else None
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, ssl=ssl_context), self.timeout)
+
+        try:
+            writer.write(self._request_bytes())
+            await writer.drain()
+
+            status_line = await asyncio.wait_for(reader.readline(), self.timeout)
+            stats.status = int(status_line.split()[1])
+            chunked = False
+            while True:
+                line = await asyncio.wait_for(reader.readline(), self.timeout)
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                if name.strip().lower() == 'transfer-encoding' and 'chunked' in value.lower():
+                    chunked = True
+
+            if stats.status != 200:
+                stats.error = f"HTTP {stats.status}"
+                return
+
+            buffer = b''
+            last_event = None
+            async for data in self._read_body(reader, chunked):
+                if isinstance(data, bool):
+                    stats.completed = data
+                    if not data:
+                        stats.error = "stream cut off"
+                    break
+
+                buffer += data.replace(b'\r\n', b'\n')
+                *events, buffer = buffer.split(b'\n\n')
+                for event in events:
+                    if not any(line.startswith(b'data:') for line in event.split(b'\n')):
+                        continue
+                    now = time.monotonic()
+                    if stats.first_event is None:
+                        stats.first_event = now - stats.started
+                    else:
+                        stats.gaps.append(now - last_event)
+                    last_event = now
+                    stats.events += 1
+                    self.events_since_sample += 1
+
+                if self.stopping:
+                    stats.completed = True
+                    break
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (ConnectionError, ssl.SSLError):
+                pass
+
+    async def _client(self, start_delay):
+        await asyncio.sleep(start_delay)
+
+        while not self.stopping:
+            stats = StreamStats()
+            self.streams.append(stats)
+            self.active += 1
+            try:
+                await self._open_stream(stats)
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError, IndexError) as e:
+                stats.error = f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+            finally:
+                stats.ended = time.monotonic()
+                self.active -= 1
+
+            if not (self.reconnect and stats.completed and self.duration):
+                break
+
+    async def _sample(self, started, timeline):
+        while not self.stopping:
+            await asyncio.sleep(self.sample_interval)
+            sample = {
+                't': round(time.monotonic() - started, 3),
+                'active': self.active,
+                'opened': len(self.streams),
+                'events_per_s': self.events_since_sample / self.sample_interval,
+                'dropped': sum(1 for s in self.streams if s.error),
+            }
+            self.events_since_sample = 0
+            if self.server_pid:
+                sample['server_rss_mb'] = process_tree_rss_mb(self.server_pid)
+            timeline.append(sample)
+
+    async def run(self):
+        """Run the load and return the report dict"""
+        started = time.monotonic()
+        timeline = []
+        sampler = asyncio.create_task(self._sample(started, timeline))
+
+        step = self.ramp_seconds / self.connections if self.connections else 0
+        clients = [asyncio.create_task(self._client(i * step)) for i in range(self.connections)]
+
+        if self.duration:
+            done, pending = await asyncio.wait(clients, timeout=self.duration)
+            self.stopping = True
+            # Give open streams a moment to notice, then cut the rest
+            if pending:
+                _, pending = await asyncio.wait(pending, timeout=2)
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+        else:
+            await asyncio.gather(*clients)
+
+        self.stopping = True
+        sampler.cancel()
+        await asyncio.gather(sampler, return_exceptions=True)
+
+        return self.report(time.monotonic() - started, timeline)
+
+    def report(self, elapsed, timeline):
+        first_events = [s.first_event for s in self.streams if s.first_event is not None]
+        gaps = [gap for s in self.streams for gap in s.gaps]
+        dropped = [s for s in self.streams if s.error]
+        errors = {}
+        for stream in dropped:
+            errors[stream.error] = errors.get(stream.error, 0) + 1
+
+        rss_samples = [sample['server_rss_mb'] for sample in timeline if sample.get('server_rss_mb') is not None]
+
+        return {
+            'target': self.url,
+            'method': self.method,
+            'connections': self.connections,
+            'ramp_seconds': self.ramp_seconds,
+            'duration_s': round(elapsed, 3),
+            'streams_opened': len(self.streams),
+            'streams_completed': sum(1 for s in self.streams if s.completed),
+            'streams_dropped': len(dropped),
+            'drop_rate': len(dropped) / len(self.streams) if self.streams else 0.0,
+            'errors': errors,
+            'events': sum(s.events for s in self.streams),
+            'time_to_first_event_s': {
+                'p50': percentile(first_events, 50),
+                'p90': percentile(first_events, 90),
+                'p99': percentile(first_events, 99),
+                'max': max(first_events) if first_events else None,
+            },
+            'inter_event_gap_s': {
+                'p50': percentile(gaps, 50),
+                'p99': percentile(gaps, 99),
+                'max': max(gaps) if gaps else None,
+                'jitter_stdev': statistics.pstdev(gaps) if len(gaps) > 1 else None,
+            },
+            'server_rss_mb': {
+                'start': rss_samples[0] if rss_samples else None,
+                'peak': max(rss_samples) if rss_samples else None,
+                'end': rss_samples[-1] if rss_samples else None,
+            },
+            'timeline': timeline,
+        }
+
+
+def print_summary(report):
+    ttfe = report['time_to_first_event_s']
+    gaps = report['inter_event_gap_s']
+
+    def ms(value):
+        return f"{value * 1000:.1f} ms" if value is not None else "-"
+
+    print("=" * 60)
+    print(f"Target:            {report['target']}")
+    print(f"Streams:           {report['streams_opened']} opened, {report['streams_completed']} completed, "
+          f"{report['streams_dropped']} dropped ({report['drop_rate']:.1%})")
+    print(f"Events:            {report['events']} in {report['duration_s']:.1f} s")
+    print(f"First event:       p50 {ms(ttfe['p50'])}, p99 {ms(ttfe['p99'])}, max {ms(ttfe['max'])}")
+    print(f"Inter-event gap:   p50 {ms(gaps['p50'])}, p99 {ms(gaps['p99'])}, jitter {ms(gaps['jitter_stdev'])}")
+    rss = report['server_rss_mb']
+    if rss['peak'] is not None:
+        print(f"Server RSS:        {rss['start']:.1f} MB -> peak {rss['peak']:.1f} MB -> {rss['end']:.1f} MB")
+    for error, count in sorted(report['errors'].items(), key=lambda item: -item[1])[:5]:
+        print(f"  {count:>6} x {error}")
+    print("=" * 60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Open many concurrent SSE connections and measure the server")
+    parser.add_argument('url', help="SSE endpoint, e.g. http://127.0.0.1:5000/stream")
+    parser.add_argument('-c', '--connections', type=int, default=100, help="Concurrent connections")
+    parser.add_argument('--ramp', type=float, default=10.0, help="Seconds over which connections are opened")
+    parser.add_argument('--duration', type=float, help="Stop after this many seconds (soak test)")
+    parser.add_argument('--reconnect', action='store_true', help="Reopen finished streams until --duration")
+    parser.add_argument('--method', default='GET', help="HTTP method")
+    parser.add_argument('--json', help="JSON request body (for POST endpoints)")
+    parser.add_argument('-H', '--header', action='append', default=[], help="Extra header, 'Name: value'")
+    parser.add_argument('--timeout', type=float, default=30.0, help="Seconds allowed for headers or between events")
+    parser.add_argument('--server-pid', type=int, help="Sample RSS of this server process tree")
+    parser.add_argument('--interval', type=float, default=1.0, help="Seconds between timeline samples")
+    parser.add_argument('-o', '--output', help="Write the JSON report here (default: stdout)")
+    args = parser.parse_args()
+
+    if args.reconnect and not args.duration:
+        print("Error: --reconnect needs --duration")
+        sys.exit(1)
+
+    file_limit = raise_file_limit()
+    if args.connections + 50 > file_limit:
+        print(f"Warning: open file limit is {file_limit}; some connections will fail. Raise it with ulimit -n.",
+              file=sys.stderr)
+
+    headers = dict(h.split(':', 1) for h in args.header)
+    headers = {name.strip(): value.strip() for name, value in headers.items()}
+    body = json.dumps(json.loads(args.json)).encode() if args.json else None
+
+    generator = LoadGenerator(
+        args.url, args.connections, ramp_seconds=args.ramp, duration=args.duration, method=args.method.upper(),
+        body=body, headers=headers, reconnect=args.reconnect, timeout=args.timeout, server_pid=args.server_pid,
+        sample_interval=args.interval,
+    )
+
+    try:
+        report = asyncio.run(generator.run())
+    except KeyboardInterrupt:
+        print("\n\nLoad test interrupted by user.")
+        sys.exit(1)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print_summary(report)
+        print(f"Report written to {args.output}")
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
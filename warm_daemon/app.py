@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Warm Daemon
+Keeps the command-line tools of this repo loaded in one long-running process,
+so scripted callers stop paying for interpreter startup, heavy imports
+(requests, bs4, openai) and fresh TLS connections on every invocation.
+
+Tools are imported the first time a command needs them and then stay loaded,
+together with their pooled HTTP sessions, OpenAI clients, validator store,
+local index and a short-lived search result cache. Clients (see cli.py) send
+one JSON request per connection over a Unix socket and get one JSON reply.
+
+Usage:
+    python app.py                          # serve on $WARM_DAEMON_SOCKET
+    python app.py --socket /tmp/tools.sock
+
+Keys come from the environment: ZENROWS_API_KEY, GOOGLE_API_KEY, GOOGLE_CSE_ID
+and OPENAI_API_KEY. fetch-many and ask spread their requests over several keys
+when ZENROWS_API_KEY / GOOGLE_API_KEY list them comma-separated; search and
+fetch --zenrows use the first key.
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import socketserver
+import sys
+import threading
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+DEFAULT_SOCKET = os.getenv('WARM_DAEMON_SOCKET', f"/tmp/warm_daemon-{os.getuid()}.sock")
+SEARCH_CACHE_TTL = float(os.getenv('WARM_DAEMON_SEARCH_TTL', '600'))
+
+
+class Tools:
+    """Lazily loaded tool modules and the long-lived objects built from them"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.modules = {}
+        self.objects = {}
+        self.search_cache = {}  # (query, num_results) -> (expires at, urls)
+        self.started_at = time.time()
+        self.requests_served = 0
+
+    def module(self, directory):
+        """
+        Import <directory>/app.py once, together with its own copies of its sibling modules
+
+        Tools ship different modules under the same names (key_pool, doc_store,
+        ...), so each tool's siblings are imported fresh from its directory and
+        then moved out of the way in sys.modules (as <directory>_<name>), where
+        the next tool would otherwise pick up the first copy.
+        """
+        with self.lock:
+            if directory not in self.modules:
+                folder = REPO_ROOT / directory
+                siblings = {path.stem for path in folder.glob('*.py')}
+                shadowed = {name: sys.modules.pop(name) for name in siblings if name in sys.modules}
+                sys.path.insert(0, str(folder))
+                try:
+                    spec = importlib.util.spec_from_file_location(f"{directory}_app", folder / 'app.py')
+                    module = importlib.util.module_from_spec(spec)
+                    spec.loader.exec_module(module)
+                finally:
+                    sys.path.remove(str(folder))
+                    for name in siblings:
+                        loaded = sys.modules.pop(name, None)
+                        if loaded is not None:
+                            sys.modules[f"{directory}_{name}"] = loaded
+                    sys.modules.update(shadowed)
+                self.modules[directory] = module
+            return self.modules[directory]
+
+    def shared(self, name, factory):
+        """Build a long-lived object on first use"""
+        with self.lock:
+            if name not in self.objects:
+                self.objects[name] = factory()
+            return self.objects[name]
+
+    def fetch(self, url, zenrows=False):
+        zenrows_app = self.module('zenrows')
+        if zenrows:
+            return zenrows_app.get_web_content_zenscrape(url, os.getenv('ZENROWS_API_KEY', '').split(',')[0])
+        validators = self.shared('validators', lambda: zenrows_app.ValidatorStore(
+            os.getenv('VALIDATOR_STORE_PATH', 'validators.sqlite3')))
+        return zenrows_app.get_web_content_direct(url, validators)
+
+    def fetch_many(self, urls):
+        zenrows_parallel = self.module('zenrows_parallel')
+        # One pool for the daemon's lifetime, so cooldowns and usage carry over between requests
+        keys = self.shared('zenrows_keys', lambda: zenrows_parallel.KeyPool(
+            os.getenv('ZENROWS_API_KEY', ''), max_concurrency=zenrows_parallel.KEY_CONCURRENCY))
+        return zenrows_parallel.fetch_multiple_urls_parallel(urls, keys)
+
+    def search(self, query, num_results=5):
+        key = (query, num_results)
+        cached = self.search_cache.get(key)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+
+        google = self.module('google_search_engine')
+        searcher = self.shared('google', lambda: google.GoogleSearchApp(
+            os.getenv('GOOGLE_API_KEY', '').split(',')[0], os.getenv('GOOGLE_CSE_ID', '')))
+        urls = searcher.search(query, num_results)
+        if urls:
+            self.search_cache[key] = (time.monotonic() + SEARCH_CACHE_TTL, urls)
+        return urls
+
+    def ask(self, question):
+        chatbot = self.module('simple_chatbot_v2')
+        qa = self.shared('chatbot', lambda: chatbot.QuestionAnsweringApp(
+            os.getenv('OPENAI_API_KEY', ''), os.getenv('GOOGLE_API_KEY', ''),
+            os.getenv('GOOGLE_CSE_ID', ''), os.getenv('ZENROWS_API_KEY', ''),
+            prompt_layout=os.getenv('QA_PROMPT_LAYOUT', 'cache_friendly'),
+            index_dir=os.getenv('QA_INDEX_DIR', 'local_index'),
+            duplicate_domains_path=os.getenv('QA_DUPLICATE_DOMAINS', 'duplicate_domains.json'),
+            page_store_dir=os.getenv('QA_PAGE_STORE_DIR', 'page_store')))
+        return qa.answer_question(question)
+
+    def status(self):
+        return {
+            'pid': os.getpid(),
+            'uptime_s': round(time.time() - self.started_at, 1),
+            'requests_served': self.requests_served,
+            'loaded_tools': sorted(self.modules),
+            'cached_searches': len(self.search_cache),
+        }
+
+    def close(self):
+        chatbot = self.objects.get('chatbot')
+        if chatbot:
+            chatbot.local_index.close()
+            if chatbot.page_store is not None:
+                chatbot.page_store.close()
+
+
+COMMANDS = {
+    'fetch': lambda tools, args: tools.fetch(args['url'], args.get('zenrows', False)),
+    'fetch-many': lambda tools, args: tools.fetch_many(args['urls']),
+    'search': lambda tools, args: tools.search(args['query'], args.get('num_results', 5)),
+    'ask': lambda tools, args: tools.ask(args['question']),
+    'status': lambda tools, args: tools.status(),
+}
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+            command = request.get('command')
+
+            if command == 'stop':
+                reply = {'ok': True, 'result': 'stopping'}
+                threading.Thread(target=self.server.shutdown, daemon=True).start()
+            elif command in COMMANDS:
+                start = time.monotonic()
+                result = COMMANDS[command](self.server.tools, request.get('args', {}))
+                self.server.tools.requests_served += 1
+                print(f"[daemon] {command} done in {time.monotonic() - start:.2f}s")
+                reply = {'ok': True, 'result': result}
+            else:
+                reply = {'ok': False, 'error': f"Unknown command: {command}"}
+        except Exception as e:
+            print(f"[daemon] request failed: {e}")
+            reply = {'ok': False, 'error': str(e)}
+
+        self.wfile.write(json.dumps(reply).encode('utf-8') + b"\n")
+
+
+class WarmDaemon(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path):
+        self.socket_path = socket_path
+        self.tools = Tools()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)  # left behind by a daemon that didn't shut down cleanly
+        old_umask = os.umask(0o177)  # socket readable and writable by this user only
+        try:
+            super().__init__(socket_path, RequestHandler)
+        finally:
+            os.umask(old_umask)
+
+    def server_close(self):
+        super().server_close()
+        self.tools.close()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the repo's tools from one warm process")
+    parser.add_argument('--socket', default=DEFAULT_SOCKET, help="Unix socket path")
+    parser.add_argument('--preload', nargs='*', default=[],
+                        help="Tool directories to import at startup instead of on first use")
+    args = parser.parse_args()
+
+    with WarmDaemon(args.socket) as server:
+        for directory in args.preload:
+            server.tools.module(directory)
+        print(f"Warm daemon listening on {args.socket} (pid {os.getpid()})")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    print("Warm daemon stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Thin client for the warm daemon
+
+Only a few small standard library modules are imported here; requests, bs4,
+openai and the tools themselves live in the daemon. If no daemon is listening, one is started
+in the background and the request waits for it.
+
+Usage:
+    python cli.py search "python asyncio tutorial" -n 10
+    python cli.py fetch https://example.com [--zenrows]
+    python cli.py fetch-many https://a.com https://b.com https://c.com
+    python cli.py ask "compare gdp of thailand and vietnam in 2023"
+    python cli.py status
+    python cli.py stop
+"""
+
+import json
+import os
+import socket
+import sys
+import time
+
+DEFAULT_SOCKET = os.getenv('WARM_DAEMON_SOCKET', f"/tmp/warm_daemon-{os.getuid()}.sock")
+START_TIMEOUT = 15
+
+
+def send(socket_path, command, args):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(socket_path)
+        client.sendall(json.dumps({'command': command, 'args': args}).encode('utf-8') + b"\n")
+        reply = client.makefile('rb').readline()
+    return json.loads(reply)
+
+
+def start_daemon(socket_path):
+    """Launch the daemon detached from this process and wait for its socket"""
+    import subprocess
+
+    log_path = os.getenv('WARM_DAEMON_LOG', socket_path + '.log')
+    with open(log_path, 'ab') as log:
+        subprocess.Popen(
+            [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py'),
+             '--socket', socket_path],
+            stdin=subprocess.DEVNULL, stdout=log, stderr=log, start_new_session=True
+        )
+
+    deadline = time.monotonic() + START_TIMEOUT
+    while time.monotonic() < deadline:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+            try:
+                probe.connect(socket_path)
+                return True
+            except (FileNotFoundError, ConnectionRefusedError):
+                time.sleep(0.05)
+    return False
+
+
+def request(socket_path, command, args, autostart=True):
+    try:
+        return send(socket_path, command, args)
+    except (FileNotFoundError, ConnectionRefusedError):
+        if not autostart or command == 'stop':
+            raise
+        if not start_daemon(socket_path):
+            raise RuntimeError(f"Daemon did not start within {START_TIMEOUT}s (see {socket_path}.log)")
+        return send(socket_path, command, args)
+
+
+def parse_args(argv):
+    """Small hand-rolled parser, to keep argparse out of the startup path"""
+    usage = "Usage: cli.py [--socket PATH] [--json] [--no-start] {search,fetch,fetch-many,ask,status,stop} ..."
+    options = {'socket': DEFAULT_SOCKET, 'json': False, 'autostart': True}
+
+    argv = list(argv)
+    while argv and argv[0].startswith('--'):
+        flag = argv.pop(0)
+        if flag == '--socket' and argv:
+            options['socket'] = argv.pop(0)
+        elif flag == '--json':
+            options['json'] = True
+        elif flag == '--no-start':
+            options['autostart'] = False
+        else:
+            sys.exit(usage)
+
+    if not argv:
+        sys.exit(usage)
+    command, rest = argv[0], argv[1:]
+
+    if command == 'search' and rest:
+        num_results = 5
+        if len(rest) > 2 and rest[-2] == '-n' and rest[-1].isdigit():
+            num_results = int(rest[-1])
+            rest = rest[:-2]
+        return options, command, {'query': ' '.join(rest), 'num_results': num_results}
+    if command == 'fetch' and rest:
+        return options, command, {'url': rest[0], 'zenrows': '--zenrows' in rest[1:]}
+    if command == 'fetch-many' and rest:
+        return options, command, {'urls': rest}
+    if command == 'ask' and rest:
+        return options, command, {'question': ' '.join(rest)}
+    if command in ('status', 'stop'):
+        return options, command, {}
+    sys.exit(usage)
+
+
+def print_result(command, result):
+    if command == 'search':
+        for i, url in enumerate(result or [], 1):
+            print(f"{i}. {url}")
+        if not result:
+            print("No results found or error occurred.")
+    elif command == 'fetch-many':
+        for url, content in result.items():
+            print(f"{'=' * 80}\n{url}\n{'=' * 80}\n{content}")
+    elif command == 'ask' and result is None:
+        print("No search results found.")
+    elif isinstance(result, dict):
+        for key, value in result.items():
+            print(f"{key}: {value}")
+    else:
+        print(result)
+
+
+def main():
+    options, command, args = parse_args(sys.argv[1:])
+    try:
+        reply = request(options['socket'], command, args, autostart=options['autostart'])
+    except (OSError, RuntimeError) as e:
+        sys.exit(f"Could not reach the warm daemon: {e}")
+
+    if options['json']:
+        print(json.dumps(reply))
+    elif reply['ok']:
+        print_result(command, reply['result'])
+    else:
+        print(f"Error: {reply['error']}", file=sys.stderr)
+    sys.exit(0 if reply['ok'] else 1)
+
+
+if __name__ == "__main__":
+    main()
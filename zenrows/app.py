@@ -1,6 +1,29 @@
+import os
 import requests
 import sys
 from urllib.parse import urlparse
+from validator_store import ValidatorStore
+from crawl_scheduler import CrawlScheduler, RobotsDisallowed
+
+# Pages bigger than this are abandoned mid-download
+MAX_PAGE_BYTES = int(os.getenv('MAX_PAGE_BYTES', str(2 * 1024 * 1024)))
+
+# One pooled session, so repeated fetches in a long-running process (see warm_daemon/) reuse connections
+session = requests.Session()
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+# Direct fetches go through one scheduler, so bulk callers (see warm_daemon/) stay within
+# per-host limits and robots.txt; worker threads only start on first use. They use their own
+# session, whose host lookups the scheduler caches, so ZenRows requests resolve as usual
+crawl_session = requests.Session()
+scheduler = CrawlScheduler(
+    crawl_session,
+    max_workers=int(os.getenv('CRAWL_WORKERS', '8')),
+    per_host_concurrency=int(os.getenv('CRAWL_HOST_CONCURRENCY', '2')),
+    per_host_delay=float(os.getenv('CRAWL_HOST_DELAY', '1.0')),
+    user_agent=USER_AGENT
+)
 
 
 def is_valid_url(url):
@@ -26,26 +49,87 @@ def get_web_content_zenscrape(url, api_key):
     }
 
     try:
-        response = requests.get(zenscrape_url, params=params)
+        response = session.get(zenscrape_url, params=params)
         response.raise_for_status()
         return response.text
     except requests.exceptions.RequestException as e:
         return f"Error fetching content: {str(e)}"
 
 
-def get_web_content_direct(url):
+def read_html_body(response, max_bytes=MAX_PAGE_BYTES):
+    """Read a streamed response body, refusing non-HTML content and oversized pages"""
+    content_type = response.headers.get('Content-Type', '')
+    if content_type and not any(t in content_type.lower() for t in ('text/html', 'application/xhtml+xml')):
+        raise ValueError(f"Skipping non-HTML content ({content_type})")
+
+    declared_length = response.headers.get('Content-Length', '')
+    if declared_length.isdigit() and int(declared_length) > max_bytes:
+        raise ValueError(f"Page is {declared_length} bytes, over the {max_bytes} byte limit")
+
+    chunks = []
+    size = 0
+    for chunk in response.iter_content(chunk_size=64 * 1024):
+        size += len(chunk)
+        if size > max_bytes:
+            raise ValueError(f"Page exceeded the {max_bytes} byte limit, download aborted")
+        chunks.append(chunk)
+
+    return b''.join(chunks).decode(response.encoding or 'utf-8', errors='replace')
+
+
+def get_web_content_direct(url, validators=None):
     """
     Alternative method: Direct HTTP request (fallback option)
+
+    With a ValidatorStore, unchanged pages are revalidated with a conditional
+    request and served from the store on 304 Not Modified. The request waits
+    its turn in the crawl scheduler and is skipped if robots.txt disallows it.
     """
+    try:
+        return scheduler.submit(fetch_direct, url, validators).result()
+    except RobotsDisallowed as e:
+        return f"Error fetching content: {str(e)}"
+
+
+def get_web_content_direct_many(urls, validators=None):
+    """
+    Fetch many URLs directly, spread across hosts by the crawl scheduler
+
+    Returns a dict of URL to content (or an error message), in input order.
+    """
+    futures = {url: scheduler.submit(fetch_direct, url, validators) for url in urls}
+    results = {}
+    for url, future in futures.items():
+        try:
+            results[url] = future.result()
+        except RobotsDisallowed as e:
+            results[url] = f"Error fetching content: {str(e)}"
+    return results
+
+
+def fetch_direct(url, validators=None):
+    """One direct request, without scheduling (use get_web_content_direct)"""
     headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+        'User-Agent': USER_AGENT
     }
+    stored = validators.get(url) if validators else None
+    if stored:
+        headers.update(validators.conditional_headers(stored))
 
     try:
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        return response.text
-    except requests.exceptions.RequestException as e:
+        with crawl_session.get(url, headers=headers, timeout=10, stream=True) as response:
+            if response.status_code == 304 and stored:
+                validators.mark_validated(url)
+                print("Not modified since last fetch, using stored copy.")
+                return stored['content']
+
+            response.raise_for_status()
+            content = read_html_body(response)
+
+        if validators:
+            validators.save(url, response.headers, content)
+        return content
+    except (requests.exceptions.RequestException, ValueError) as e:
         return f"Error fetching content: {str(e)}"
 
 
@@ -76,16 +160,18 @@ def main():
     # Option 1: Using Zenscrape (requires API key)
     use_zenscrape = input("\nDo you want to use Zenscrape API? (y/n): ").lower().strip()
 
+    validators = ValidatorStore(os.getenv('VALIDATOR_STORE_PATH', 'validators.sqlite3'))
+
     if use_zenscrape == 'y':
         api_key = input("Enter your Zenscrape API key: ").strip()
         if api_key:
             content = get_web_content_zenscrape(url, api_key)
         else:
             print("No API key provided. Using direct method instead.")
-            content = get_web_content_direct(url)
+            content = get_web_content_direct(url, validators)
     else:
         # Option 2: Direct HTTP request (fallback)
-        content = get_web_content_direct(url)
+        content = get_web_content_direct(url, validators)
 
     # Display content
     print("\n" + "=" * 50)
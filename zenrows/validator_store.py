@@ -0,0 +1,76 @@
+"""
+HTTP validator store for conditional re-fetching
+
+Remembers the ETag / Last-Modified of every page fetched, together with the
+content derived from it (the raw page or its extracted text). The next fetch of
+the same URL sends If-None-Match / If-Modified-Since, and a 304 answer reuses
+the stored content without downloading or parsing the page again.
+"""
+
+import sqlite3
+import threading
+import time
+
+
+class ValidatorStore:
+    def __init__(self, path='validators.sqlite3'):
+        """
+        Open (or create) the store
+
+        Args:
+            path: SQLite file
+        """
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS validators (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                content TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                validated_at REAL NOT NULL
+            )
+        """)
+
+    def get(self, url):
+        """Return the stored entry for a URL, or None"""
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT etag, last_modified, content FROM validators WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {'etag': row[0], 'last_modified': row[1], 'content': row[2]}
+
+    @staticmethod
+    def conditional_headers(entry):
+        """Request headers (for a stored entry) that let the server answer 304 Not Modified"""
+        headers = {}
+        if entry:
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def save(self, url, response_headers, content):
+        """Store content for a URL if the response carried any validator"""
+        etag = response_headers.get('ETag')
+        last_modified = response_headers.get('Last-Modified')
+        if not etag and not last_modified:
+            return
+
+        now = time.time()
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO validators (url, etag, last_modified, content, fetched_at, validated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (url, etag, last_modified, content, now, now)
+            )
+
+    def mark_validated(self, url):
+        """Record that the server confirmed the stored content is still current"""
+        with self.lock:
+            self.connection.execute("UPDATE validators SET validated_at = ? WHERE url = ?", (time.time(), url))
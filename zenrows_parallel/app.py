@@ -1,8 +1,21 @@
+import os
 import requests
 import sys
 import time
 from urllib.parse import urlparse
 from concurrent.futures import ThreadPoolExecutor
+from key_pool import KeyPool, NoKeyAvailable, ROTATE_STATUSES
+
+# Overridable so the app can be pointed at a local stand-in (see benchmarks/)
+ZENROWS_API_URL = os.getenv('ZENROWS_API_URL', 'https://api.zenrows.com/v1/')
+
+# Requests one API key may have in flight (ZenRows plans allow 5 and up)
+KEY_CONCURRENCY = int(os.getenv('ZENROWS_KEY_CONCURRENCY', '5'))
+
+# One pooled session, so repeated fetches in a long-running process (see warm_daemon/) reuse connections
+session = requests.Session()
+session.mount('https://', requests.adapters.HTTPAdapter(pool_maxsize=10))
+session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=10))
 
 
 def is_valid_url(url):
@@ -18,21 +31,38 @@ def get_web_content_zenrows(url, api_key):
     """
     Fetch web content using ZenRows API
     You need to sign up at https://zenrows.com/ to get an API key
+
+    api_key may also be a KeyPool; the request then uses the least busy key and
+    moves on to another one if a key is rejected or rate limited.
     """
-    zenrows_url = "https://api.zenrows.com/v1/"
+    zenrows_url = ZENROWS_API_URL
+    keys = api_key if isinstance(api_key, KeyPool) else KeyPool(api_key)
 
     params = {
         'url': url,
-        'apikey': api_key,
         'js_render': 'true',  # Enable JavaScript rendering
         'premium_proxy': 'true'  # Use premium proxies
     }
 
+    tried = []
     try:
-        response = requests.get(zenrows_url, params=params, timeout=30)
-        response.raise_for_status()
-        return response.text
-    except requests.exceptions.RequestException as e:
+        while True:
+            key = keys.acquire(exclude=tried)
+            tried.append(key)
+            response = None
+            try:
+                response = session.get(zenrows_url, params={**params, 'apikey': key}, timeout=30)
+            finally:
+                if response is None:
+                    keys.release(key)
+                else:
+                    keys.release(key, response.status_code, response.headers, response.text)
+
+            if response.status_code in ROTATE_STATUSES and len(tried) < len(keys):
+                continue
+            response.raise_for_status()
+            return response.text
+    except (requests.exceptions.RequestException, NoKeyAvailable) as e:
         return f"Error fetching content from {url}: {str(e)}"
 
 
@@ -62,24 +92,31 @@ def get_urls_from_user():
     return urls
 
 
-def fetch_multiple_urls_parallel(urls, api_key):
+def fetch_multiple_urls_parallel(urls, api_key, store=None):
     """
     Fetch content from multiple URLs in parallel using ZenRows
+
+    api_key can be one key, several comma-separated keys or a KeyPool; with
+    several keys the number of parallel fetches grows with the pool. If a
+    DocStore is given, every page fetched successfully is archived in it.
     """
+    keys = api_key if isinstance(api_key, KeyPool) else KeyPool(api_key, max_concurrency=KEY_CONCURRENCY)
 
     def fetch_single_url(url):
         print(f"Starting fetch for: {url}")
         start_single = time.time()
-        result = get_web_content_zenrows(url, api_key)
+        result = get_web_content_zenrows(url, keys)
         end_single = time.time()
         print(f"Completed fetch for: {url} in {end_single - start_single:.2f} seconds")
+        if store is not None and not result.startswith("Error"):
+            store.put(url, result)
         return result
 
     start_time = time.time()
     print("Submitting all URLs for parallel processing...")
 
     # Use ThreadPoolExecutor for true parallel execution
-    with ThreadPoolExecutor(max_workers=3) as executor:
+    with ThreadPoolExecutor(max_workers=max(3, min(len(urls), keys.capacity))) as executor:
         # Submit all tasks immediately - this starts parallel execution
         futures = {url: executor.submit(fetch_single_url, url) for url in urls}
         results = {}
@@ -99,6 +136,12 @@ def fetch_multiple_urls_parallel(urls, api_key):
 
     end_time = time.time()
     print(f"\nAll URLs fetched in {end_time - start_time:.2f} seconds")
+    if len(keys) > 1:
+        for key in keys.status():
+            print(f"Key {key['key']}: {key['requests']} requests, {key['failures']} failures")
+    if store is not None:
+        stats = store.stats()
+        print(f"Store: {stats['documents']} pages, {stats['raw_bytes']} bytes in {stats['stored_bytes']}")
 
     return results
 
@@ -127,8 +170,8 @@ def main():
     print("Parallel Web Content Fetcher with ZenRows")
     print("=" * 45)
 
-    # Get ZenRows API key first
-    api_key = input("Enter your ZenRows API key: ").strip()
+    # Get ZenRows API key(s) first
+    api_key = os.getenv('ZENROWS_API_KEYS') or input("Enter your ZenRows API key(s), comma-separated: ").strip()
     if not api_key:
         print("Error: ZenRows API key is required to use this application.")
         print("Please sign up at https://zenrows.com/ to get your API key.")
@@ -145,8 +188,18 @@ def main():
     print(f"\nFetching content from {len(urls)} URLs using ZenRows API...")
     print("This may take a few moments...")
 
+    # Optionally archive the fetched pages in a compressed store
+    store = None
+    if os.getenv('ZENROWS_STORE_DIR'):
+        from doc_store import DocStore
+        store = DocStore(os.getenv('ZENROWS_STORE_DIR'))
+
     # Fetch all URLs in parallel using ZenRows
-    results = fetch_multiple_urls_parallel(urls, api_key)
+    try:
+        results = fetch_multiple_urls_parallel(urls, api_key, store)
+    finally:
+        if store is not None:
+            store.close()
 
     # Display all results
     display_results(results)
@@ -0,0 +1,301 @@
+"""
+Compressed document store
+
+Crawled pages are highly repetitive across documents (navigation, footers,
+boilerplate), which plain per-document compression can't exploit. Here each
+document is compressed on its own, for random access, but with a zstd
+dictionary trained on the corpus, so the shared parts cost next to nothing
+even in small documents.
+
+Layout of a store directory:
+
+    seg-NNNNNN.zst    append-only segment: 'ZDOCSEG1', uint32 dictionary id, then zstd frames
+    dict-NNNNNN.zdict trained dictionaries (id 0 means no dictionary)
+    index.bin         one fixed-size record per document: segment, offset, length, raw length, time
+    keys.jsonl        one line per document, in the same order, with its key
+
+Until enough documents have arrived to train a dictionary they are
+compressed without one; training then starts a new segment. A later put()
+of an existing key appends a new copy that shadows the old one.
+"""
+
+import json
+import os
+import struct
+import threading
+import time
+from array import array
+
+import zstandard
+
+SEGMENT_MAGIC = b'ZDOCSEG1'
+SEGMENT_HEADER = struct.Struct('<8sI')
+INDEX_RECORD = struct.Struct('<IQIId')  # segment, offset, compressed length, raw length, stored at
+MAX_SAMPLE_BYTES = 128 * 1024  # per training sample; the start of a page is representative enough
+
+
+class DocStore:
+    def __init__(self, directory, level=6, train_samples=256, dict_size=112640,
+                 max_segment_bytes=64 * 1024 * 1024):
+        """
+        Open (or create) a store directory
+
+        Args:
+            directory: Where the store files live
+            level: zstd compression level
+            train_samples: Documents collected before a dictionary is trained
+            dict_size: Dictionary size in bytes
+            max_segment_bytes: Segment size at which a new segment is started
+        """
+        self.directory = directory
+        self.level = level
+        self.train_samples = train_samples
+        self.dict_size = dict_size
+        self.max_segment_bytes = max_segment_bytes
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+        self.segments = array('I')
+        self.offsets = array('Q')
+        self.lengths = array('I')
+        self.raw_lengths = array('I')
+        self.stored_at = array('d')
+        self.key_to_id = {}
+        self.dictionaries = {}
+        self.segment_files = {}
+        self.segment_dicts = {}
+        self.samples = []
+
+        self._load_index()
+
+        self.index_file = open(os.path.join(directory, 'index.bin'), 'ab')
+        self.keys_file = open(os.path.join(directory, 'keys.jsonl'), 'ab')
+
+        segment_numbers = sorted(int(name[4:10]) for name in os.listdir(directory)
+                                 if name.startswith('seg-') and name.endswith('.zst'))
+        if segment_numbers:
+            self.segment = segment_numbers[-1]
+            self.dict_id = self._segment_dict_id(self.segment)
+        else:
+            self.segment = 0
+            self.dict_id = 0
+            self._start_segment(0)
+        self.compressor = self._compressor(self.dict_id)
+
+    def _load_index(self):
+        index_path = os.path.join(self.directory, 'index.bin')
+        keys_path = os.path.join(self.directory, 'keys.jsonl')
+        if not os.path.exists(index_path) or not os.path.exists(keys_path):
+            return
+
+        with open(keys_path, 'rb') as f:
+            keys = [json.loads(line)['key'] for line in f if line.endswith(b"\n")]
+        with open(index_path, 'rb') as f:
+            data = f.read()
+
+        # The two files are appended separately; a crash between them leaves one record extra
+        count = min(len(keys), len(data) // INDEX_RECORD.size)
+        for doc_id, record in enumerate(INDEX_RECORD.iter_unpack(data[:count * INDEX_RECORD.size])):
+            segment, offset, length, raw_length, stored_at = record
+            self.segments.append(segment)
+            self.offsets.append(offset)
+            self.lengths.append(length)
+            self.raw_lengths.append(raw_length)
+            self.stored_at.append(stored_at)
+            self.key_to_id[keys[doc_id]] = doc_id
+
+        if count * INDEX_RECORD.size != len(data) or count != len(keys):
+            # Drop the torn tail so both files line up again
+            with open(index_path, 'r+b') as f:
+                f.truncate(count * INDEX_RECORD.size)
+            with open(keys_path, 'r+b') as f:
+                lines = f.readlines()[:count]
+                f.seek(0)
+                f.writelines(lines)
+                f.truncate()
+
+    def _segment_path(self, segment):
+        return os.path.join(self.directory, f"seg-{segment:06d}.zst")
+
+    def _segment_dict_id(self, segment):
+        if segment in self.segment_dicts:
+            return self.segment_dicts[segment]
+        with open(self._segment_path(segment), 'rb') as f:
+            magic, dict_id = SEGMENT_HEADER.unpack(f.read(SEGMENT_HEADER.size))
+        if magic != SEGMENT_MAGIC:
+            raise ValueError(f"{self._segment_path(segment)} is not a document segment")
+        self.segment_dicts[segment] = dict_id
+        return dict_id
+
+    def _start_segment(self, dict_id):
+        self.segment += 1
+        self.dict_id = dict_id
+        with open(self._segment_path(self.segment), 'wb') as f:
+            f.write(SEGMENT_HEADER.pack(SEGMENT_MAGIC, dict_id))
+        self.segment_dicts[self.segment] = dict_id
+
+    def _dictionary(self, dict_id):
+        if dict_id not in self.dictionaries:
+            with open(os.path.join(self.directory, f"dict-{dict_id:06d}.zdict"), 'rb') as f:
+                dictionary = zstandard.ZstdCompressionDict(f.read())
+            dictionary.precompute_compress(level=self.level)
+            self.dictionaries[dict_id] = dictionary
+        return self.dictionaries[dict_id]
+
+    def _compressor(self, dict_id):
+        if dict_id == 0:
+            return zstandard.ZstdCompressor(level=self.level)
+        return zstandard.ZstdCompressor(level=self.level, dict_data=self._dictionary(dict_id))
+
+    def _decompressor(self, dict_id):
+        if dict_id == 0:
+            return zstandard.ZstdDecompressor()
+        return zstandard.ZstdDecompressor(dict_data=self._dictionary(dict_id))
+
+    def _segment_fd(self, segment):
+        if segment not in self.segment_files:
+            self.segment_files[segment] = os.open(self._segment_path(segment), os.O_RDONLY)
+        return self.segment_files[segment]
+
+    def __len__(self):
+        return len(self.key_to_id)
+
+    def __contains__(self, key):
+        return key in self.key_to_id
+
+    def put(self, key, text):
+        """Compress and append a document; returns its id"""
+        raw = text.encode('utf-8')
+
+        with self.lock:
+            frame = self.compressor.compress(raw)
+            path = self._segment_path(self.segment)
+            with open(path, 'ab') as f:
+                offset = f.tell()
+                f.write(frame)
+
+            doc_id = len(self.offsets)
+            now = time.time()
+            self.segments.append(self.segment)
+            self.offsets.append(offset)
+            self.lengths.append(len(frame))
+            self.raw_lengths.append(len(raw))
+            self.stored_at.append(now)
+            self.key_to_id[key] = doc_id
+
+            self.index_file.write(INDEX_RECORD.pack(self.segment, offset, len(frame), len(raw), now))
+            self.index_file.flush()
+            self.keys_file.write(json.dumps({'key': key}).encode('utf-8') + b"\n")
+            self.keys_file.flush()
+
+            if self.dict_id == 0:
+                self.samples.append(raw[:MAX_SAMPLE_BYTES])
+                if len(self.samples) >= self.train_samples and self._train():
+                    return doc_id
+            if offset + len(frame) >= self.max_segment_bytes:
+                self._start_segment(self.dict_id)
+
+            return doc_id
+
+    def train_dictionary(self, samples=None):
+        """Train a new dictionary (on the given texts, or the most recent documents) and switch to it"""
+        with self.lock:
+            if samples is None:
+                recent = sorted(self.key_to_id.values())[-self.train_samples:]
+                self.samples = [self._read(doc_id)[:MAX_SAMPLE_BYTES] for doc_id in recent]
+            else:
+                self.samples = [sample.encode('utf-8')[:MAX_SAMPLE_BYTES] for sample in samples]
+            return self._train()
+
+    def _train(self):
+        try:
+            dictionary = zstandard.train_dictionary(self.dict_size, self.samples, level=self.level)
+        except zstandard.ZstdError as e:
+            # Usually too little sample data; keep going and try again later
+            print(f"[doc_store] dictionary training failed ({e}), continuing without")
+            self.train_samples *= 2
+            return False
+
+        dict_id = max([0] + [int(name[5:11]) for name in os.listdir(self.directory) if name.startswith('dict-')]) + 1
+        with open(os.path.join(self.directory, f"dict-{dict_id:06d}.zdict"), 'wb') as f:
+            f.write(dictionary.as_bytes())
+        self.samples = []
+        self._start_segment(dict_id)
+        self.compressor = self._compressor(dict_id)
+        return True
+
+    def _read(self, doc_id):
+        frame = os.pread(self._segment_fd(self.segments[doc_id]), self.lengths[doc_id], self.offsets[doc_id])
+        dict_id = self._segment_dict_id(self.segments[doc_id])
+        return self._decompressor(dict_id).decompress(frame)
+
+    def get(self, key, max_age=None):
+        """The stored text for a key, or None if missing or older than max_age seconds"""
+        doc_id = self.key_to_id.get(key)
+        if doc_id is None:
+            return None
+        if max_age is not None and time.time() - self.stored_at[doc_id] > max_age:
+            return None
+        return self._read(doc_id).decode('utf-8')
+
+    def get_many(self, keys, max_age=None):
+        """
+        Batch version of get(), in the order of keys
+
+        Documents are grouped by segment; each segment's frames are read with as
+        few reads as possible and decompressed together across threads.
+        """
+        now = time.time()
+        texts = [None] * len(keys)
+        by_segment = {}
+        for position, key in enumerate(keys):
+            doc_id = self.key_to_id.get(key)
+            if doc_id is None or (max_age is not None and now - self.stored_at[doc_id] > max_age):
+                continue
+            by_segment.setdefault(self.segments[doc_id], []).append((self.offsets[doc_id], doc_id, position))
+
+        for segment, entries in by_segment.items():
+            entries.sort()
+            fd = self._segment_fd(segment)
+            start = entries[0][0]
+            end = max(offset + self.lengths[doc_id] for offset, doc_id, _ in entries)
+            wanted = sum(self.lengths[doc_id] for _, doc_id, _ in entries)
+
+            # One read covering all frames when they sit close together, one read each otherwise
+            if end - start <= 2 * wanted:
+                block = os.pread(fd, end - start, start)
+                frames = [block[offset - start:offset - start + self.lengths[doc_id]] for offset, doc_id, _ in entries]
+            else:
+                frames = [os.pread(fd, self.lengths[doc_id], offset) for offset, doc_id, _ in entries]
+
+            decompressor = self._decompressor(self._segment_dict_id(segment))
+            try:
+                decoded = decompressor.multi_decompress_to_buffer(frames, threads=-1)
+                raws = [decoded[i].tobytes() for i in range(len(frames))]
+            except (AttributeError, NotImplementedError):
+                raws = [decompressor.decompress(frame) for frame in frames]
+
+            for (_, _, position), raw in zip(entries, raws):
+                texts[position] = raw.decode('utf-8')
+
+        return texts
+
+    def stats(self):
+        live = list(self.key_to_id.values())
+        raw_bytes = sum(self.raw_lengths[doc_id] for doc_id in live)
+        stored_bytes = sum(self.lengths[doc_id] for doc_id in live)
+        return {
+            'documents': len(live),
+            'raw_bytes': raw_bytes,
+            'stored_bytes': stored_bytes,
+            'ratio': round(raw_bytes / stored_bytes, 2) if stored_bytes else None,
+            'dictionary': self.dict_id or None,
+        }
+
+    def close(self):
+        with self.lock:
+            self.index_file.close()
+            self.keys_file.close()
+            for fd in self.segment_files.values():
+                os.close(fd)
+            self.segment_files = {}
@@ -0,0 +1,204 @@
+"""
+API key pool
+
+Spreads requests over several accounts' API keys instead of one, so bulk work
+is limited by the combined concurrency and quota of every key we own.
+
+Each request takes the least loaded key (requests in flight relative to the
+key's concurrency limit, then the most quota left). A 429 takes the key out
+of rotation for a cooldown (Retry-After when the server sends one), as does a
+403 whose body gives a rate limit reason (rateLimitExceeded,
+userRateLimitExceeded). A 402, or a 403 whose body says the quota is used up
+(dailyLimitExceeded, quotaExceeded, ...), benches it until the next UTC day
+(or for exhausted_cooldown without a daily quota), and a 401 for good. Any
+other 403 only moves the request to another key.
+
+The last usable key is never benched for longer than the server's Retry-After
+(or disabled): with nothing to rotate to, requests keep going out and fail
+upstream, as with a single key before there were pools.
+"""
+
+import re
+import threading
+import time
+
+ROTATE_STATUSES = (401, 402, 403, 429)  # worth retrying the request on another key
+
+# 403 reasons for a short-term rate limit; checked first, since Google's messages for
+# them also read "Quota exceeded for quota metric ... per minute"
+RATE_LIMITED = re.compile(r"\b(?:user)?rateLimitExceeded\b", re.IGNORECASE)
+# 403 reasons for a used-up daily quota or balance
+QUOTA_EXHAUSTED = re.compile(r"\b(?:dailyLimitExceeded|quotaExceeded|insufficient (?:credits|balance)|"
+                             r"out of credits)\b", re.IGNORECASE)
+
+
+class NoKeyAvailable(Exception):
+    """Raised when every key is cooling down or disabled"""
+
+
+class PooledKey:
+    def __init__(self, value, max_concurrency, daily_quota):
+        self.value = value
+        self.max_concurrency = max_concurrency
+        self.daily_quota = daily_quota
+        self.in_flight = 0
+        self.requests = 0
+        self.failures = 0
+        self.used_today = 0
+        self.day = time.gmtime().tm_yday
+        self.cooldown_until = 0.0
+        self.disabled = False
+
+    @property
+    def label(self):
+        return f"...{self.value[-4:]}" if len(self.value) > 4 else '(short key)'
+
+    def remaining_quota(self):
+        if self.daily_quota is None:
+            return None
+        return max(0, self.daily_quota - self.used_today)
+
+
+def seconds_until_utc_midnight():
+    return 86400 - time.time() % 86400
+
+
+class KeyPool:
+    def __init__(self, keys, max_concurrency=5, daily_quota=None, cooldown=60.0, exhausted_cooldown=3600.0):
+        """
+        Initialize the pool
+
+        Args:
+            keys: List of keys, or a comma-separated string of them
+            max_concurrency: Requests one key may have in flight (raised or lowered
+                             by a Concurrency-Limit response header)
+            daily_quota: Requests per key per UTC day, or None if unlimited
+            cooldown: Seconds out of rotation after a 429 without Retry-After
+            exhausted_cooldown: Seconds out of rotation once quota or credits are used up
+        """
+        if isinstance(keys, str):
+            keys = [key.strip() for key in keys.split(',') if key.strip()]
+        # With no keys configured, requests still go out (and fail upstream) as before
+        self.keys = [PooledKey(key, max_concurrency, daily_quota) for key in keys or ['']]
+        self.cooldown = cooldown
+        self.exhausted_cooldown = exhausted_cooldown
+        self.condition = threading.Condition()
+
+    def __len__(self):
+        return len(self.keys)
+
+    @property
+    def capacity(self):
+        """Requests the whole pool can have in flight"""
+        return sum(key.max_concurrency for key in self.keys if not key.disabled)
+
+    def _usable(self, key, now):
+        if key.day != time.gmtime().tm_yday:
+            key.day = time.gmtime().tm_yday
+            key.used_today = 0
+        return not key.disabled and now >= key.cooldown_until and key.remaining_quota() != 0
+
+    def acquire(self, timeout=60.0, exclude=()):
+        """
+        Take the best key for one request; pair every call with release()
+
+        Waits while every usable key is at its concurrency limit.
+        Raises NoKeyAvailable if all keys are cooling down, disabled or out of
+        quota, or if none frees up within the timeout.
+        """
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                usable = [key for key in self.keys if key.value not in exclude and self._usable(key, now)]
+                if not usable:
+                    raise NoKeyAvailable(self._unavailable_reason(now))
+
+                idle = [key for key in usable if key.in_flight < key.max_concurrency]
+                if idle:
+                    best = min(idle, key=lambda k: (k.in_flight / k.max_concurrency,
+                                                    -(k.remaining_quota() or 0), k.used_today))
+                    best.in_flight += 1
+                    best.requests += 1
+                    best.used_today += 1
+                    return best.value
+
+                if not self.condition.wait(timeout=max(0.0, deadline - now)) and time.monotonic() >= deadline:
+                    raise NoKeyAvailable(f"All {len(usable)} usable keys stayed busy for {timeout}s")
+
+    def release(self, value, status=None, headers=None, body=''):
+        """
+        Return a key after its request finished
+
+        Args:
+            value: The key acquire() returned
+            status: HTTP status of the response, or None if no response arrived
+            headers: Response headers, for Retry-After and Concurrency-Limit
+            body: Response text, to tell a used-up quota from other 403s
+        """
+        headers = headers or {}
+        with self.condition:
+            key = next(key for key in self.keys if key.value == value)
+            key.in_flight -= 1
+
+            limit = headers.get('Concurrency-Limit')
+            if limit and limit.isdigit() and int(limit) > 0:
+                key.max_concurrency = int(limit)
+
+            if status in ROTATE_STATUSES:
+                key.failures += 1
+                now = time.monotonic()
+                last_usable = not any(other is not key and self._usable(other, now) for other in self.keys)
+                if status == 401:
+                    if last_usable:
+                        print(f"[keys] {key.label} rejected as invalid, kept as the last usable key")
+                    else:
+                        key.disabled = True
+                        print(f"[keys] {key.label} rejected as invalid, removed from rotation")
+                    cooldown = 0.0
+                elif status == 429 or (status == 403 and RATE_LIMITED.search(body or '')):
+                    cooldown = self._retry_after(headers, 0.0 if last_usable else self.cooldown)
+                elif status == 402 or QUOTA_EXHAUSTED.search(body or ''):
+                    cooldown = self.exhausted_cooldown
+                    if key.daily_quota is not None:
+                        cooldown = seconds_until_utc_midnight()
+                    cooldown = self._retry_after(headers, 0.0 if last_usable else cooldown)
+                else:
+                    cooldown = 0.0
+                if cooldown > 0:
+                    key.cooldown_until = now + cooldown
+                    print(f"[keys] {key.label} got HTTP {status}, cooling down for {cooldown:.0f}s")
+
+            self.condition.notify_all()
+
+    @staticmethod
+    def _retry_after(headers, default):
+        retry_after = headers.get('Retry-After')
+        try:
+            return float(retry_after) if retry_after else default
+        except ValueError:
+            return default
+
+    def _unavailable_reason(self, now):
+        if all(key.disabled for key in self.keys):
+            return "Every API key was rejected as invalid"
+        waits = [key.cooldown_until - now for key in self.keys if not key.disabled and key.cooldown_until > now]
+        if waits:
+            return f"All API keys are cooling down or out of quota (next one back in {min(waits):.0f}s)"
+        return "All API keys are out of quota for today"
+
+    def status(self):
+        """Usage and state of every key"""
+        now = time.monotonic()
+        with self.condition:
+            return [{
+                'key': key.label,
+                'in_flight': key.in_flight,
+                'max_concurrency': key.max_concurrency,
+                'requests': key.requests,
+                'failures': key.failures,
+                'used_today': key.used_today,
+                'remaining_quota': key.remaining_quota(),
+                'cooling_down_s': round(max(0.0, key.cooldown_until - now), 1),
+                'disabled': key.disabled,
+            } for key in self.keys]